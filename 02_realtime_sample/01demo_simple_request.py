@@ -1,35 +1,15 @@
 #! /usr/bin/env -S python3 -O
 #! /usr/bin/env -S python3
 
-import os
 import sys
-import lzma
-import requests
 import time
-from parse import parse
-import yaml
-from evaalapi import statefmt, estfmt
+
+from xdrclient import log, set_trial, do_req, parse_state, parse_estimate
 
 server = "http://127.0.0.1:5000/evaalapi/"
 trialname = "onlinedemo"
 
 
-def do_req (req, n=2):
-    r = requests.get(server+trialname+req)
-    print("\n==>  GET " + req + " --> " + str(r.status_code))
-    if False and r.headers['content-type'].startswith("application/x-xz"):
-        l = lzma.decompress(r.content).decode('ascii').splitlines()
-    else:
-        l = r.text.splitlines()
-    if len(l) <= 2*n+1:
-        print(r.text + '\n')
-    else:
-        print('\n'.join(l[:n]
-                        + ["   ... ___%d lines omitted___ ...   " % len(l)]
-                        + l[-n:] + [""]))
-    
-    return(r)
-
 
 def demo (maxw):
 
@@ -38,7 +18,7 @@ def demo (maxw):
 
     ## Check initial state
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
 
     ## Get first 0.5s worth of data
     time.sleep(maxw)
@@ -47,7 +27,7 @@ def demo (maxw):
     ## Look at remaining time
     time.sleep(maxw)
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
     
     ## Set estimates
     time.sleep(maxw)
@@ -57,14 +37,14 @@ def demo (maxw):
 
     ## Get estimates
     r = do_req("/estimates", 3)
-    s = parse(estfmt, r.text.splitlines()[-1]); print(s.named)
+    s = parse_estimate(r.text.splitlines()[-1]); log.info("estimate", **s.named)
 
     ## Get log
     time.sleep(maxw)
     r = do_req("/log", 12)
 
     ## We finish here
-    print("Demo stops here")
+    log.info("Demo stops here")
 
 ################################################################
 
@@ -79,6 +59,7 @@ if omitted, TRIAL defaults to '%s' and SERVER to %s""" %
     else:
         trialname = sys.argv[1]
         server = sys.argv[2]
+    set_trial(trialname, server)
 
     print("# Running %s demo test suite\n")
     print(f"trial: {trialname}, server: {server}")
@@ -1,15 +1,10 @@
 #! /usr/bin/env -S python3 -O
 #! /usr/bin/env -S python3
 
-import os
 import sys
-import lzma
-import requests
 import time
-from parse import parse
-import yaml
 
-from evaalapi import statefmt, estfmt
+from xdrclient import log, set_trial, do_req, parse_state, parse_estimate, process_data
 
 server = "http://127.0.0.1:5000/evaalapi/"
 trialname = "onlinedemo"
@@ -36,6 +31,12 @@ class DemoLocalizer:
         str_data +=  f"gpos: {self.gpos_data} \n"
         str_data +=  f"viso: {self.viso_data} \n"
         return str_data
+
+    def counts(self):
+        # number of stored samples per sensor: printing the whole history at every step grows quadratically
+        return {"acce": len(self.acce_data), "gyro": len(self.gyro_data), "magn": len(self.magn_data),
+                "ahrs": len(self.ahrs_data), "uwbp": len(self.uwbp_data), "uwbt": len(self.uwbt_data),
+                "gpos": len(self.gpos_data), "viso": len(self.viso_data)}
     
     def callback_acce(self, data):
         self.acce_data.append(data)
@@ -84,82 +85,6 @@ class DemoLocalizer:
         return est
 
 
-def split_lines(r):
-    if False and r.headers['content-type'].startswith("application/x-xz"):
-        l = lzma.decompress(r.content).decode('ascii').splitlines()
-    else:
-        l = r.text.splitlines()
-    return l
-
-
-def do_req (req, n=2):
-    r = requests.get(server+trialname+req)
-    print("\n==>  GET " + req + " --> " + str(r.status_code))
-    l = split_lines(r)
-    if len(l) <= 2*n+1:
-        print(r.text + '\n')
-    else:
-        print('\n'.join(l[:n]
-                        + ["   ... ___%d lines omitted___ ...   " % len(l)]
-                        + l[-n:] + [""]))
-    
-    return r
-
-
-def parse_data(sensor_type, data_row):
-    
-    # Column names for each sensor type
-    columns = {
-        'ACCE': ['app_timestamp', 'sensor_timestamp', 'acc_x', 'acc_y', 'acc_z', 'accuracy'],
-        'GYRO': ['app_timestamp', 'sensor_timestamp', 'gyr_x', 'gyr_y', 'gyr_z', 'accuracy'],
-        'MAGN': ['app_timestamp', 'sensor_timestamp', 'mag_x', 'mag_y', 'mag_z', 'accuracy'],
-        'AHRS': ['app_timestamp', 'sensor_timestamp', 'pitch_x', 'roll_y', 'yaw_z', 'quat_2', 'quat_3', 'quat_4', 'quat_w', 'accuracy'],
-        'UWBP': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'direction_vec_x', 'direction_vec_y', 'direction_vec_z'],
-        'UWBT': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'aoa_azimuth', 'aoa_elevation', 'nlos'],
-        'GPOS': ['app_timestamp', 'sensor_timestamp', 'object_id', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w'],
-        'VISO': ['app_timestamp', 'sensor_timestamp', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w']
-    }
-    
-    row_dict = {}
-    for i, col_name in enumerate(columns[sensor_type]):
-        if i < len(data_row):  # Ensure we don't go out of bounds
-            # Convert numeric values to float, except for specific ID fields
-            if col_name not in ['tag_id', 'object_id']:
-                try:
-                    row_dict[col_name] = float(data_row[i])
-                except (ValueError, TypeError):
-                    row_dict[col_name] = data_row[i]
-            else:
-                row_dict[col_name] = data_row[i]
-    return row_dict
-
-
-def process_data(localizer, recv_data):
-    recv_sensor_lines = split_lines(recv_data)
-
-    # Dictionary to store structured data
-    sensor_dictionaries = {}
-    
-    for line in recv_sensor_lines:
-        # Skip empty lines
-        if not line.strip():
-            continue
-        
-        # Split the line by semicolon
-        parts = line.strip().split(';')
-        
-        # Get sensor type (first part of the line)
-        sensor_type = parts[0]
-        data_row = parts[1:]
-    
-        row_dict = parse_data(sensor_type, data_row)
-                    
-        localizer.callback(sensor_type, row_dict)
-    
-    est = localizer.estimate_location()
-    
-    return est 
-
 
 def demo (maxw):
     localizer = DemoLocalizer()
@@ -169,41 +94,39 @@ def demo (maxw):
 
     ## Check initial state
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
 
     ## Get first 0.5s worth of data
     time.sleep(maxw)
     r = do_req("/nextdata?horizon=0.5")
     est = process_data(localizer, r)
-    print("---")
-    print(est)
-    print(localizer)
+    log.info("step", est=est)
+    log.debug("stored", **localizer.counts())
 
     ## Look at remaining time
     time.sleep(maxw)
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
     
     ## Set estimates
     time.sleep(maxw)
     for pos in range(10):
         r = do_req("/nextdata?position=%.1f,%.1f,%.1f" % (est[0], est[1], est[2]))
         est = process_data(localizer, r)
-        print("---")
-        print(est)
-        print(localizer)
+        log.info("step", est=est)
+        log.debug("stored", **localizer.counts())
         time.sleep(maxw)
 
     ## Get estimates
     r = do_req("/estimates", 3)
-    s = parse(estfmt, r.text.splitlines()[-1]); print(s.named)
+    s = parse_estimate(r.text.splitlines()[-1]); log.info("estimate", **s.named)
 
     ## Get log
     time.sleep(maxw)
     r = do_req("/log", 12)
 
     ## We finish here
-    print("Demo stops here")
+    log.info("Demo stops here")
 
 ################################################################
 
@@ -218,6 +141,7 @@ if __name__ == '__main__':
     else:
         trialname = sys.argv[1]
         server = sys.argv[2]
+    set_trial(trialname, server)
         
     maxw = 0.5
     demo(maxw)
@@ -1,17 +1,11 @@
 #! /usr/bin/env -S python3 -O
 #! /usr/bin/env -S python3
 
-import os
 import sys
-import lzma
-import requests
 import time
-from parse import parse
-import yaml
 import numpy as np
-from scipy.spatial.transform import Rotation
 
-from evaalapi import statefmt, estfmt
+from xdrclient import log, set_trial, do_req, parse_state, parse_estimate, process_data
 
 server = "http://127.0.0.1:5000/evaalapi/"
 trialname = "onlinedemo"
@@ -114,15 +108,15 @@ class DemoLocalizer:
         
         latest_uwbt = self.uwbt_data[-1] # get latest UWB tag data
         tag_id = latest_uwbt["tag_id"]
-        print(tag_id)
         
         tag_loc, tag_q = self.get_latest_tag_pose(tag_id) # get latest pose of corresponding tag
-        print(tag_loc, tag_q)
+        log.debug("tag", tag_id=tag_id, loc=tag_loc, q=tag_q)
 
         est = self.last_est        
         if tag_loc is not None:
             # Convert AoA + Distance measurement into global position using tag's pose
             local_point = spherical_to_cartesian(latest_uwbt["distance"], latest_uwbt["aoa_azimuth"], latest_uwbt["aoa_elevation"])
+            from scipy.spatial.transform import Rotation # only needed once a tag is seen
             R = Rotation.from_quat(tag_q)
             global_point = R.apply(local_point) + tag_loc
             
@@ -133,86 +127,6 @@ class DemoLocalizer:
         return est
 
 
-def split_lines(r):
-    if False and r.headers['content-type'].startswith("application/x-xz"):
-        l = lzma.decompress(r.content).decode('ascii').splitlines()
-    else:
-        l = r.text.splitlines()
-    return l
-
-
-def do_req (req, n=2):
-    r = requests.get(server+trialname+req)
-    print("\n==>  GET " + req + " --> " + str(r.status_code))
-    l = split_lines(r)
-    if len(l) <= 2*n+1:
-        print(r.text + '\n')
-    else:
-        print('\n'.join(l[:n]
-                        + ["   ... ___%d lines omitted___ ...   " % len(l)]
-                        + l[-n:] + [""]))
-    
-    return r
-
-
-def parse_data(sensor_type, data_row):
-    
-    # Column names for each sensor type
-    columns = {
-        'ACCE': ['app_timestamp', 'sensor_timestamp', 'acc_x', 'acc_y', 'acc_z', 'accuracy'],
-        'GYRO': ['app_timestamp', 'sensor_timestamp', 'gyr_x', 'gyr_y', 'gyr_z', 'accuracy'],
-        'MAGN': ['app_timestamp', 'sensor_timestamp', 'mag_x', 'mag_y', 'mag_z', 'accuracy'],
-        'AHRS': ['app_timestamp', 'sensor_timestamp', 'pitch_x', 'roll_y', 'yaw_z', 'quat_2', 'quat_3', 'quat_4', 'quat_w', 'accuracy'],
-        'UWBP': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'direction_vec_x', 'direction_vec_y', 'direction_vec_z'],
-        'UWBT': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'aoa_azimuth', 'aoa_elevation', 'nlos'],
-        'GPOS': ['app_timestamp', 'sensor_timestamp', 'object_id', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w'],
-        'VISO': ['app_timestamp', 'sensor_timestamp', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w']
-    }
-    if sensor_type not in columns: 
-        return None
-    
-    row_dict = {}
-    for i, col_name in enumerate(columns[sensor_type]):
-        if i < len(data_row):  # Ensure we don't go out of bounds
-            # Convert numeric values to float, except for specific ID fields
-            if col_name not in ['tag_id', 'object_id']:
-                try:
-                    row_dict[col_name] = float(data_row[i])
-                except (ValueError, TypeError):
-                    row_dict[col_name] = data_row[i]
-            else:
-                row_dict[col_name] = data_row[i]
-    return row_dict
-
-
-def process_data(localizer, recv_data):
-    recv_sensor_lines = split_lines(recv_data)
-
-    # Dictionary to store structured data
-    sensor_dictionaries = {}
-    
-    for line in recv_sensor_lines:
-        # Skip empty lines
-        if not line.strip():
-            continue
-        
-        # Split the line by semicolon
-        parts = line.strip().split(';')
-        
-        # Get sensor type (first part of the line)
-        sensor_type = parts[0]
-        data_row = parts[1:]
-    
-        row_dict = parse_data(sensor_type, data_row)
-        if row_dict is not None:
-                    
-            localizer.callback(sensor_type, row_dict)
-    
-    est = localizer.estimate_location()
-    
-    return est 
-
-
 def demo (maxw):
     localizer = DemoLocalizer()
 
@@ -221,39 +135,37 @@ def demo (maxw):
 
     ## Check initial state
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
 
     ## Get first 0.5s worth of data
     time.sleep(maxw)
     r = do_req("/nextdata?horizon=0.5")
     est = process_data(localizer, r)
-    print("---")
-    print(est)
+    log.info("step", est=est)
 
     ## Look at remaining time
     time.sleep(maxw)
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
     
     ## Set estimates
     time.sleep(maxw)
     for pos in range(20):
         r = do_req("/nextdata?position=%.1f,%.1f,%.1f" % (est[0], est[1], est[2]))
         est = process_data(localizer, r)
-        print("---")
-        print(est)
+        log.info("step", est=est)
         time.sleep(maxw)
 
     ## Get estimates
     r = do_req("/estimates", 3)
-    s = parse(estfmt, r.text.splitlines()[-1]); print(s.named)
+    s = parse_estimate(r.text.splitlines()[-1]); log.info("estimate", **s.named)
 
     ## Get log
     time.sleep(maxw)
     r = do_req("/log", 12)
 
     ## We finish here
-    print("Demo stops here")
+    log.info("Demo stops here")
 
 ################################################################
 
@@ -268,6 +180,7 @@ if __name__ == '__main__':
     else:
         trialname = sys.argv[1]
         server = sys.argv[2]
+    set_trial(trialname, server)
     maxw = 0.5
     demo(maxw)
     exit(0)
@@ -1,26 +1,30 @@
 #! /usr/bin/env -S python3 -O
 #! /usr/bin/env -S python3
 
-import os
 import sys
-import lzma
-import requests
 import time
-from parse import parse
-import yaml
 import numpy as np
-from scipy.spatial.transform import Rotation
 
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
 import matplotlib.animation as animation
 from collections import deque
 
-from evaalapi import statefmt, estfmt
+from xdrclient import log, set_trial, do_req, parse_state, parse_estimate, process_data
+from sensor_aligner import SensorAligner
 
 server = "http://127.0.0.1:5000/evaalapi/"
 trialname = "onlinedemo"
 
+# the inertial panels share one time axis: every sensor is nearest-matched on this grid
+GRID_STEP = 0.05 # s
+IMU_COLUMNS = {
+    "ACCE": ["acc_x", "acc_y", "acc_z"],
+    "GYRO": ["gyr_x", "gyr_y", "gyr_z"],
+    "MAGN": ["mag_x", "mag_y", "mag_z"],
+    "AHRS": ["pitch_x", "roll_y", "yaw_z"],
+}
+
 
 def spherical_to_cartesian(distance, azimuth_deg, elevation_deg):
     azimuth_rad = np.radians(azimuth_deg)
@@ -46,6 +50,11 @@ class DemoLocalizer:
         self.last_est = (0, 0, 0)
         self.position_history = []
         
+        # sorted timelines of the inertial sensors, resampled on GRID_STEP for the dashboard
+        self.aligner = SensorAligner()
+        for sensor_type, columns in IMU_COLUMNS.items():
+            self.aligner.add_sensor(sensor_type, columns)
+        
         # Setup dashboard
         self.setup_dashboard()
         
@@ -70,7 +79,7 @@ class DemoLocalizer:
         # Accelerometer data
         self.acce_ax = self.fig.add_subplot(gs[0, 2])
         self.acce_ax.set_title('Accelerometer')
-        self.acce_ax.set_xlabel('Time')
+        self.acce_ax.set_xlabel('Time (s)')
         self.acce_ax.set_ylabel('Acceleration (m/s²)')
         self.acce_ax.grid(True)
         self.acce_lines = {
@@ -83,7 +92,7 @@ class DemoLocalizer:
         # Gyroscope data
         self.gyro_ax = self.fig.add_subplot(gs[0, 3])
         self.gyro_ax.set_title('Gyroscope')
-        self.gyro_ax.set_xlabel('Time')
+        self.gyro_ax.set_xlabel('Time (s)')
         self.gyro_ax.set_ylabel('Angular Velocity (rad/s)')
         self.gyro_ax.grid(True)
         self.gyro_lines = {
@@ -96,7 +105,7 @@ class DemoLocalizer:
         # Magnetometer data
         self.magn_ax = self.fig.add_subplot(gs[1, 2])
         self.magn_ax.set_title('Magnetometer')
-        self.magn_ax.set_xlabel('Time')
+        self.magn_ax.set_xlabel('Time (s)')
         self.magn_ax.set_ylabel('Magnetic Field (μT)')
         self.magn_ax.grid(True)
         self.magn_lines = {
@@ -109,7 +118,7 @@ class DemoLocalizer:
         # AHRS data
         self.ahrs_ax = self.fig.add_subplot(gs[1, 3])
         self.ahrs_ax.set_title('Orientation (AHRS)')
-        self.ahrs_ax.set_xlabel('Time')
+        self.ahrs_ax.set_xlabel('Time (s)')
         self.ahrs_ax.set_ylabel('Angle (degrees)')
         self.ahrs_ax.grid(True)
         self.ahrs_lines = {
@@ -215,6 +224,34 @@ class DemoLocalizer:
         plt.ion()  # Turn on interactive mode
         plt.show(block=False)
         
+    def update_sensor_plot(self, ax, lines, buffer):
+        t_data = list(self.timestamps)
+        if not t_data:
+            return
+        for k, line in lines.items():
+            line.set_data(t_data, list(buffer[k]))
+        
+        values = np.array([list(buffer[k]) for k in lines])
+        values = values[np.isfinite(values)] # no sample near some grid points
+        if len(values):
+            min_val, max_val = values.min(), values.max()
+            margin = max(0.1, 0.1 * (max_val - min_val) if max_val != min_val else 1)
+            ax.set_ylim(min_val - margin, max_val + margin)
+        ax.set_xlim(t_data[0], max(t_data[-1], t_data[0] + GRID_STEP))
+    
+    def update_imu_buffers(self):
+        """Append the grid points covered by every inertial sensor since the previous call"""
+        grid, block = self.aligner.grid_block(list(IMU_COLUMNS), GRID_STEP, method="nearest", tolerance=GRID_STEP)
+        if len(grid) == 0:
+            return
+        self.timestamps.extend(grid)
+        for buffer, sensor_type in ((self.acce_buffer, "ACCE"), (self.gyro_buffer, "GYRO"),
+                                    (self.magn_buffer, "MAGN"), (self.ahrs_buffer, "AHRS")):
+            for k, column in zip(buffer, block[sensor_type].T):
+                buffer[k].extend(column)
+        # later blocks start after this grid point: older samples are not needed any more
+        self.aligner.discard_before(grid[-1] - GRID_STEP)
+    
     def update_dashboard(self, frame):
         # Update position plot
         if self.position_history:
@@ -232,85 +269,11 @@ class DemoLocalizer:
                 self.position_ax.set_xlim(min(x_positions) - x_margin, max(x_positions) + x_margin)
                 self.position_ax.set_ylim(min(y_positions) - y_margin, max(y_positions) + y_margin)
         
-        # Update accelerometer plot
-        x_data = list(self.acce_buffer['x'])
-        y_data = list(self.acce_buffer['y'])
-        z_data = list(self.acce_buffer['z'])
-        t_data = list(range(len(x_data)))
-        
-        if t_data:
-            self.acce_lines['x'].set_data(t_data, x_data)
-            self.acce_lines['y'].set_data(t_data, y_data)
-            self.acce_lines['z'].set_data(t_data, z_data)
-            
-            if x_data or y_data or z_data:
-                min_val = min(min(x_data) if x_data else 0, min(y_data) if y_data else 0, min(z_data) if z_data else 0)
-                max_val = max(max(x_data) if x_data else 0, max(y_data) if y_data else 0, max(z_data) if z_data else 0)
-                margin = max(0.1, 0.1 * (max_val - min_val) if max_val != min_val else 1)
-                
-                self.acce_ax.set_xlim(0, len(t_data))
-                self.acce_ax.set_ylim(min_val - margin, max_val + margin)
-        
-        # Update gyroscope plot
-        x_data = list(self.gyro_buffer['x'])
-        y_data = list(self.gyro_buffer['y'])
-        z_data = list(self.gyro_buffer['z'])
-        t_data = list(range(len(x_data)))
-        
-        if t_data:
-            self.gyro_lines['x'].set_data(t_data, x_data)
-            self.gyro_lines['y'].set_data(t_data, y_data)
-            self.gyro_lines['z'].set_data(t_data, z_data)
-            
-            if x_data or y_data or z_data:
-                min_val = min(min(x_data) if x_data else 0, min(y_data) if y_data else 0, min(z_data) if z_data else 0)
-                max_val = max(max(x_data) if x_data else 0, max(y_data) if y_data else 0, max(z_data) if z_data else 0)
-                margin = max(0.1, 0.1 * (max_val - min_val) if max_val != min_val else 1)
-                
-                self.gyro_ax.set_xlim(0, len(t_data))
-                self.gyro_ax.set_ylim(min_val - margin, max_val + margin)
-        
-        # Update magnetometer plot
-        x_data = list(self.magn_buffer['x'])
-        y_data = list(self.magn_buffer['y'])
-        z_data = list(self.magn_buffer['z'])
-        t_data = list(range(len(x_data)))
-        
-        if t_data:
-            self.magn_lines['x'].set_data(t_data, x_data)
-            self.magn_lines['y'].set_data(t_data, y_data)
-            self.magn_lines['z'].set_data(t_data, z_data)
-            
-            if x_data or y_data or z_data:
-                min_val = min(min(x_data) if x_data else 0, min(y_data) if y_data else 0, min(z_data) if z_data else 0)
-                max_val = max(max(x_data) if x_data else 0, max(y_data) if y_data else 0, max(z_data) if z_data else 0)
-                margin = max(0.1, 0.1 * (max_val - min_val) if max_val != min_val else 1)
-                
-                self.magn_ax.set_xlim(0, len(t_data))
-                self.magn_ax.set_ylim(min_val - margin, max_val + margin)
-        
-        # Update AHRS plot
-        pitch_data = list(self.ahrs_buffer['pitch'])
-        roll_data = list(self.ahrs_buffer['roll'])
-        yaw_data = list(self.ahrs_buffer['yaw'])
-        t_data = list(range(len(pitch_data)))
-        
-        if t_data:
-            self.ahrs_lines['pitch'].set_data(t_data, pitch_data)
-            self.ahrs_lines['roll'].set_data(t_data, roll_data)
-            self.ahrs_lines['yaw'].set_data(t_data, yaw_data)
-            
-            if pitch_data or roll_data or yaw_data:
-                min_val = min(min(pitch_data) if pitch_data else 0, 
-                              min(roll_data) if roll_data else 0, 
-                              min(yaw_data) if yaw_data else 0)
-                max_val = max(max(pitch_data) if pitch_data else 0, 
-                              max(roll_data) if roll_data else 0, 
-                              max(yaw_data) if yaw_data else 0)
-                margin = max(0.1, 0.1 * (max_val - min_val) if max_val != min_val else 1)
-                
-                self.ahrs_ax.set_xlim(0, len(t_data))
-                self.ahrs_ax.set_ylim(min_val - margin, max_val + margin)
+        # Update the inertial plots, on their common time axis
+        self.update_sensor_plot(self.acce_ax, self.acce_lines, self.acce_buffer)
+        self.update_sensor_plot(self.gyro_ax, self.gyro_lines, self.gyro_buffer)
+        self.update_sensor_plot(self.magn_ax, self.magn_lines, self.magn_buffer)
+        self.update_sensor_plot(self.ahrs_ax, self.ahrs_lines, self.ahrs_buffer)
         
         # Update UWB distance plot
         distance_data = list(self.uwb_distance_buffer)
@@ -423,35 +386,23 @@ class DemoLocalizer:
     
     def callback_acce(self, data):
         self.acce_data.append(data)
-        # Update dashboard buffers
-        if 'acc_x' in data and 'acc_y' in data and 'acc_z' in data:
-            self.acce_buffer['x'].append(data['acc_x'])
-            self.acce_buffer['y'].append(data['acc_y'])
-            self.acce_buffer['z'].append(data['acc_z'])
+        # Update dashboard timelines
+        self.aligner.append("ACCE", data["sensor_timestamp"], (data['acc_x'], data['acc_y'], data['acc_z']))
 
     def callback_gyro(self, data):
         self.gyro_data.append(data)
-        # Update dashboard buffers
-        if 'gyr_x' in data and 'gyr_y' in data and 'gyr_z' in data:
-            self.gyro_buffer['x'].append(data['gyr_x'])
-            self.gyro_buffer['y'].append(data['gyr_y'])
-            self.gyro_buffer['z'].append(data['gyr_z'])
+        # Update dashboard timelines
+        self.aligner.append("GYRO", data["sensor_timestamp"], (data['gyr_x'], data['gyr_y'], data['gyr_z']))
         
     def callback_magn(self, data):
         self.magn_data.append(data)
-        # Update dashboard buffers
-        if 'mag_x' in data and 'mag_y' in data and 'mag_z' in data:
-            self.magn_buffer['x'].append(data['mag_x'])
-            self.magn_buffer['y'].append(data['mag_y'])
-            self.magn_buffer['z'].append(data['mag_z'])
+        # Update dashboard timelines
+        self.aligner.append("MAGN", data["sensor_timestamp"], (data['mag_x'], data['mag_y'], data['mag_z']))
         
     def callback_ahrs(self, data):
         self.ahrs_data.append(data)
-        # Update dashboard buffers
-        if 'pitch_x' in data and 'roll_y' in data and 'yaw_z' in data:
-            self.ahrs_buffer['pitch'].append(data['pitch_x'])
-            self.ahrs_buffer['roll'].append(data['roll_y'])
-            self.ahrs_buffer['yaw'].append(data['yaw_z'])
+        # Update dashboard timelines
+        self.aligner.append("AHRS", data["sensor_timestamp"], (data['pitch_x'], data['roll_y'], data['yaw_z']))
         
     def callback_uwbp(self, data):
         self.uwbp_data.append(data)
@@ -522,15 +473,15 @@ class DemoLocalizer:
         
         latest_uwbt = self.uwbt_data[-1] # get latest UWB tag data
         tag_id = latest_uwbt["tag_id"]
-        print(tag_id)
         
         tag_loc, tag_q = self.get_latest_tag_pose(tag_id) # get latest pose of corresponding tag
-        print(tag_loc, tag_q)
+        log.debug("tag", tag_id=tag_id, loc=tag_loc, q=tag_q)
 
         est = self.last_est        
         if tag_loc is not None:
             # Convert AoA + Distance measurement into global position using tag's pose
             local_point = spherical_to_cartesian(latest_uwbt["distance"], latest_uwbt["aoa_azimuth"], latest_uwbt["aoa_elevation"])
+            from scipy.spatial.transform import Rotation # only needed once a tag is seen
             R = Rotation.from_quat(tag_q)
             global_point = R.apply(local_point) + tag_loc
             
@@ -548,91 +499,12 @@ class DemoLocalizer:
                 self.error_buffer.append(error)
         
         # Update the dashboard
+        self.update_imu_buffers()
         plt.pause(0.01)  # Allow time for the plot to update
         
         return est
 
 
-def split_lines(r):
-    if False and r.headers['content-type'].startswith("application/x-xz"):
-        l = lzma.decompress(r.content).decode('ascii').splitlines()
-    else:
-        l = r.text.splitlines()
-    return l
-
-
-def do_req (req, n=2):
-    r = requests.get(server+trialname+req)
-    print("\n==>  GET " + req + " --> " + str(r.status_code))
-    l = split_lines(r)
-    if len(l) <= 2*n+1:
-        print(r.text + '\n')
-    else:
-        print('\n'.join(l[:n]
-                        + ["   ... ___%d lines omitted___ ...   " % len(l)]
-                        + l[-n:] + [""]))
-    
-    return r
-
-
-def parse_data(sensor_type, data_row):
-    
-    # Column names for each sensor type
-    columns = {
-        'ACCE': ['app_timestamp', 'sensor_timestamp', 'acc_x', 'acc_y', 'acc_z', 'accuracy'],
-        'GYRO': ['app_timestamp', 'sensor_timestamp', 'gyr_x', 'gyr_y', 'gyr_z', 'accuracy'],
-        'MAGN': ['app_timestamp', 'sensor_timestamp', 'mag_x', 'mag_y', 'mag_z', 'accuracy'],
-        'AHRS': ['app_timestamp', 'sensor_timestamp', 'pitch_x', 'roll_y', 'yaw_z', 'quat_2', 'quat_3', 'quat_4', 'quat_w', 'accuracy'],
-        'UWBP': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'direction_vec_x', 'direction_vec_y', 'direction_vec_z'],
-        'UWBT': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'aoa_azimuth', 'aoa_elevation', 'nlos'],
-        'GPOS': ['app_timestamp', 'sensor_timestamp', 'object_id', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w'],
-        'VISO': ['app_timestamp', 'sensor_timestamp', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w']
-    }
-    if sensor_type not in columns: 
-        return None
-    
-    row_dict = {}
-    for i, col_name in enumerate(columns[sensor_type]):
-        if i < len(data_row):  # Ensure we don't go out of bounds
-            # Convert numeric values to float, except for specific ID fields
-            if col_name not in ['tag_id', 'object_id']:
-                try:
-                    row_dict[col_name] = float(data_row[i])
-                except (ValueError, TypeError):
-                    row_dict[col_name] = data_row[i]
-            else:
-                row_dict[col_name] = data_row[i]
-    return row_dict
-
-
-def process_data(localizer, recv_data):
-    recv_sensor_lines = split_lines(recv_data)
-
-    # Dictionary to store structured data
-    sensor_dictionaries = {}
-    
-    for line in recv_sensor_lines:
-        # Skip empty lines
-        if not line.strip():
-            continue
-        
-        # Split the line by semicolon
-        parts = line.strip().split(';')
-        
-        # Get sensor type (first part of the line)
-        sensor_type = parts[0]
-        data_row = parts[1:]
-    
-        row_dict = parse_data(sensor_type, data_row)
-        if row_dict is not None:
-                    
-            localizer.callback(sensor_type, row_dict)
-    
-    est = localizer.estimate_location()
-    
-    return est 
-
-
 def demo (maxw):
     localizer = DemoLocalizer()
 
@@ -641,39 +513,37 @@ def demo (maxw):
 
     ## Check initial state
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
 
     ## Get first 0.5s worth of data
     time.sleep(maxw)
     r = do_req("/nextdata?horizon=0.5")
     est = process_data(localizer, r)
-    print("---")
-    print(est)
+    log.info("step", est=est)
 
     ## Look at remaining time
     time.sleep(maxw)
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
     
     ## Set estimates
     time.sleep(maxw)
     for pos in range(1000):
         r = do_req("/nextdata?position=%.1f,%.1f,%.1f" % (est[0], est[1], est[2]))
         est = process_data(localizer, r)
-        print("---")
-        print(est)
+        log.info("step", est=est)
         time.sleep(maxw)
 
     ## Get estimates
     r = do_req("/estimates", 3)
-    s = parse(estfmt, r.text.splitlines()[-1]); print(s.named)
+    s = parse_estimate(r.text.splitlines()[-1]); log.info("estimate", **s.named)
 
     ## Get log
     time.sleep(maxw)
     r = do_req("/log", 12)
 
     ## We finish here
-    print("Demo stops here")
+    log.info("Demo stops here")
 
 ################################################################
 
@@ -688,6 +558,7 @@ if __name__ == '__main__':
     else:
         trialname = sys.argv[1]
         server = sys.argv[2]
+    set_trial(trialname, server)
         
     maxw = 0.5
     demo(maxw)
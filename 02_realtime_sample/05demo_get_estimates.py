@@ -3,56 +3,27 @@
 
 import os
 import sys
-import lzma
-import requests
 import time
-from parse import parse
-import yaml
-import pandas as pd
 
-from evaalapi import statefmt, estfmt
+from xdrclient import log, set_trial
+from xdrclient.estimates import export_estimates, save_log
 
 server = "http://127.0.0.1:5000/evaalapi/"
 trialname = "onlinedemo"
 
 
-def do_req (req, n=2):
-    r = requests.get(server+trialname+req)
-    print("\n==>  GET " + req + " --> " + str(r.status_code))
-    if False and r.headers['content-type'].startswith("application/x-xz"):
-        l = lzma.decompress(r.content).decode('ascii').splitlines()
-    else:
-        l = r.text.splitlines()
-    if len(l) <= 2*n+1:
-        print(r.text + '\n')
-    else:
-        print('\n'.join(l[:n]
-                        + ["   ... ___%d lines omitted___ ...   " % len(l)]
-                        + l[-n:] + [""]))
-    
-    return(r)
-
 
 def demo (maxw, output_csv):
-    ## Get estimates
-    r = do_req("/estimates", 3)
-    result = []
-    for l in r.text.splitlines()[2:]: # ignore first sample (given origin)
-        print(l)
-        s = parse(estfmt, l); 
-        x, y, yaw = s.named["pos"].split(",")
-        result.append({"timestamp" : s.named["pts"], "x": x, "y": y, "yaw": yaw})
-    df = pd.DataFrame(result)
-    print(df)
-
-    df.to_csv(output_csv, index=False)
+    ## Get estimates (streamed to disk, also saved as .estimates.txt and .npz next to the CSV)
+    df = export_estimates(output_csv)
+    log.info("estimates", rows=len(df), table=str(df))
 
     ## Get log
     time.sleep(maxw)
-    r = do_req("/log", 12)
+    save_log(os.path.splitext(output_csv)[0] + ".log", 12)
 
     ## We finish here
-    print("Demo stops here")
+    log.info("Demo stops here")
 
 ################################################################
 
@@ -68,6 +39,7 @@ if omitted, TRIAL defaults to '%s' and SERVER to %s""" %
         trialname = sys.argv[1]
         server = sys.argv[2]
         output_csv = sys.argv[3]
+    set_trial(trialname, server)
 
     print("# Running %s demo test suite\n")
     print(f"trial: {trialname}, server: {server}")
@@ -3,23 +3,16 @@
 
 import os
 import sys
-import lzma
-import requests
 import time
-from parse import parse
-import yaml
 import numpy as np
 import pandas as pd
-from scipy.spatial.transform import Rotation
 
 from enum import Enum
 
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpec
-import matplotlib.animation as animation
-from collections import deque
-
-from evaalapi import statefmt, estfmt
+from xdrclient import log, set_trial, do_req, parse_state, process_data
+from xdrclient.estimates import export_estimates, save_log
+from sensor_aligner import SensorAligner
+from tag_map import quat_to_matrix
 
 server = "http://127.0.0.1:5000/evaalapi/"
 trialname = "onlinedemo"
@@ -81,7 +74,7 @@ class LocStatus(Enum):
 
 class DemoLocalizer:
     
-    def __init__(self, pdr_model, df_convert_window=20):
+    def __init__(self, pdr_model, df_convert_window=20, map_matcher=None, fusion=None, smoother=None, tag_map=None):
         self.acce_data = []
         self.gyro_data = []
         self.magn_data = []
@@ -93,11 +86,22 @@ class DemoLocalizer:
         self.last_est = (0, 0, 0)
         self.pdr_model = pdr_model
         self.df_convert_window = df_convert_window
+        self.map_matcher = map_matcher
+        self.fusion = fusion
+        self.smoother = smoother
+        self.uwbt_cursor = 0
         
         self.pdr_estimates = []
         self.yaw_angles = []
         self.vio_estimates = []
         self.last_vio_pose = None
+        # (location, rotation matrix) of every tag: preloaded from a tag map, updated by GPOS rows
+        self.tag_poses = dict(tag_map or {})
+        
+        # sorted timelines of what predict_by_pdr aligns (PDR velocity and AHRS yaw), with NumPy
+        self.aligner = SensorAligner()
+        self.aligner.add_sensor("AHRS", ["yaw", "dyaw"])
+        self.aligner.add_sensor("PDR", ["velocity"])
         
         self.state = LocStatus.INITIALIZING
         self.last_estimate_ts = None
@@ -135,6 +139,10 @@ class DemoLocalizer:
         
         ts = df_acc.index[-1]
         self.pdr_estimates.append({"timestamp": ts, "velocity": velocity})
+        self.aligner.append("PDR", acce_data_to_process[-1]["sensor_timestamp"], (velocity,))
+        
+        if self.fusion is not None:
+            self.fusion.update_speed(data["sensor_timestamp"], velocity)
 
     def callback_gyro(self, data):
         self.gyro_data.append(data)        
@@ -157,6 +165,10 @@ class DemoLocalizer:
             dyaw = wrap_angle_pi(yaw - self.yaw_angles[-1]["yaw"])
         
         self.yaw_angles.append({"timestamp" : ts, "yaw": yaw, "dyaw" : dyaw})
+        self.aligner.append("AHRS", ts, (yaw, dyaw))
+        
+        if self.fusion is not None:
+            self.fusion.update_heading(ts, yaw)
         
     def callback_uwbp(self, data):
         self.uwbp_data.append(data)
@@ -166,16 +178,28 @@ class DemoLocalizer:
         self.uwbt_data.append(data)
         self.update_timestamp(data)
         
+        if self.fusion is not None:
+            self.update_fusion_by_tag(data)
+        
     def callback_gpos(self, data):
         self.gpos_data.append(data)
         self.update_timestamp(data)
+        if data["object_id"] != "base_link":
+            self.tag_poses[data["object_id"]] = (
+                np.array((data["location_x"], data["location_y"], data["location_z"])),
+                quat_to_matrix([data["quat_x"], data["quat_y"], data["quat_z"], data["quat_w"]]))
 
         if self.state == LocStatus.INITIALIZING and data["object_id"] == "base_link":
-            q = np.array([data["quat_x"], data["quat_y"], data["quat_z"], data["quat_z"]])
+            q = np.array([data["quat_x"], data["quat_y"], data["quat_z"], data["quat_w"]])
             yaw = get_yaw_from_quat(q)
             self.last_est = (data["location_x"], data["location_y"], yaw)
             self.last_estimate_ts = data["sensor_timestamp"]
             self.state = LocStatus.INITIALIZED
+            
+            if self.fusion is not None:
+                self.fusion.initialize(data["sensor_timestamp"], data["location_x"], data["location_y"], yaw)
+            if self.smoother is not None:
+                self.smoother.initialize(data["sensor_timestamp"], data["location_x"], data["location_y"], yaw)
         
     def callback_viso(self, data):
         self.viso_data.append(data)
@@ -216,6 +240,9 @@ class DemoLocalizer:
                 "dyaw": dyaw,
                 "dt": dt
             })
+            
+            if self.fusion is not None:
+                self.fusion.update_vio(ts, dx, dy, dyaw, dt)
         
         self.last_vio_pose = current_pose
         
@@ -238,59 +265,35 @@ class DemoLocalizer:
             self.callback_viso(data)
 
     def get_latest_tag_pose(self, tag_id):
-        latest_gpos = None
-        for d in reversed(self.gpos_data):
-            if d["object_id"] == tag_id:
-                latest_gpos = d
-                break
-            
-        loc = None
-        q = None
-        if latest_gpos is not None:            
-            loc = np.array((latest_gpos["location_x"], latest_gpos["location_y"], latest_gpos["location_z"]))
-            q = np.array([latest_gpos["quat_x"], latest_gpos["quat_y"], latest_gpos["quat_z"], latest_gpos["quat_w"]])
-        return loc, q
+        return self.tag_poses.get(tag_id, (None, None))
 
     def predict_by_pdr(self):
         if self.last_estimate_ts is None or len(self.pdr_estimates) == 0 or len(self.yaw_angles) == 0:
             return self.last_est
         
-        df_pdr = pd.DataFrame(self.pdr_estimates)
-        df_pdr['timestamp'] = pd.to_datetime(df_pdr['timestamp'])
-        df_pdr = df_pdr.set_index('timestamp')
-        
-        df_yaw = pd.DataFrame(self.yaw_angles)
-        df_yaw['timestamp'] = pd.to_datetime(df_yaw['timestamp'], unit='s')
-        df_yaw = df_yaw.set_index('timestamp')
+        # PDR velocities newer than the last estimate, with the nearest AHRS yaw within 20 ms
+        ts, pdr, ahrs = self.aligner.match("PDR", "AHRS", since=self.last_estimate_ts, tolerance=0.02)
         
-        merged_df = pd.merge_asof(df_pdr, df_yaw, left_index=True, right_index=True, 
-                                 tolerance=pd.Timedelta('0.02s'), direction='nearest')
-        
-        last_est_ts = pd.to_datetime(self.last_estimate_ts, unit='s')
+        if len(ts) == 0:
+            return self.last_est
         
-        filtered_df = merged_df[merged_df.index > last_est_ts]
+        # each step lasts from the previous distinct PDR timestamp (or the last estimate)
+        distinct = np.unique(ts)
+        pos = np.searchsorted(distinct, ts)
+        prev_ts = np.where(pos > 0, distinct[np.maximum(pos - 1, 0)], self.last_estimate_ts)
+        dt = ts - prev_ts
         
-        if len(filtered_df) == 0:
-            return self.last_est
+        velocity = pdr[:, 0]
+        valid = ~np.isnan(velocity) & ~np.isnan(ahrs[:, 0])
+        dyaw = np.where(valid, ahrs[:, 1], 0.0)
         
+        # dead reckoning: each step moves along the yaw accumulated before it
         x, y, yaw = self.last_est
-        
-        for idx, row in filtered_df.iterrows():
-            if pd.notna(row['velocity']) and pd.notna(row['yaw']):
-                if idx == filtered_df.index[0]:
-                    dt = (idx - last_est_ts).total_seconds()
-                else:
-                    prev_idx = filtered_df.index[filtered_df.index < idx][-1]
-                    dt = (idx - prev_idx).total_seconds()
-                
-                velocity = row['velocity']
-                
-                dx = velocity * np.cos(yaw) * dt
-                dy = velocity * np.sin(yaw) * dt
-                
-                x += dx
-                y += dy
-                yaw += row['dyaw']
+        yaw_before = yaw + np.cumsum(dyaw) - dyaw
+        step = np.where(valid, velocity * dt, 0.0)
+        x += np.sum(step * np.cos(yaw_before))
+        y += np.sum(step * np.sin(yaw_before))
+        yaw += np.sum(dyaw)
         
         est = (x, y, wrap_angle_pi(yaw))
         return est
@@ -324,33 +327,99 @@ class DemoLocalizer:
         tag_id = latest_uwbt["tag_id"]
         
         if latest_uwbt["sensor_timestamp"] > self.last_estimate_ts:
-            print(tag_id)
-            
-            tag_loc, tag_q = self.get_latest_tag_pose(tag_id)
-            print(tag_loc, tag_q)
+            tag_loc, R = self.get_latest_tag_pose(tag_id)
+            log.debug("tag", tag_id=tag_id, loc=tag_loc)
 
             if tag_loc is not None:
                 local_point = spherical_to_cartesian(latest_uwbt["distance"], latest_uwbt["aoa_azimuth"], latest_uwbt["aoa_elevation"])
-                R = Rotation.from_quat(tag_q)
-                global_point = R.apply(local_point) + tag_loc
+                global_point = R @ local_point + tag_loc
                 
                 est = (float(global_point[0]), float(global_point[1]), self.last_est[2])
                 return est
             
         return self.last_est
             
+    def get_tag_fix(self, uwbt):
+        tag_loc, R = self.get_latest_tag_pose(uwbt["tag_id"])
+        if tag_loc is None:
+            return None
+        
+        local_point = spherical_to_cartesian(uwbt["distance"], uwbt["aoa_azimuth"], uwbt["aoa_elevation"])
+        return R @ local_point + tag_loc
+    
+    def update_fusion_by_tag(self, uwbt):
+        global_point = self.get_tag_fix(uwbt)
+        if global_point is not None:
+            self.fusion.update_position(uwbt["sensor_timestamp"], global_point[0], global_point[1], uwbt["distance"])
+    
+    def estimate_location_fixed_lag(self):
+        new_vio = []
+        for vio_data in reversed(self.vio_estimates):
+            if vio_data["timestamp"] <= self.last_estimate_ts:
+                break
+            new_vio.append(vio_data)
+        # a delta spanning a VIO outage is not trusted, PDR covers the step instead
+        vio_available = len(new_vio) > 0 and all(vio_data["dt"] < 0.5 for vio_data in new_vio)
+        
+        if vio_available:
+            # VIO frame is not aligned with the map: use travelled distance and heading change only
+            dist = sum(np.hypot(vio_data["dx"], vio_data["dy"]) for vio_data in new_vio)
+            dyaw = sum(vio_data["dyaw"] for vio_data in new_vio)
+            local_dx, local_dy = dist, 0.0
+            sigma_xy, sigma_yaw = 0.02 + 0.05 * dist, 0.01
+        else:
+            # odometry of this step, in the frame of the previous estimate
+            est = self.predict_by_pdr()
+            x0, y0, yaw0 = self.last_est
+            dx, dy = est[0] - x0, est[1] - y0
+            dist = np.hypot(dx, dy)
+            local_dx = np.cos(yaw0) * dx + np.sin(yaw0) * dy
+            local_dy = -np.sin(yaw0) * dx + np.cos(yaw0) * dy
+            dyaw = wrap_angle_pi(est[2] - yaw0)
+            sigma_xy, sigma_yaw = 0.1 + 0.3 * dist, 0.05
+        self.smoother.add_pose(self.newest_data_ts, local_dx, local_dy, dyaw, sigma_xy, sigma_yaw)
+        
+        # every UWB fix received since the previous step
+        for uwbt in self.uwbt_data[self.uwbt_cursor:]:
+            global_point = self.get_tag_fix(uwbt)
+            if global_point is not None:
+                self.smoother.add_position(global_point[0], global_point[1], uwbt["distance"])
+        self.uwbt_cursor = len(self.uwbt_data)
+        
+        est = self.smoother.solve()
+        if self.map_matcher is not None:
+            est = self.map_matcher.snap_estimate(est)
+        self.last_est = est
+        self.last_estimate_ts = self.newest_data_ts
+        return est
+            
     def estimate_location(self):
         if self.state != LocStatus.INITIALIZED:
             return self.last_est
         
+        if self.fusion is not None:
+            # every sample has already been fused in its callback
+            est = self.fusion.estimate(self.newest_data_ts)
+            if self.map_matcher is not None:
+                est = self.map_matcher.snap_estimate(est)
+            self.last_est = est
+            self.last_estimate_ts = self.newest_data_ts
+            return est
+        
+        if self.smoother is not None:
+            return self.estimate_location_fixed_lag()
+        
         vio_available = (self.vio_estimates[-1]["timestamp"] > self.last_estimate_ts)
 
+        log.debug("vio", available=vio_available)
         if vio_available:
-            print("vio available")
             est = self.predict_by_vio()
         else:
-            print("vio not available")
             est = self.predict_by_pdr()
+        
+        if self.map_matcher is not None:
+            # snap dead-reckoned estimate onto the nearest walkable corridor
+            est = self.map_matcher.snap_estimate(est)
             
         self.last_est = est
         
@@ -364,108 +433,45 @@ class DemoLocalizer:
         return est
     
 
-def split_lines(r):
-    if False and r.headers['content-type'].startswith("application/x-xz"):
-        l = lzma.decompress(r.content).decode('ascii').splitlines()
-    else:
-        l = r.text.splitlines()
-    return l
-
-
-def do_req (req, n=2):
-    r = requests.get(server+trialname+req)
-    print("\n==>  GET " + req + " --> " + str(r.status_code))
-    l = split_lines(r)
-    if len(l) <= 2*n+1:
-        print(r.text + '\n')
-    else:
-        print('\n'.join(l[:n]
-                        + ["   ... ___%d lines omitted___ ...   " % len(l)]
-                        + l[-n:] + [""]))
-    
-    return r
-
 
-def parse_data(sensor_type, data_row):
-    
-    # Column names for each sensor type
-    columns = {
-        'ACCE': ['app_timestamp', 'sensor_timestamp', 'acc_x', 'acc_y', 'acc_z', 'accuracy'],
-        'GYRO': ['app_timestamp', 'sensor_timestamp', 'gyr_x', 'gyr_y', 'gyr_z', 'accuracy'],
-        'MAGN': ['app_timestamp', 'sensor_timestamp', 'mag_x', 'mag_y', 'mag_z', 'accuracy'],
-        'AHRS': ['app_timestamp', 'sensor_timestamp', 'pitch_x', 'roll_y', 'yaw_z', 'quat_2', 'quat_3', 'quat_4', 'quat_w', 'accuracy'],
-        'UWBP': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'direction_vec_x', 'direction_vec_y', 'direction_vec_z'],
-        'UWBT': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'aoa_azimuth', 'aoa_elevation', 'nlos'],
-        'GPOS': ['app_timestamp', 'sensor_timestamp', 'object_id', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w'],
-        'VISO': ['app_timestamp', 'sensor_timestamp', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w']
-    }
-    if sensor_type not in columns: 
-        return None
-    
-    row_dict = {}
-    for i, col_name in enumerate(columns[sensor_type]):
-        if i < len(data_row):  # Ensure we don't go out of bounds
-            # Convert numeric values to float, except for specific ID fields
-            if col_name not in ['tag_id', 'object_id']:
-                try:
-                    row_dict[col_name] = float(data_row[i])
-                except (ValueError, TypeError):
-                    row_dict[col_name] = data_row[i]
-            else:
-                row_dict[col_name] = data_row[i]
-    return row_dict
-
-
-def process_data(localizer, recv_data):
-    recv_sensor_lines = split_lines(recv_data)
-
-    # Dictionary to store structured data
-    sensor_dictionaries = {}
-    
-    for line in recv_sensor_lines:
-        # Skip empty lines
-        if not line.strip():
-            continue
-        
-        # Split the line by semicolon
-        parts = line.strip().split(';')
-        
-        # Get sensor type (first part of the line)
-        sensor_type = parts[0]
-        data_row = parts[1:]
-    
-        row_dict = parse_data(sensor_type, data_row)
-        if row_dict is not None:
-                    
-            localizer.callback(sensor_type, row_dict)
-    
-    est = localizer.estimate_location()
-    
-    return est 
-
-
-def demo (maxw, output_csv):
+def demo (maxw, output_csv, map_bitmap=None, use_ekf=False, use_fixed_lag=False, tag_map_file=None):
     pdr_model = SimplePDR()
-    localizer = DemoLocalizer(pdr_model=pdr_model)
+    # optional estimators are imported only when selected, to keep the start-up light
+    map_matcher = None
+    if map_bitmap is not None:
+        from map_matching import CorridorGraph
+        map_matcher = CorridorGraph.load_or_build(map_bitmap) # cached next to the bitmap after the first run
+    fusion = None
+    if use_ekf:
+        from ekf_fusion import FusionEKF
+        fusion = FusionEKF()
+    smoother = None
+    if use_fixed_lag:
+        from fixed_lag_smoother import FixedLagSmoother
+        smoother = FixedLagSmoother(window_sec=5.0, max_poses=20, max_iterations=3)
+    tag_map = None
+    if tag_map_file is not None:
+        from tag_map import load_tag_map
+        tag_map = load_tag_map(tag_map_file)
+    localizer = DemoLocalizer(pdr_model=pdr_model, map_matcher=map_matcher, fusion=fusion, smoother=smoother, tag_map=tag_map)
 
     ## First of all, reload
     r = do_req("/reload")
 
     ## Check initial state
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
 
     ## Get first 0.5s worth of data
     time.sleep(maxw)
     r = do_req("/nextdata?horizon=0.5")
     est = process_data(localizer, r)
-    print("---")
-    print(est)
+    log.info("step", est=est)
 
     ## Look at remaining time
     time.sleep(maxw)
     r = do_req("/state")
-    s = parse(statefmt, r.text); print(s.named)
+    s = parse_state(r.text); log.info("state", **s.named)
     
     ## Set estimates
     time.sleep(maxw)
@@ -476,32 +482,22 @@ def demo (maxw, output_csv):
             continue
         
         est = process_data(localizer, r)
-        print("---")
-        print(est)
+        log.info("step", est=est)
         time.sleep(maxw)
         
         if r.status_code == 405:
             break # end of competition data
 
-    ## Get estimates
-    r = do_req("/estimates", 3)
-    result = []
-    for l in r.text.splitlines()[2:]: # ignore first sample (given origin)
-        print(l)
-        s = parse(estfmt, l); 
-        x, y, yaw = s.named["pos"].split(",")
-        result.append({"timestamp" : s.named["pts"], "x": x, "y": y, "yaw": yaw})
-    df = pd.DataFrame(result)
-    print(df)
-
-    df.to_csv(output_csv, index=False)
+    ## Get estimates (streamed to disk, also saved as .estimates.txt and .npz next to the CSV)
+    df = export_estimates(output_csv)
+    log.info("estimates", rows=len(df), table=str(df))
 
     ## Get log
     time.sleep(maxw)
-    r = do_req("/log", 12)
+    save_log(os.path.splitext(output_csv)[0] + ".log", 12)
 
     ## We finish here
-    print("Demo stops here")
+    log.info("Demo stops here")
 
 ################################################################
 
@@ -517,7 +513,12 @@ if __name__ == '__main__':
         trialname = sys.argv[1]
         server = sys.argv[2]
         output_csv = sys.argv[3]
+    set_trial(trialname, server)
         
     maxw = 0.0 # set this value to 0.0 to run at maximum speed
-    demo(maxw, output_csv)
+    map_bitmap = None # set this to "../map/miraikan_5.bmp" to snap PDR/VIO estimates onto the corridors
+    use_ekf = False # set this to True to fuse PDR, AHRS, VIO and every UWB fix with an EKF
+    use_fixed_lag = False # set this to True to re-optimise the last 5 s of poses at every step instead
+    tag_map_file = None # set this to "tag_map.npz" (see tag_map.py) to have UWB fixes before the GPOS rows of the tags
+    demo(maxw, output_csv, map_bitmap, use_ekf, use_fixed_lag, tag_map_file)
     exit(0)
@@ -0,0 +1,183 @@
+#! /usr/bin/env -S python3
+
+import sys
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from xdrclient import process_data
+from xdrclient.aio import AsyncClient, Response
+from xdrclient.demo import load_demo
+
+server = "http://127.0.0.1:5000/evaalapi/"
+trials = "onlinedemo"
+
+
+################################################################
+# Worker side: every session lives in exactly one process, which keeps its DemoLocalizer
+
+_localizers = {}
+
+
+def open_session(name):
+    demo = load_demo()
+    _localizers[name] = demo.DemoLocalizer(pdr_model=demo.SimplePDR())
+
+
+def close_session(name):
+    _localizers.pop(name, None)
+
+
+def step(name, content):
+    """Feed one /nextdata reply to the session's localizer; returns the estimate and the CPU time used"""
+    t = time.process_time()
+    est = process_data(_localizers[name], Response(200, {}, content))
+    return tuple(float(v) for v in est), time.process_time() - t
+
+
+################################################################
+# Host side
+
+class Session:
+    """One trial driven through the EvAAL API with its own connection, pacing and localizer"""
+
+    def __init__(self, trialname, maxw, run_step):
+        self.trialname = trialname
+        self.maxw = maxw
+        self.run_step = run_step
+        self.client = AsyncClient(server + trialname)
+
+        self.steps = 0
+        self.locked = 0              # 423 replies: the session was ahead of the trial clock
+        self.request_times = []
+        self.estimate_times = []
+        self.estimate_cpu = 0.0
+        self.trial_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    async def request(self, req):
+        t = time.perf_counter()
+        r = await self.client.get(req)
+        self.request_times.append(time.perf_counter() - t)
+        return r
+
+    async def estimate(self, r):
+        t = time.perf_counter()
+        est, cpu = await self.run_step(self.trialname, r.content)
+        self.estimate_times.append(time.perf_counter() - t)
+        self.estimate_cpu += cpu
+        self.steps += 1
+
+        lines = r.text.splitlines()
+        if len(lines) > 0:
+            try:
+                self.trial_seconds = float(lines[-1].split(';')[1])
+            except (IndexError, ValueError):
+                pass
+        return est
+
+    async def run(self):
+        t_start = time.perf_counter()
+        await self.request("/reload")
+        await self.request("/state")
+
+        await asyncio.sleep(self.maxw)
+        r = await self.request("/nextdata?horizon=0.5")
+        est = await self.estimate(r)
+
+        while True:
+            await asyncio.sleep(self.maxw)
+            r = await self.request("/nextdata?position=%.3f,%.3f,%.3f" % est)
+            if r.status_code == 423: # faster than real time, wait a while
+                self.locked += 1
+                await asyncio.sleep(0.05)
+                continue
+            if r.status_code == 405: # end of the trial
+                break
+            est = await self.estimate(r)
+
+        await self.client.close()
+        self.wall_seconds = time.perf_counter() - t_start
+
+
+def percentile_ms(values, q):
+    return 1000 * np.percentile(values, q) if len(values) else float('nan')
+
+
+def report(sessions, n_workers, wall, host_cpu):
+    print(f"\n{len(sessions)} sessions, {n_workers or 'no'} worker processes, {wall:.2f} s wall")
+    print("trial                steps   423  trial_s  trial_s/wall_s  req p50/p95 ms  est p50/p95 ms")
+    for s in sessions:
+        rate = s.trial_seconds / s.wall_seconds if s.wall_seconds > 0 else float('nan')
+        print(f"{s.trialname:<20} {s.steps:5d} {s.locked:5d} {s.trial_seconds:8.1f} {rate:15.1f}"
+              f"  {percentile_ms(s.request_times, 50):6.1f}/{percentile_ms(s.request_times, 95):6.1f}"
+              f"  {percentile_ms(s.estimate_times, 50):6.1f}/{percentile_ms(s.estimate_times, 95):6.1f}")
+
+    trial_total = sum(s.trial_seconds for s in sessions)
+    estimate_cpu = sum(s.estimate_cpu for s in sessions)
+    # in-process estimation is already part of the host CPU time
+    cpu = host_cpu + (estimate_cpu if n_workers else 0.0)
+    print(f"\ntrial seconds processed per wall second: {trial_total / wall:.1f}")
+    print(f"CPU per trial second: {1000 * cpu / trial_total:.2f} ms "
+          f"(estimation {1000 * estimate_cpu / trial_total:.2f} ms, host {1000 * (cpu - estimate_cpu) / trial_total:.2f} ms)")
+    print(f"=> one core sustains about {trial_total / cpu:.0f} real-time sessions")
+
+
+async def host(trialnames, n_workers, maxw):
+    loop = asyncio.get_running_loop()
+    pools = [ProcessPoolExecutor(max_workers=1) for _ in range(n_workers)]
+    pinned = {}
+
+    async def run_step(name, content):
+        if not pools:
+            return step(name, content)
+        return await loop.run_in_executor(pinned[name], step, name, content)
+
+    for i, name in enumerate(trialnames):
+        if pools:
+            pinned[name] = pools[i % len(pools)]
+            await loop.run_in_executor(pinned[name], open_session, name)
+        else:
+            open_session(name)
+
+    sessions = [Session(name, maxw, run_step) for name in trialnames]
+    t = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*(s.run() for s in sessions))
+    wall = time.perf_counter() - t
+    host_cpu = time.process_time() - cpu
+
+    for name in trialnames:
+        if pools:
+            await loop.run_in_executor(pinned[name], close_session, name)
+        else:
+            close_session(name)
+    for pool in pools:
+        pool.shutdown()
+
+    report(sessions, n_workers, wall, host_cpu)
+    return sessions
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4, 5):
+        print("""Drive many EvAAL API trials concurrently from one process.  Usage is
+%s [trials] [server] [workers] [maxw]
+
+TRIALS is a comma separated list of trial names (one session each, e.g. trial001,trial002,trial005).
+WORKERS is the number of estimation processes (default 0: estimate in the event loop, i.e. on one core).
+MAXW is the pause between requests of each session in seconds (default 0.0)""" % sys.argv[0])
+        exit(1)
+
+    trials = sys.argv[1]
+    server = sys.argv[2]
+    n_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    maxw = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+
+    asyncio.run(host(trials.split(","), n_workers, maxw))
+    exit(0)
@@ -0,0 +1,127 @@
+#! /usr/bin/env -S python3
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+import numpy as np
+
+from xdrclient import set_trial, do_req, process_data
+from xdrclient.demo import load_demo
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaalapi_server"))
+from local_server import load_trials, serve
+from synthetic_trial import make_trial
+
+
+def write_prefix(trial_filename, filename, length):
+    """The first `length` seconds (app timestamp) of a real trial file"""
+    with open(trial_filename, 'r') as src, open(filename, 'w') as dst:
+        t0 = None
+        for line in src:
+            try:
+                ts = float(line.split(';', 2)[1])
+            except (IndexError, ValueError):
+                dst.write(line)
+                continue
+            t0 = ts if t0 is None else t0
+            if ts - t0 > length:
+                break
+            dst.write(line)
+
+
+def prepare_trials(directory, lengths, trial_filename=None):
+    """evaalapi.yaml and trials/ with one trial per length, cut from trial_filename or synthetic"""
+    os.makedirs(os.path.join(directory, "trials"), exist_ok=True)
+    with open(os.path.join(directory, "evaalapi.yaml"), 'w') as f:
+        for length in lengths:
+            name = "bench%d" % length
+            if trial_filename is None:
+                make_trial(os.path.join(directory, "trials", name + ".txt"), length)
+            else:
+                write_prefix(trial_filename, os.path.join(directory, "trials", name + ".txt"), length)
+            f.write(f"{name}:\n    datafile: {name}.txt\n    inipos: 0,0,0\n    reloadable: True\n\n")
+    return os.path.join(directory, "evaalapi.yaml")
+
+
+def run_trial(demo):
+    """The 06demo loop with maxw = 0.0; per step: request time, estimation time, number of samples"""
+    localizer = demo.DemoLocalizer(pdr_model=demo.SimplePDR())
+    steps = []
+    trial_seconds = 0.0
+    do_req("/reload")
+    do_req("/state")
+    req = "/nextdata?horizon=0.5"
+    while True:
+        t = time.perf_counter()
+        r = do_req(req)
+        t_req = time.perf_counter() - t
+        if r.status_code == 405:
+            break
+        lines = r.text.splitlines()
+        t = time.perf_counter()
+        est = process_data(localizer, r)
+        steps.append((t_req, time.perf_counter() - t, len(lines)))
+        if len(lines) > 0:
+            try:
+                trial_seconds = float(lines[-1].split(';')[1])
+            except (IndexError, ValueError):
+                pass
+        req = "/nextdata?position=%.3f,%.3f,%.3f" % (est[0], est[1], est[2])
+    return np.array(steps), trial_seconds
+
+
+def report(results):
+    print("length_s  steps   req/s  samples/s  step p50/p95/p99/max ms        RTF  late/early")
+    for length, steps, trial_seconds, wall in results:
+        step = 1000 * steps[:, :2].sum(axis=1)
+        quarter = max(len(step) // 4, 1)
+        growth = step[-quarter:].mean() / step[:quarter].mean()
+        print(f"{length:8.0f} {len(steps):6d} {len(steps) / wall:7.1f} {steps[:, 2].sum() / wall:10.0f}"
+              f"  {np.percentile(step, 50):6.1f}/{np.percentile(step, 95):6.1f}/{np.percentile(step, 99):6.1f}/{step.max():6.1f}"
+              f" {trial_seconds / wall:10.1f} {growth:11.2f}")
+    print("(request time included in steps; late/early = mean step time of the last quarter / first quarter)")
+
+    if len(results) > 1:
+        lengths = np.array([r[0] for r in results], dtype=float)
+        walls = np.array([r[3] for r in results])
+        exponent = np.polyfit(np.log(lengths), np.log(walls), 1)[0]
+        print(f"\nwall time ~ length^{exponent:.2f} (1: linear, 2: quadratic)")
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 3:
+        print("""End-to-end benchmark of the 06demo loop against the local EvAAL API server.  Usage is
+%s [lengths] [trial_file]
+
+LENGTHS is a comma separated list of trial lengths in seconds (default 30,60,120,240).
+Trials are synthetic unless TRIAL_FILE is given, in which case its first LENGTH seconds are used.""" % sys.argv[0])
+        exit(1)
+
+    lengths = [float(v) for v in sys.argv[1].split(",")] if len(sys.argv) > 1 else [30, 60, 120, 240]
+    trial_filename = sys.argv[2] if len(sys.argv) > 2 else None
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = prepare_trials(directory, lengths, trial_filename)
+        httpd = serve(load_trials(config, os.path.join(directory, "trials")), port=0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:%d/evaalapi/" % httpd.server_address[1]
+
+        demo = load_demo() # logging is quiet from here: do_req and the localizer log at every step
+        results = []
+        for length in lengths:
+            set_trial("bench%d" % length, url)
+            t = time.perf_counter()
+            steps, trial_seconds = run_trial(demo)
+            wall = time.perf_counter() - t
+            results.append((length, steps, trial_seconds, wall))
+            print(f"bench{length:.0f}: {len(steps)} steps in {wall:.1f} s", file=sys.stderr)
+        httpd.shutdown()
+
+    report(results)
+    exit(0)
@@ -0,0 +1,204 @@
+#! /usr/bin/env -S python3
+
+"""
+Health report of a dataset: timing and integrity of every sensor of every trial file.
+
+Each trial is read once (read_trial) and, for every sensor, computed with NumPy:
+    rate        samples per second of sensor time, median interval
+    gaps        intervals longer than GAP_FACTOR median intervals (at least MIN_GAP s)
+    jitter      standard deviation and 99th percentile of the other intervals
+    order       sensor timestamps going back (per tag/object for UWBP, UWBT, GPOS),
+                app timestamps going back in file order, repeated sensor timestamps
+    NaN         values that are missing or not numbers, and rows with any
+    offset      app - sensor timestamp: median, spread (1st to 99th percentile) and drift
+Trials are processed in parallel (one process per core by default) and the summary is written
+as one HTML table or JSON file.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import html
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from xdrclient.sensors import ID_COLUMNS
+from trialfile import read_trial
+
+GAP_FACTOR = 5
+MIN_GAP = 0.2 # s
+
+METRICS = ["samples", "duration_s", "rate_hz", "median_dt_ms", "jitter_ms", "p99_dt_ms",
+           "gaps", "longest_gap_s", "gap_total_s", "out_of_order", "out_of_order_app", "duplicates",
+           "nan_values", "nan_rows", "offset_median_s", "offset_spread_ms", "offset_drift_ms_per_min"]
+# a non-zero value of these is reported as an issue
+ISSUES = ["gaps", "out_of_order", "out_of_order_app", "duplicates", "nan_values"]
+
+
+def intervals(ts, ids=None):
+    """Differences of successive timestamps in file order, within each id if given"""
+    if ids is None:
+        return np.diff(ts)
+    codes, _ = pd.factorize(ids)
+    order = np.argsort(codes, kind="stable")
+    same = codes[order][1:] == codes[order][:-1]
+    return np.diff(ts[order])[same]
+
+
+def sensor_health(df):
+    app = df["app_timestamp"].to_numpy(dtype=float)
+    sensor = df["sensor_timestamp"].to_numpy(dtype=float)
+    id_column = next((c for c in df.columns if c in ID_COLUMNS), None)
+    numeric = df[[c for c in df.columns if c not in ID_COLUMNS]].to_numpy(dtype=float)
+    nan = np.isnan(numeric)
+
+    m = {"samples": len(df), "nan_values": int(nan.sum()), "nan_rows": int(nan.any(axis=1).sum())}
+    ok = ~np.isnan(sensor)
+    ids = df[id_column].to_numpy()[ok] if id_column else None
+    dt = intervals(sensor[ok], ids)
+    m["out_of_order"] = int((dt < 0).sum())
+    m["duplicates"] = int((dt == 0).sum())
+    m["out_of_order_app"] = int((np.diff(app[~np.isnan(app)]) < 0).sum())
+    m["duration_s"] = float(sensor[ok].max() - sensor[ok].min()) if ok.any() else 0.0
+    m["rate_hz"] = (m["samples"] - 1) / m["duration_s"] if m["duration_s"] > 0 else np.nan
+
+    forward = dt[dt > 0]
+    if len(forward):
+        median = np.median(forward)
+        gap = forward > max(GAP_FACTOR * median, MIN_GAP)
+        regular = forward[~gap]
+        m.update(median_dt_ms=1000 * median, jitter_ms=1000 * regular.std() if len(regular) else np.nan,
+                 p99_dt_ms=1000 * np.percentile(regular, 99) if len(regular) else np.nan,
+                 gaps=int(gap.sum()), longest_gap_s=float(forward[gap].max()) if gap.any() else 0.0,
+                 gap_total_s=float(forward[gap].sum()))
+    else:
+        m.update(median_dt_ms=np.nan, jitter_ms=np.nan, p99_dt_ms=np.nan, gaps=0, longest_gap_s=0.0, gap_total_s=0.0)
+
+    both = ok & ~np.isnan(app)
+    offset = app[both] - sensor[both]
+    if len(offset):
+        p1, p50, p99 = np.percentile(offset, [1, 50, 99])
+        drift = np.polyfit(app[both], offset, 1)[0] if np.ptp(app[both]) > 0 else 0.0
+        m.update(offset_median_s=p50, offset_spread_ms=1000 * (p99 - p1), offset_drift_ms_per_min=60000 * drift)
+    else:
+        m.update(offset_median_s=np.nan, offset_spread_ms=np.nan, offset_drift_ms_per_min=np.nan)
+    return {k: m[k] for k in METRICS}
+
+
+def trial_health(filename):
+    t = time.perf_counter()
+    data = read_trial(filename)
+    return {
+        "file": filename,
+        "bytes": os.path.getsize(filename),
+        "sensors": {sensor_type: sensor_health(df) for sensor_type, df in sorted(data.items())},
+        "seconds": time.perf_counter() - t,
+    }
+
+
+def trial_files(specs):
+    """Trial files of a comma separated list of files and directories (their .txt and .xdra files)"""
+    files = []
+    for spec in specs.split(","):
+        if os.path.isdir(spec):
+            files += sorted(glob.glob(os.path.join(spec, "*.txt")) + glob.glob(os.path.join(spec, "*.xdra")))
+        else:
+            files.append(spec)
+    return files
+
+
+def health(files, workers):
+    if workers == 0:
+        return [trial_health(f) for f in files]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(trial_health, files))
+
+
+def table(trials):
+    """One row per trial and sensor"""
+    rows = [{"trial": os.path.basename(t["file"]), "sensor": s, **m} for t in trials for s, m in t["sensors"].items()]
+    df = pd.DataFrame(rows, columns=["trial", "sensor"] + METRICS)
+    df["issues"] = [", ".join(k for k in ISSUES if row[k] > 0) for _, row in df.iterrows()]
+    return df
+
+
+def to_json(value):
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_json(v) for v in value]
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else round(float(value), 6)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def write_json(filename, trials, settings):
+    with open(filename, 'w') as f:
+        json.dump(to_json({"settings": settings, "trials": trials}), f, indent=1)
+
+
+def write_html(filename, trials, settings):
+    df = table(trials)
+    totals = df.groupby("sensor").agg(trials=("trial", "size"), samples=("samples", "sum"), rate_hz=("rate_hz", "median"),
+                                      gaps=("gaps", "sum"), out_of_order=("out_of_order", "sum"), nan_values=("nan_values", "sum"))
+    # rows with issues are highlighted
+    cell = lambda v: "-" if isinstance(v, float) and np.isnan(v) else ("%.3f" % v if isinstance(v, float) else html.escape(str(v)))
+    rows = ["<tr><th>" + "</th><th>".join(df.columns) + "</th></tr>"]
+    for values in df.itertuples(index=False):
+        rows.append(("<tr class=\"issue\">" if values.issues else "<tr>") + "".join(f"<td>{cell(v)}</td>" for v in values) + "</tr>")
+    with open(filename, 'w') as f:
+        f.write(f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Dataset health</title>
+<style>
+body {{ font-family: sans-serif; font-size: 13px; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 2px 6px; text-align: right; }}
+tr.issue {{ background: #fde8e8; }}
+</style></head><body>
+<h1>Dataset health</h1>
+<p>{len(trials)} trials, {sum(t["bytes"] for t in trials) / 1e6:.1f} MB. {html.escape(json.dumps(settings))}</p>
+<h2>Per sensor</h2>
+{totals.to_html(float_format=lambda v: "%.3f" % v)}
+<h2>Per trial and sensor</h2>
+<table>
+{chr(10).join(rows)}
+</table>
+</body></html>
+""")
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3, 4):
+        print("""Timing and integrity report of the sensors of every trial.  Usage is
+%s trials [output] [workers]
+
+TRIALS is a comma separated list of trial files (.txt or .xdra) and directories of trial files.
+OUTPUT is an .html or .json file (default dataset_health.html).  WORKERS defaults to the number
+of cores; 0 runs in this process.""" % sys.argv[0])
+        exit(1)
+
+    files = trial_files(sys.argv[1])
+    output = sys.argv[2] if len(sys.argv) > 2 else "dataset_health.html"
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    t = time.perf_counter()
+    trials = health(files, workers)
+    settings = {"gap_factor": GAP_FACTOR, "min_gap_s": MIN_GAP}
+    if output.endswith(".json"):
+        write_json(output, trials, settings)
+    else:
+        write_html(output, trials, settings)
+    df = table(trials)
+    print(df[["trial", "sensor", "samples", "rate_hz", "gaps", "jitter_ms", "out_of_order", "nan_values", "offset_median_s", "issues"]]
+          .to_string(index=False, float_format=lambda v: "%.3f" % v))
+    print(f"\n{len(files)} trials in {time.perf_counter() - t:.1f} s ({workers} workers), written to {output}")
+    exit(0)
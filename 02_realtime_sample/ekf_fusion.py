@@ -0,0 +1,191 @@
+import math
+
+import numpy as np
+
+
+def wrap_angle_pi(angle):
+    """Wrap angle to (-π, π] range"""
+    wrapped = angle % (2 * math.pi)
+    if wrapped > math.pi:
+        wrapped -= 2 * math.pi
+    return wrapped
+
+
+# State vector layout
+IX, IY, IYAW, IV, IB = range(5)
+
+
+class FusionEKF:
+    """
+    Extended Kalman Filter fusing PDR speed, AHRS heading, VIO odometry and UWB fixes.
+
+    The state is fixed to (x, y, yaw, velocity, heading-rate bias) and all matrices are
+    preallocated, so every prediction and update costs O(1) regardless of the trial length.
+    The AHRS yaw is used as a heading-rate input (its absolute value is not aligned to the
+    map frame), and the bias state absorbs its drift against VIO heading changes.
+    """
+
+    def __init__(self,
+                 q_pos=0.01, q_yaw=0.001, q_vel=0.5, q_bias=1e-6,
+                 r_pdr_speed=0.3**2, r_vio_speed=0.05**2, r_vio_dyaw=0.01**2,
+                 r_uwb=0.3**2, r_uwb_aoa=np.radians(5.0)**2, uwb_gate=9.21, uwb_max_rejections=5):
+        self.s = np.zeros(5)
+        self.P = np.eye(5)
+        self.F = np.eye(5)
+        self.Q = np.diag([q_pos, q_pos, q_yaw, q_vel, q_bias])
+
+        # Work buffers, reused by every step
+        self._tmp = np.empty((5, 5))
+        self._k = np.empty(5)
+        self._qdt = np.empty((5, 5))
+
+        self.r_pdr_speed = r_pdr_speed
+        self.r_vio_speed = r_vio_speed
+        self.r_vio_dyaw = r_vio_dyaw
+        self.r_uwb = r_uwb
+        self.r_uwb_aoa = r_uwb_aoa
+        self.uwb_gate = uwb_gate  # chi-square gate for 2 dof (99%)
+        self.uwb_max_rejections = uwb_max_rejections
+        self.uwb_rejections = 0
+
+        self.ts = None
+        self.last_ahrs_yaw = None
+        # heading input accumulated since the last VIO sample, to observe the bias
+        self.dyaw_since_vio = 0.0
+        self.dt_since_vio = 0.0
+
+    @property
+    def initialized(self):
+        return self.ts is not None
+
+    def initialize(self, ts, x, y, yaw, velocity=0.0, cov=(0.1, 0.1, 0.05, 0.5, 1e-4)):
+        self.s[:] = (x, y, yaw, velocity, 0.0)
+        self.P[:] = np.diag(cov)
+        self.ts = ts
+        self.dyaw_since_vio = 0.0
+        self.dt_since_vio = 0.0
+
+    def predict(self, ts, dyaw=0.0):
+        """Propagate the state to ts with the constant velocity model and a heading increment"""
+        if not self.initialized:
+            return
+        dt = ts - self.ts
+        if dt < 0:
+            dt = 0.0  # out-of-order sample, only apply the heading increment
+        else:
+            self.ts = ts
+
+        s = self.s
+        c = math.cos(s[IYAW])
+        sn = math.sin(s[IYAW])
+        v = s[IV]
+
+        F = self.F
+        F[IX, IYAW] = -v * sn * dt
+        F[IX, IV] = c * dt
+        F[IY, IYAW] = v * c * dt
+        F[IY, IV] = sn * dt
+        F[IYAW, IB] = -dt
+
+        s[IX] += v * c * dt
+        s[IY] += v * sn * dt
+        s[IYAW] = wrap_angle_pi(s[IYAW] + dyaw - s[IB] * dt)
+
+        # P = F P F^T + Q dt
+        np.dot(F, self.P, out=self._tmp)
+        np.dot(self._tmp, F.T, out=self.P)
+        np.multiply(self.Q, dt, out=self._qdt)
+        self.P += self._qdt
+
+        self.dyaw_since_vio += dyaw
+        self.dt_since_vio += dt
+
+    def _update_scalar(self, i, innovation, r, h=1.0):
+        """Measurement update for z = h * s[i] + noise"""
+        P = self.P
+        k = self._k
+        S = h * h * P[i, i] + r
+        np.multiply(P[:, i], h / S, out=k)
+        self.s += k * innovation
+        np.outer(k, P[i, :] * h, out=self._tmp)
+        P -= self._tmp
+        self.s[IYAW] = wrap_angle_pi(self.s[IYAW])
+
+    def update_speed(self, ts, velocity):
+        """PDR walking speed"""
+        if not self.initialized:
+            return
+        self.predict(ts)
+        self._update_scalar(IV, velocity - self.s[IV], self.r_pdr_speed)
+
+    def update_heading(self, ts, yaw):
+        """AHRS yaw (rad), used through its increments"""
+        if self.last_ahrs_yaw is None:
+            self.last_ahrs_yaw = yaw
+            return
+        dyaw = wrap_angle_pi(yaw - self.last_ahrs_yaw)
+        self.last_ahrs_yaw = yaw
+        self.predict(ts, dyaw)
+
+    def update_vio(self, ts, dx, dy, dyaw, dt):
+        """VIO relative motion: measures speed and, against the heading input, the bias"""
+        if not self.initialized:
+            return
+        self.predict(ts)
+        if dt > 0:
+            speed = math.hypot(dx, dy) / dt
+            self._update_scalar(IV, speed - self.s[IV], self.r_vio_speed)
+
+        # VIO heading change vs. the heading input integrated over the same period
+        h = -self.dt_since_vio
+        if h != 0.0:
+            predicted = self.dyaw_since_vio + h * self.s[IB]
+            self._update_scalar(IB, wrap_angle_pi(dyaw - predicted), self.r_vio_dyaw, h)
+        self.dyaw_since_vio = 0.0
+        self.dt_since_vio = 0.0
+
+    def update_position(self, ts, x, y, distance=0.0):
+        """
+        Absolute position fix (e.g. UWB AoA + ranging converted to the map frame).
+        The noise grows with the tag distance as the AoA error dominates far away.
+        Returns False if the fix is rejected by the innovation gate. After too many
+        consecutive rejections the filter is assumed lost and the position is reset to the fix.
+        """
+        if not self.initialized:
+            return False
+        self.predict(ts)
+
+        P = self.P
+        r = self.r_uwb + distance * distance * self.r_uwb_aoa
+        ex = x - self.s[IX]
+        ey = y - self.s[IY]
+        sxx = P[IX, IX] + r
+        syy = P[IY, IY] + r
+        sxy = P[IX, IY]
+        det = sxx * syy - sxy * sxy
+        d2 = (syy * ex * ex - 2 * sxy * ex * ey + sxx * ey * ey) / det
+        if d2 > self.uwb_gate:
+            self.uwb_rejections += 1
+            if self.uwb_rejections < self.uwb_max_rejections:
+                return False
+            self.s[IX] = x
+            self.s[IY] = y
+            P[IX, :] = 0.0
+            P[:, IX] = 0.0
+            P[IY, :] = 0.0
+            P[:, IY] = 0.0
+            P[IX, IX] = r
+            P[IY, IY] = r
+            self.uwb_rejections = 0
+            return True
+        self.uwb_rejections = 0
+
+        # Independent x and y noise: two sequential scalar updates
+        self._update_scalar(IX, ex, r)
+        self._update_scalar(IY, y - self.s[IY], r)
+        return True
+
+    def estimate(self, ts=None):
+        if ts is not None:
+            self.predict(ts)
+        return (float(self.s[IX]), float(self.s[IY]), float(self.s[IYAW]))
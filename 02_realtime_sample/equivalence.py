@@ -0,0 +1,247 @@
+#! /usr/bin/env -S python3
+
+"""
+Numerical equivalence of a candidate 06demo estimator against a reference one.
+
+Both are fed the same /nextdata chunks (from a trial file, a recorded cassette or a synthetic
+trial) side by side, and every intermediate result is compared as soon as it is produced:
+    parse_data        the row of every line
+    velocity          every SimplePDR.estimate call
+    dyaw              the yaw increment stored for every AHRS sample
+    predict_by_pdr, predict_by_vio, uwb_update (update_location_by_tag)
+    estimate          every estimate_location
+The run stops at the first value that differs by more than the tolerance, and reports where.
+By default the reference is the committed version (HEAD) of the candidate file and of
+xdrclient/sensors.py (parse_data); the other modules they import are the current ones.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import importlib.util
+from types import SimpleNamespace
+
+import numpy as np
+
+import xdrclient
+from xdrclient import log
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, "..", "evaalapi_server"))
+
+KINDS = ["parse_data", "velocity", "dyaw", "predict_by_pdr", "predict_by_vio", "uwb_update", "estimate"]
+
+
+def load_module(name, filename):
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_revision(rev, path, name, directory):
+    """Module `name` from the file `path` (relative to this directory) as committed in git revision rev"""
+    source = subprocess.run(["git", "show", f"{rev}:./{path}"], cwd=here, capture_output=True, check=True).stdout
+    filename = os.path.join(directory, name.replace(".", "_") + ".py")
+    with open(filename, 'wb') as f:
+        f.write(source)
+    return load_module(name, filename)
+
+
+def implementations(spec, candidate_filename, directory):
+    """(demo module, parse_data) of a file, or of a git revision of the candidate file and of xdrclient/sensors.py"""
+    if os.path.exists(spec):
+        demo = load_module("candidate_demo" if spec == candidate_filename else "reference_demo", spec)
+        return demo, getattr(demo, "parse_data", xdrclient.parse_data)
+    path = os.path.relpath(candidate_filename, here)
+    if path.startswith(".."):
+        path = "06demo_location_estimate_pdr.py" # a candidate outside the repository replaces 06demo
+    demo = load_revision(spec, path, "reference_demo", directory)
+    # xdrclient.<name> so that the relative imports of sensors.py resolve to the current package
+    sensors = load_revision(spec, "xdrclient/sensors.py", "xdrclient.reference_sensors", directory)
+    return demo, getattr(demo, "parse_data", sensors.parse_data)
+
+
+def flatten(value):
+    """Numbers of a result (tuple, array, dict of a parsed row...), and its other values as strings"""
+    if isinstance(value, dict):
+        items = sorted(value.items())
+        return [k for k, _ in items], [x for _, v in items for x in flatten(v)[1]]
+    if isinstance(value, (tuple, list, np.ndarray)):
+        return None, [x for v in np.asarray(value, dtype=object).ravel() for x in flatten(v)[1]]
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return None, [float(value)]
+    return None, [str(value)]
+
+
+def difference(a, b, tolerance):
+    """Largest absolute difference of two results, inf if their structure or text differs; and whether it is tolerated"""
+    keys_a, a = flatten(a)
+    keys_b, b = flatten(b)
+    if keys_a != keys_b or len(a) != len(b):
+        return np.inf, False
+    worst = 0.0
+    ok = True
+    for x, y in zip(a, b):
+        if isinstance(x, str) or isinstance(y, str):
+            if x != y:
+                return np.inf, False
+            continue
+        if np.isnan(x) and np.isnan(y):
+            continue
+        d = abs(x - y)
+        worst = max(worst, d)
+        ok = ok and d <= tolerance * (1.0 + max(abs(x), abs(y)))
+    return worst, ok
+
+
+class Probe:
+    """One localizer, with the results of the probed methods recorded as they are produced"""
+
+    def __init__(self, demo, parse_data):
+        self.parse_data = parse_data
+        self.localizer = demo.DemoLocalizer(pdr_model=demo.SimplePDR())
+        self.records = {kind: [] for kind in KINDS}
+        self.where = None
+        self.wrap(self.localizer.pdr_model, "estimate", "velocity", lambda out: out[0])
+        self.wrap(self.localizer, "predict_by_pdr", "predict_by_pdr")
+        self.wrap(self.localizer, "predict_by_vio", "predict_by_vio")
+        self.wrap(self.localizer, "update_location_by_tag", "uwb_update")
+
+    def wrap(self, obj, method, kind, select=lambda out: out):
+        if not hasattr(obj, method):
+            return
+        function = getattr(obj, method)
+        def probe(*args, **kwargs):
+            out = function(*args, **kwargs)
+            self.records[kind].append((self.where, select(out)))
+            return out
+        setattr(obj, method, probe)
+
+    def line(self, where, sensor_type, data_row):
+        """parse_data and callback of one line, as process_data does"""
+        self.where = where
+        row = self.parse_data(sensor_type, data_row)
+        self.records["parse_data"].append((where, row))
+        if row is not None:
+            self.localizer.callback(sensor_type, row)
+            yaw_angles = getattr(self.localizer, "yaw_angles", None)
+            if sensor_type == "AHRS" and yaw_angles:
+                self.records["dyaw"].append((where, yaw_angles[-1]["dyaw"]))
+
+    def estimate(self, where):
+        self.where = where
+        est = self.localizer.estimate_location()
+        self.records["estimate"].append((where, est))
+        return est
+
+
+def chunks_of_trial(trial_filename, horizon=0.5):
+    """The /nextdata replies the local server would send for the trial"""
+    from local_server import open_trial_file
+    f = open_trial_file(trial_filename)
+    t = f.first_ts - 1e-9 if len(f) else 0.0
+    while t < f.last_ts:
+        yield "%.3f" % (t + horizon), bytes(f.slice(t, t + horizon)).decode()
+        t += horizon
+
+
+def chunks_of_cassette(cassette):
+    """The recorded /nextdata replies (423 skipped)"""
+    from xdrclient.cassette import read_cassette
+    for record in read_cassette(cassette):
+        if record.req.startswith("/nextdata") and record.status_code != 423:
+            text = record.response().text
+            lines = text.splitlines()
+            yield (lines[-1].split(';')[1] if lines and ';' in lines[-1] else "-"), text
+
+
+def compare(reference, candidate, chunks, tolerance):
+    """Feed both probes chunk by chunk; returns the number of steps, the first divergence (or None) and max differences"""
+    counts = {kind: 0 for kind in KINDS}
+    worst = {kind: 0.0 for kind in KINDS}
+    step = 0
+    for step, (trial_time, text) in enumerate(chunks):
+        for i, line in enumerate(text.splitlines()):
+            if not line.strip():
+                continue
+            parts = line.strip().split(';')
+            where = SimpleNamespace(step=step, trial_time=trial_time, line=i, text=line)
+            reference.line(where, parts[0], parts[1:])
+            candidate.line(where, parts[0], parts[1:])
+        where = SimpleNamespace(step=step, trial_time=trial_time, line=None, text=None)
+        reference.estimate(where)
+        candidate.estimate(where)
+
+        for kind in KINDS:
+            ref, cand = reference.records[kind], candidate.records[kind]
+            if len(ref) != len(cand):
+                n = min(len(ref), len(cand))
+                return step + 1, (kind, n, (ref[n:] or cand[n:])[0][0], f"{len(ref)} calls", f"{len(cand)} calls"), counts, worst
+            for n, ((where, a), (_, b)) in enumerate(zip(ref, cand)):
+                d, ok = difference(a, b, tolerance)
+                worst[kind] = max(worst[kind], d)
+                if not ok:
+                    return step + 1, (kind, counts[kind] + n, where, a, b), counts, worst
+            counts[kind] += len(ref)
+            ref.clear()
+            cand.clear()
+    return step + 1, None, counts, worst
+
+
+def report(steps, diverged, counts, worst, wall):
+    print(f"{steps} steps compared in {wall:.1f} s\n")
+    print(f"{'intermediate':<16} {'compared':>9} {'max difference':>15}")
+    for kind in KINDS:
+        print(f"{kind:<16} {counts[kind]:9d} {worst[kind]:15.3g}")
+    if diverged is None:
+        print("\nno divergence")
+        return
+    kind, n, where, a, b = diverged
+    print(f"\nfirst divergence: {kind} #{n}, step {where.step} (chunk ending at trial time {where.trial_time})")
+    if where.text is not None:
+        print(f"    while processing line {where.line} of the chunk: {where.text}")
+    print(f"    reference: {a}\n    candidate: {b}")
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 5:
+        print("""Compare a candidate 06demo estimator with a reference one, intermediate by intermediate.  Usage is
+%s [trial] [candidate] [reference] [tolerance]
+
+TRIAL is a trial file (.txt or .xdra), a cassette (.xdrc, see replay_cassette.py) or synthetic:SECONDS
+(default synthetic:60).  CANDIDATE defaults to 06demo_location_estimate_pdr.py.  REFERENCE is a file
+defining DemoLocalizer and SimplePDR (and optionally parse_data), or a git revision of the candidate
+file (of 06demo if the candidate is not in the repository) and of xdrclient/sensors.py (default HEAD).  Values agree if they differ by at most
+TOLERANCE * (1 + |value|) (default 1e-9).  The exit code is 2 at the first divergence.""" % sys.argv[0])
+        exit(1)
+
+    trial = sys.argv[1] if len(sys.argv) > 1 else "synthetic:60"
+    candidate_filename = os.path.abspath(sys.argv[2] if len(sys.argv) > 2 else os.path.join(here, "06demo_location_estimate_pdr.py"))
+    reference_spec = sys.argv[3] if len(sys.argv) > 3 else "HEAD"
+    tolerance = float(sys.argv[4]) if len(sys.argv) > 4 else 1e-9
+
+    log.configure("quiet") # the demo localizers log at every step
+    with tempfile.TemporaryDirectory() as directory:
+        candidate = Probe(*implementations(candidate_filename, candidate_filename, directory))
+        reference = Probe(*implementations(reference_spec, candidate_filename, directory))
+
+        if trial.startswith("synthetic"):
+            from synthetic_trial import make_trial
+            trial_filename = os.path.join(directory, "synthetic.txt")
+            make_trial(trial_filename, float(trial.partition(":")[2] or 60))
+            chunks = chunks_of_trial(trial_filename)
+        elif trial.endswith(".xdrc"):
+            chunks = chunks_of_cassette(trial)
+        else:
+            chunks = chunks_of_trial(trial)
+
+        t = time.perf_counter()
+        steps, diverged, counts, worst = compare(reference, candidate, chunks, tolerance)
+        report(steps, diverged, counts, worst, time.perf_counter() - t)
+    exit(0 if diverged is None else 2)
@@ -0,0 +1,187 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+def wrap(angle):
+    """Wrap angles to [-π, π) range (element-wise)"""
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+class FixedLagSmoother:
+    """
+    Sliding-window (fixed-lag) smoother over the last `window_sec` seconds of (x, y, yaw) poses.
+
+    Every step adds one pose with an odometry factor from the previous pose (PDR or VIO) and
+    any absolute position factors (UWB), then re-optimises the whole window with a few
+    warm-started Gauss-Newton iterations. Poses leaving the window are marginalised into a
+    Gaussian prior on the oldest remaining pose, so the problem never grows.
+
+    The cost of a step is bounded by max_poses (size of the 3N x 3N normal equations) and
+    max_iterations; time_budget additionally stops iterating once the step exceeds that many
+    seconds (the first iteration always runs).
+    """
+
+    def __init__(self, window_sec=5.0, max_poses=20, max_iterations=3, time_budget=None,
+                 uwb_sigma=0.5, uwb_aoa_sigma=np.radians(5.0), huber_k=1.5):
+        self.window_sec = window_sec
+        self.max_poses = max_poses
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.uwb_sigma = uwb_sigma
+        self.uwb_aoa_sigma = uwb_aoa_sigma
+        self.huber_k = huber_k
+
+        self.ts = deque()
+        self.poses = np.zeros((max_poses, 3))
+        self.odom = deque()      # (dx, dy, dyaw, sigma_xy, sigma_yaw) between pose i and i+1
+        self.fixes = deque()     # list of (x, y, sigma) per pose
+        self.prior_mean = None   # marginalisation prior on the oldest pose
+        self.prior_info = None
+
+        self.last_solve_time = 0.0
+        self.last_iterations = 0
+
+    @property
+    def initialized(self):
+        return len(self.ts) > 0
+
+    def initialize(self, ts, x, y, yaw, sigma=(0.1, 0.1, 0.05)):
+        self.ts.clear()
+        self.odom.clear()
+        self.fixes.clear()
+        self.ts.append(ts)
+        self.fixes.append([])
+        self.poses[0] = (x, y, yaw)
+        self.prior_mean = np.array([x, y, yaw], dtype=float)
+        self.prior_info = np.diag(1.0 / np.square(sigma))
+
+    def add_pose(self, ts, dx, dy, dyaw, sigma_xy=0.1, sigma_yaw=0.02):
+        """Add a pose reached by (dx, dy, dyaw) expressed in the frame of the previous pose"""
+        if len(self.ts) == self.max_poses or (len(self.ts) > 1 and ts - self.ts[1] > self.window_sec):
+            self.marginalize_oldest()
+
+        n = len(self.ts)
+        x, y, yaw = self.poses[n - 1]
+        c, s = np.cos(yaw), np.sin(yaw)
+        # warm start: compose the latest solution with the odometry
+        self.poses[n] = (x + c * dx - s * dy, y + s * dx + c * dy, wrap(yaw + dyaw))
+        self.ts.append(ts)
+        self.odom.append((dx, dy, dyaw, sigma_xy, sigma_yaw))
+        self.fixes.append([])
+
+    def add_position(self, x, y, distance=0.0):
+        """Absolute position fix on the newest pose; the noise grows with the UWB tag distance"""
+        sigma = np.hypot(self.uwb_sigma, distance * self.uwb_aoa_sigma)
+        self.fixes[-1].append((x, y, sigma))
+
+    def build(self, X, first=0, last=None):
+        """Normal equations H, b (gradient) and cost of the factors touching poses first..last"""
+        n = len(X)
+        last = n - 1 if last is None else last
+        H = np.zeros((3 * n, 3 * n))
+        b = np.zeros(3 * n)
+        cost = 0.0
+
+        # Prior on the oldest pose
+        if first == 0:
+            r = X[0] - self.prior_mean
+            r[2] = wrap(r[2])
+            H[:3, :3] += self.prior_info
+            b[:3] += self.prior_info @ r
+            cost += r @ self.prior_info @ r
+
+        # Odometry factors, vectorized over the window
+        i = np.arange(first, min(last + 1, n - 1))
+        if len(i):
+            j = i + 1
+            odom = np.array([self.odom[k] for k in i])
+            d = X[j, :2] - X[i, :2]
+            c, s = np.cos(X[i, 2]), np.sin(X[i, 2])
+            r = np.column_stack([c * d[:, 0] + s * d[:, 1] - odom[:, 0],
+                                 -s * d[:, 0] + c * d[:, 1] - odom[:, 1],
+                                 wrap(X[j, 2] - X[i, 2] - odom[:, 2])])
+            w = np.column_stack([1 / odom[:, 3]**2, 1 / odom[:, 3]**2, 1 / odom[:, 4]**2])
+
+            Ji = np.zeros((len(i), 3, 3))
+            Jj = np.zeros((len(i), 3, 3))
+            Ji[:, 0, 0], Ji[:, 0, 1] = -c, -s
+            Ji[:, 1, 0], Ji[:, 1, 1] = s, -c
+            Ji[:, 0, 2] = -s * d[:, 0] + c * d[:, 1]
+            Ji[:, 1, 2] = -c * d[:, 0] - s * d[:, 1]
+            Ji[:, 2, 2] = -1
+            Jj[:, 0, 0], Jj[:, 0, 1] = c, s
+            Jj[:, 1, 0], Jj[:, 1, 1] = -s, c
+            Jj[:, 2, 2] = 1
+
+            WJi = w[:, :, np.newaxis] * Ji
+            WJj = w[:, :, np.newaxis] * Jj
+            H4 = H.reshape(n, 3, n, 3)
+            H4[i, :, i, :] += np.einsum("kai,kaj->kij", Ji, WJi)
+            H4[j, :, j, :] += np.einsum("kai,kaj->kij", Jj, WJj)
+            H4[i, :, j, :] += np.einsum("kai,kaj->kij", Ji, WJj)
+            H4[j, :, i, :] += np.einsum("kai,kaj->kij", Jj, WJi)
+            b4 = b.reshape(n, 3)
+            wr = w * r
+            b4[i] += np.einsum("kai,ka->ki", Ji, wr)
+            b4[j] += np.einsum("kai,ka->ki", Jj, wr)
+            cost += np.sum(wr * r)
+
+        # Position factors with a Huber weight, so outlying UWB fixes cannot drag the window
+        for k in range(first, last + 1):
+            for fx, fy, sigma in self.fixes[k]:
+                r = X[k, :2] - (fx, fy)
+                e = np.hypot(*r) / sigma
+                w = 1.0 / sigma**2
+                if e > self.huber_k:
+                    w *= self.huber_k / e
+                H[3 * k, 3 * k] += w
+                H[3 * k + 1, 3 * k + 1] += w
+                b[3 * k:3 * k + 2] += w * r
+                cost += w * (r @ r)
+
+        return H, b, cost
+
+    def solve(self):
+        """Warm-started Gauss-Newton over the window; returns the newest pose"""
+        t_start = time.perf_counter()
+        n = len(self.ts)
+        X = self.poses[:n]
+        self.last_iterations = 0
+        for it in range(self.max_iterations):
+            H, b, _ = self.build(X)
+            delta = np.linalg.solve(H + 1e-9 * np.eye(3 * n), -b).reshape(n, 3)
+            X += delta
+            X[:, 2] = wrap(X[:, 2])
+            self.last_iterations = it + 1
+            if np.max(np.abs(delta)) < 1e-4:
+                break
+            if self.time_budget is not None and time.perf_counter() - t_start > self.time_budget:
+                break
+        self.last_solve_time = time.perf_counter() - t_start
+        return tuple(float(v) for v in X[n - 1])
+
+    def marginalize_oldest(self):
+        """Schur-complement the oldest pose into a prior on the next one"""
+        n = len(self.ts)
+        if n < 2:
+            return
+        X = self.poses[:n]
+        H, b, _ = self.build(X, first=0, last=0)
+
+        # Only the factors touching pose 0 (prior, odometry 0-1, fixes on 0) are in H here
+        H00, H01, H11 = H[:3, :3], H[:3, 3:6], H[3:6, 3:6]
+        b0, b1 = b[:3], b[3:6]
+        H00_inv = np.linalg.inv(H00)
+        info = H11 - H01.T @ H00_inv @ H01
+        grad = b1 - H01.T @ H00_inv @ b0
+        mean = X[1] - np.linalg.solve(info + 1e-9 * np.eye(3), grad)
+        mean[2] = wrap(mean[2])
+
+        self.prior_info = 0.5 * (info + info.T)
+        self.prior_mean = mean
+        self.ts.popleft()
+        self.odom.popleft()
+        self.fixes.popleft()
+        self.poses[:n - 1] = self.poses[1:n]
@@ -0,0 +1,66 @@
+#! /usr/bin/env -S python3
+
+import os
+import sys
+import subprocess
+
+
+# Load a demo script as a module (its __main__ block does not run), i.e. everything before the first request
+LOADER = """
+import importlib.util, sys
+spec = importlib.util.spec_from_file_location("demo", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+"""
+
+
+def measure(script, python=sys.executable):
+    """Run `python -X importtime` on a fresh interpreter; returns [(self_us, cumulative_us, depth, module)]"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    p = subprocess.run([python, "-X", "importtime", "-c", LOADER, script],
+                       cwd=os.path.dirname(os.path.abspath(script)), env=env,
+                       capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(p.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def report(script, top=10):
+    rows = measure(script)
+    # top-level imports (depth 0 after the loader's own) carry the cumulative time of their dependencies
+    first = [r for r in rows if r[2] == 0]
+    total = sum(r[1] for r in first)
+    by_package = {}
+    for self_us, _, _, name in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    print(f"{script}: {total / 1000:.1f} ms of imports, {len(rows)} modules")
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"    {us / 1000:8.1f} ms  {package}")
+    return total
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print("""Cold-start import time of demo scripts, measured with -X importtime.  Usage is
+%s [script] ...
+
+The script is loaded as a module, so only the imports done before the first request are counted.
+Heavier dependencies imported later (e.g. scipy when the first UWB tag is seen) are not included.""" % sys.argv[0])
+        exit(1)
+
+    for script in sys.argv[1:]:
+        report(script)
+        print()
+    exit(0)
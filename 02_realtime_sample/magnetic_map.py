@@ -0,0 +1,144 @@
+#! /usr/bin/env -S python3
+
+"""
+Magnetic fingerprint map: the magnitude of the magnetic field on a grid of the floor.
+
+The builder joins the MAGN samples of trials to their ground truth position (interpolated at
+the app timestamp) and keeps, for every grid cell visited, the mean and standard deviation of
+the field magnitude (independent of how the phone is held) and the number of samples. Only the
+visited cells are written, compressed (.npz).
+
+At runtime MagneticMap loads them into dense grids, and log_likelihood() scores a batch of
+candidate paths against a sequence of measured magnitudes in a few vectorized operations, e.g.
+to weigh positions around the PDR/VIO estimate between two UWB fixes. By default the mean
+difference between the sequence and the map along each path is removed first, as the
+magnetometers of different phones have different offsets.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from trialfile import read_trial
+
+
+def magnitude(df_magn):
+    return np.sqrt(df_magn["mag_x"].to_numpy() ** 2 + df_magn["mag_y"].to_numpy() ** 2 + df_magn["mag_z"].to_numpy() ** 2)
+
+
+def fingerprints(trial_filename, gt_filename):
+    """x, y (ground truth) and field magnitude of every MAGN sample of a trial within the ground truth"""
+    df_magn = read_trial(trial_filename, sensors=["MAGN"]).get("MAGN")
+    if df_magn is None:
+        return np.empty(0), np.empty(0), np.empty(0)
+    df_gt = pd.read_csv(gt_filename, header=0).astype(float)
+    ts = df_magn["app_timestamp"].to_numpy()
+    m = magnitude(df_magn)
+    ok = (ts >= df_gt["timestamp"].iloc[0]) & (ts <= df_gt["timestamp"].iloc[-1]) & ~np.isnan(m)
+    x = np.interp(ts[ok], df_gt["timestamp"], df_gt["x"])
+    y = np.interp(ts[ok], df_gt["timestamp"], df_gt["y"])
+    return x, y, m[ok]
+
+
+def build_map(trial_filenames, gt_filenames, filename, cell=0.5):
+    """Grid the fingerprints of all the trials and save the visited cells; returns the number of samples"""
+    x, y, m = (np.concatenate(a) for a in zip(*(fingerprints(t, g) for t, g in zip(trial_filenames, gt_filenames))))
+    if len(m) == 0:
+        raise ValueError("no MAGN sample within the ground truth")
+    origin = np.floor(np.array([x.min(), y.min()]) / cell) * cell
+    i = ((x - origin[0]) / cell).astype(np.int64)
+    j = ((y - origin[1]) / cell).astype(np.int64)
+    shape = np.array([i.max() + 1, j.max() + 1])
+    index, inverse, count = np.unique(i * shape[1] + j, return_inverse=True, return_counts=True)
+    mean = np.bincount(inverse, m) / count
+    var = np.maximum(np.bincount(inverse, m * m) / count - mean ** 2, 0.0)
+    np.savez_compressed(filename, origin=origin, cell=cell, shape=shape, index=index.astype(np.int32),
+                        mean=mean.astype(np.float32), std=np.sqrt(var).astype(np.float32),
+                        count=count.astype(np.uint32))
+    return len(m)
+
+
+class MagneticMap:
+    """Dense grids of a fingerprint map, for batched lookups"""
+
+    def __init__(self, filename):
+        with np.load(filename) as f:
+            self.origin = f["origin"]
+            self.cell = float(f["cell"])
+            self.shape = tuple(int(v) for v in f["shape"])
+            self.mean = np.full(self.shape[0] * self.shape[1], np.nan)
+            self.std = np.full(self.shape[0] * self.shape[1], np.nan)
+            self.count = np.zeros(self.shape[0] * self.shape[1], dtype=np.uint32)
+            self.mean[f["index"]] = f["mean"]
+            self.std[f["index"]] = f["std"]
+            self.count[f["index"]] = f["count"]
+
+    def cells(self, xy):
+        """Flat cell index of positions (..., 2), -1 outside the grid"""
+        ij = np.floor((np.asarray(xy, dtype=float) - self.origin) / self.cell).astype(np.int64)
+        inside = (ij[..., 0] >= 0) & (ij[..., 0] < self.shape[0]) & (ij[..., 1] >= 0) & (ij[..., 1] < self.shape[1])
+        return np.where(inside, ij[..., 0] * self.shape[1] + ij[..., 1], -1)
+
+    def lookup(self, xy):
+        """Mean and standard deviation of the field magnitude at positions (..., 2), NaN where not mapped"""
+        c = self.cells(xy)
+        known = c >= 0
+        mean = np.where(known, self.mean[np.maximum(c, 0)], np.nan)
+        std = np.where(known, self.std[np.maximum(c, 0)], np.nan)
+        return mean, std
+
+    def log_likelihood(self, paths, values, noise=2.0, debias=True, unmapped=-5.0):
+        """
+        Log-likelihood of the measured magnitudes `values` (T,) or (P, T) along each of the
+        candidate paths (P, T, 2): Gaussian per sample, with the variance of the cell plus
+        noise²; `unmapped` per sample outside the mapped cells. Returns (P,).
+        """
+        mean, std = self.lookup(paths)
+        values = np.broadcast_to(np.asarray(values, dtype=float), mean.shape)
+        known = ~np.isnan(mean)
+        residual = np.where(known, values - mean, 0.0)
+        if debias:
+            n = known.sum(axis=-1, keepdims=True)
+            residual = np.where(known, residual - residual.sum(axis=-1, keepdims=True) / np.maximum(n, 1), 0.0)
+        var = np.where(known, std, 0.0) ** 2 + noise ** 2
+        ll = np.where(known, -0.5 * (residual ** 2 / var + np.log(2 * np.pi * var)), unmapped)
+        return ll.sum(axis=-1)
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (4, 5):
+        print("""Build a magnetic fingerprint map from trials and their ground truth.  Usage is
+%s trial_files ground_truth_dir output_npz [cell]
+
+TRIAL_FILES is a comma separated list of trial files; the ground truth of trials/1.txt is GROUND_TRUTH_DIR/1.csv.
+CELL is the grid step in metres (default 0.5).""" % sys.argv[0])
+        exit(1)
+
+    trial_filenames = sys.argv[1].split(",")
+    gt_filenames = [os.path.join(sys.argv[2], os.path.splitext(os.path.basename(t))[0] + ".csv") for t in trial_filenames]
+    output = sys.argv[3]
+    cell = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
+
+    t = time.perf_counter()
+    n = build_map(trial_filenames, gt_filenames, output, cell)
+    mm = MagneticMap(output)
+    mapped = ~np.isnan(mm.mean)
+    print(f"{n} MAGN samples of {len(trial_filenames)} trials -> {mapped.sum()} cells of {cell} m "
+          f"({mm.shape[0]} x {mm.shape[1]} grid), {os.path.getsize(output) / 1024:.0f} KB in {time.perf_counter() - t:.1f} s")
+    print(f"samples per cell: median {np.median(mm.count[mapped]):.0f}; "
+          f"within-cell std: median {np.nanmedian(mm.std):.2f} uT; field magnitude {np.nanmin(mm.mean):.1f}-{np.nanmax(mm.mean):.1f} uT")
+
+    # batched query timing: 10000 candidate paths of 20 samples around the mapped cells
+    rng = np.random.default_rng(0)
+    centers = np.column_stack(np.unravel_index(np.flatnonzero(mapped), mm.shape)) * mm.cell + mm.origin
+    paths = centers[rng.integers(len(centers), size=10000)][:, None, :] + np.cumsum(rng.normal(0, 0.3, (10000, 20, 2)), axis=1)
+    t = time.perf_counter()
+    mm.log_likelihood(paths, rng.normal(np.nanmean(mm.mean), 5, 20))
+    print(f"log_likelihood of 10000 paths x 20 samples: {1000 * (time.perf_counter() - t):.1f} ms")
+    exit(0)
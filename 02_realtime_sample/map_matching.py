@@ -0,0 +1,184 @@
+import os
+import hashlib
+import pickle
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+# Specs of the provided map (see 03_map_plot.ipynb)
+MAP_ORIGIN = (-5.625, -12.75)
+MAP_PPM = 100  # pixels per meter
+
+CACHE_VERSION = 1
+
+
+def load_free_space(bitmap_filename, map_ppm=MAP_PPM, resolution=0.1, free_thresh=0.5):
+    """Load the bitmap and downsample it to a boolean walkable grid of `resolution` metres per cell"""
+    from PIL import Image
+
+    bitmap = np.array(Image.open(bitmap_filename).convert("L")) / 255.0
+
+    # A cell is walkable if most of its pixels are bright
+    block = max(1, int(round(resolution * map_ppm)))
+    h = bitmap.shape[0] // block * block
+    w = bitmap.shape[1] // block * block
+    cells = bitmap[:h, :w].reshape(h // block, block, w // block, block).mean(axis=(1, 3))
+    return cells > free_thresh, block
+
+
+def skeletonize(mask):
+    """Zhang-Suen thinning of a boolean image, vectorized over the whole grid"""
+    img = np.pad(mask.astype(np.uint8), 1)
+
+    while True:
+        changed = False
+        for step in range(2):
+            # 8-neighbourhood P2..P9, clockwise from north
+            p2 = img[:-2, 1:-1]
+            p3 = img[:-2, 2:]
+            p4 = img[1:-1, 2:]
+            p5 = img[2:, 2:]
+            p6 = img[2:, 1:-1]
+            p7 = img[2:, :-2]
+            p8 = img[1:-1, :-2]
+            p9 = img[:-2, :-2]
+            ring = [p2, p3, p4, p5, p6, p7, p8, p9, p2]
+
+            n_neighbours = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+            n_transitions = sum((ring[i] == 0) & (ring[i + 1] == 1) for i in range(8))
+            if step == 0:
+                c1 = p2 * p4 * p6 == 0
+                c2 = p4 * p6 * p8 == 0
+            else:
+                c1 = p2 * p4 * p8 == 0
+                c2 = p2 * p6 * p8 == 0
+
+            remove = (img[1:-1, 1:-1] == 1) & (n_neighbours >= 2) & (n_neighbours <= 6) \
+                & (n_transitions == 1) & c1 & c2
+            if remove.any():
+                img[1:-1, 1:-1][remove] = 0
+                changed = True
+        if not changed:
+            break
+
+    return img[1:-1, 1:-1].astype(bool)
+
+
+def project_to_segments(points, seg_a, seg_b):
+    """Project points (N, 2) onto segments (N, K, 2); returns projections and squared distances"""
+    ab = seg_b - seg_a
+    ap = points[:, np.newaxis, :] - seg_a
+    denom = np.einsum("nkd,nkd->nk", ab, ab)
+    t = np.einsum("nkd,nkd->nk", ap, ab) / np.where(denom > 0, denom, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    proj = seg_a + t[..., np.newaxis] * ab
+    d2 = np.sum((proj - points[:, np.newaxis, :]) ** 2, axis=2)
+    return proj, d2
+
+
+class CorridorGraph:
+    """
+    Walkable corridor graph extracted from the floor bitmap.
+
+    Nodes are skeleton cells (in metres, map frame) and edges join 8-connected skeleton cells.
+    A KD-tree over edge midpoints gives O(log n) snapping of estimates onto the nearest edge.
+    """
+
+    def __init__(self, nodes, edges, resolution):
+        self.nodes = nodes
+        self.edges = edges
+        self.resolution = resolution
+        self.tree = cKDTree((nodes[edges[:, 0]] + nodes[edges[:, 1]]) / 2)
+
+    @classmethod
+    def from_bitmap(cls, bitmap_filename, map_origin=MAP_ORIGIN, map_ppm=MAP_PPM, resolution=0.1, free_thresh=0.5):
+        free, block = load_free_space(bitmap_filename, map_ppm, resolution, free_thresh)
+        skeleton = skeletonize(free)
+
+        # Node coordinates: row 0 of the bitmap is the top of the map (max y)
+        cell_m = block / map_ppm
+        rows, cols = np.nonzero(skeleton)
+        node_id = -np.ones(skeleton.shape, dtype=np.int64)
+        node_id[rows, cols] = np.arange(len(rows))
+        nodes = np.column_stack([
+            map_origin[0] + (cols + 0.5) * cell_m,
+            map_origin[1] + (skeleton.shape[0] - rows - 0.5) * cell_m,
+        ])
+
+        # Join 8-connected skeleton cells (half of the neighbourhood, to avoid duplicates)
+        padded = np.pad(node_id, 1, constant_values=-1)
+        edges = []
+        for dr, dc in [(0, 1), (1, -1), (1, 0), (1, 1)]:
+            neighbour = padded[1 + rows + dr, 1 + cols + dc]
+            ok = neighbour >= 0
+            edges.append(np.column_stack([node_id[rows[ok], cols[ok]], neighbour[ok]]))
+        edges = np.concatenate(edges) if edges else np.zeros((0, 2), dtype=np.int64)
+
+        return cls(nodes, edges, cell_m)
+
+    @classmethod
+    def load_or_build(cls, bitmap_filename, map_origin=MAP_ORIGIN, map_ppm=MAP_PPM, resolution=0.1,
+                      free_thresh=0.5, cache_filename=None):
+        """Load the graph from the disk cache, or build it from the bitmap and cache it"""
+        if cache_filename is None:
+            cache_filename = os.path.splitext(bitmap_filename)[0] + ".corridors.pkl"
+
+        with open(bitmap_filename, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        key = (CACHE_VERSION, digest, tuple(map_origin), map_ppm, resolution, free_thresh)
+
+        if os.path.exists(cache_filename):
+            with open(cache_filename, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == key:
+                graph = cls.__new__(cls)
+                graph.nodes = cached["nodes"]
+                graph.edges = cached["edges"]
+                graph.resolution = cached["resolution"]
+                graph.tree = cached["tree"]
+                return graph
+
+        graph = cls.from_bitmap(bitmap_filename, map_origin, map_ppm, resolution, free_thresh)
+        with open(cache_filename, "wb") as f:
+            pickle.dump({"key": key, "nodes": graph.nodes, "edges": graph.edges,
+                         "resolution": graph.resolution, "tree": graph.tree}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        return graph
+
+    def snap_points(self, xy, max_dist=2.0):
+        """
+        Snap points (N, 2) to the nearest corridor edge.
+        Points further than max_dist from every edge are returned unchanged.
+        Returns snapped points, distances to the corridor and edge indices (-1 if not snapped).
+        """
+        xy = np.atleast_2d(np.asarray(xy, dtype=float))
+        k = min(8, len(self.edges))
+        if k == 0:
+            return xy.copy(), np.full(len(xy), np.inf), -np.ones(len(xy), dtype=np.int64)
+
+        # Candidate edges from the KD-tree, then exact point-to-segment projection
+        _, idx = self.tree.query(xy, k=k)
+        idx = idx.reshape(len(xy), k)
+        seg = self.edges[idx]
+        proj, d2 = project_to_segments(xy, self.nodes[seg[..., 0]], self.nodes[seg[..., 1]])
+
+        best = np.argmin(d2, axis=1)
+        rows = np.arange(len(xy))
+        snapped = proj[rows, best]
+        dist = np.sqrt(d2[rows, best])
+        edge = idx[rows, best]
+
+        too_far = dist > max_dist
+        snapped[too_far] = xy[too_far]
+        edge[too_far] = -1
+        return snapped, dist, edge
+
+    def snap(self, x, y, max_dist=2.0):
+        snapped, dist, edge = self.snap_points([[x, y]], max_dist)
+        return float(snapped[0, 0]), float(snapped[0, 1]), float(dist[0]), int(edge[0])
+
+    def snap_estimate(self, est, max_dist=2.0):
+        """Snap an (x, y, yaw) estimate, keeping its yaw"""
+        x, y, _, _ = self.snap(est[0], est[1], max_dist)
+        return (x, y, est[2])
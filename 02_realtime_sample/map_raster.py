@@ -0,0 +1,98 @@
+"""
+Rasterised trajectory layers over the map bitmap.
+
+Instead of one marker per point, points are binned into an image aligned with the map bitmap
+(map_origin, map_ppm; one cell per `pixels_per_cell` bitmap pixels) in one vectorized pass:
+the number of points, the latest timestamp or the mean of a value (e.g. the error) in each
+cell. A layer is coloured and composited over the map (downsampled and cached once) into a
+single image, so drawing hundreds of trajectories costs one imshow.
+
+    raster = MapRaster(bitmap_array, map_origin, map_ppm)
+    mappable = raster.show(ax, raster.count(df.x, df.y), cmap="magma")
+    plt.colorbar(mappable, ax=ax, label="points per cell")
+"""
+
+import numpy as np
+
+
+class MapRaster:
+
+    def __init__(self, bitmap, map_origin, map_ppm, pixels_per_cell=5):
+        self.bitmap = bitmap
+        self.map_origin = map_origin
+        self.map_ppm = map_ppm
+        self.k = pixels_per_cell
+        height, width = bitmap.shape[:2]
+        self.shape = (-(-height // self.k), -(-width // self.k))
+        self.top = map_origin[1] + height / map_ppm # the first row of the bitmap is its top
+        cell_m = self.k / map_ppm
+        self.extent = [map_origin[0], map_origin[0] + self.shape[1] * cell_m, self.top - self.shape[0] * cell_m, self.top]
+        self._background = None
+
+    def background(self):
+        """RGB of the map in gray at alpha 0.5 over white, as the notebooks draw it, one pixel per cell"""
+        if self._background is None:
+            gray = np.asarray(self.bitmap, dtype=float)
+            if gray.ndim == 3:
+                gray = gray[..., :3].mean(axis=2)
+            lo, hi = gray.min(), gray.max()
+            gray = (gray - lo) / (hi - lo) if hi > lo else np.ones_like(gray)
+            padded = np.ones((self.shape[0] * self.k, self.shape[1] * self.k))
+            padded[:gray.shape[0], :gray.shape[1]] = gray
+            pooled = padded.reshape(self.shape[0], self.k, self.shape[1], self.k).mean(axis=(1, 3))
+            self._background = np.repeat((0.5 + 0.5 * pooled)[..., None], 3, axis=2)
+        return self._background
+
+    def cells(self, x, y):
+        """Flat cell index of the points on the map, and which points are on it"""
+        col = np.floor((np.asarray(x, dtype=float) - self.map_origin[0]) * self.map_ppm / self.k)
+        row = np.floor((self.top - np.asarray(y, dtype=float)) * self.map_ppm / self.k)
+        inside = (col >= 0) & (col < self.shape[1]) & (row >= 0) & (row < self.shape[0])
+        return (row[inside] * self.shape[1] + col[inside]).astype(np.int64), inside
+
+    def count(self, x, y):
+        """Number of points per cell, NaN where there are none"""
+        flat, _ = self.cells(x, y)
+        counts = np.bincount(flat, minlength=self.shape[0] * self.shape[1]).astype(float)
+        counts[counts == 0] = np.nan
+        return counts.reshape(self.shape)
+
+    def latest(self, x, y, t):
+        """Latest value of t (e.g. the timestamp) per cell, NaN where there are no points"""
+        flat, inside = self.cells(x, y)
+        out = np.full(self.shape[0] * self.shape[1], -np.inf)
+        np.maximum.at(out, flat, np.asarray(t, dtype=float)[inside])
+        out[np.isneginf(out)] = np.nan
+        return out.reshape(self.shape)
+
+    def mean(self, x, y, v):
+        """Mean of v (e.g. the error) per cell, NaN where there are no points"""
+        flat, inside = self.cells(x, y)
+        n = self.shape[0] * self.shape[1]
+        counts = np.bincount(flat, minlength=n)
+        sums = np.bincount(flat, np.asarray(v, dtype=float)[inside], minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (sums / counts).reshape(self.shape)
+
+    def composite(self, values, cmap="viridis", vmin=None, vmax=None, alpha=1.0):
+        """RGB image of the map with the cells of a layer coloured (NaN cells show the map), and its Normalize"""
+        from matplotlib import colormaps, colors
+        known = np.isfinite(values)
+        norm = colors.Normalize(np.nanmin(values) if vmin is None else vmin, np.nanmax(values) if vmax is None else vmax)
+        image = self.background().copy()
+        rgb = colormaps[cmap](norm(values[known]))[:, :3]
+        image[known] = alpha * rgb + (1 - alpha) * image[known]
+        return image, norm
+
+    def show(self, ax, values, cmap="viridis", vmin=None, vmax=None, alpha=1.0, label=None):
+        """
+        Draw the composite on ax in map coordinates; returns a mappable for plt.colorbar.
+        With a label, the layer is listed in the legend with the colour of its median cell.
+        """
+        from matplotlib import cm
+        image, norm = self.composite(values, cmap, vmin, vmax, alpha)
+        ax.imshow(image, extent=self.extent, interpolation="nearest")
+        mappable = cm.ScalarMappable(norm=norm, cmap=cmap)
+        if label is not None and np.isfinite(values).any():
+            ax.plot([], [], "s", markersize=10, color=mappable.to_rgba(np.nanmedian(values)), label=label)
+        return mappable
@@ -0,0 +1,453 @@
+#! /usr/bin/env -S python3
+
+"""
+Parameter sweep of the 06demo estimator against ground truth.
+
+SimplePDR(acc_thresh, pdr_window_sec, default_velocity) and DemoLocalizer(df_convert_window) only
+change the PDR speed of the default 06demo path (no EKF, smoother or map matching); the chunks
+served by the EvAAL API, the VIO availability, the UWB fixes and the initial pose do not depend
+on them. Each trial is therefore parsed once and reduced to flat arrays (saved as .npy and
+memory-mapped read-only by every worker), and a configuration is evaluated as a few vectorized
+passes over the ACCE samples instead of a replay of the trial through DemoLocalizer.
+The 'check' mode replays a trial through DemoLocalizer to confirm that both agree.
+"""
+
+import os
+import sys
+import time
+import tempfile
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from xdrclient import process_data
+from xdrclient.demo import load_demo
+from trialfile import read_trial
+from sensor_aligner import NS, to_ns
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaalapi_server"))
+from local_server import open_trial_file
+
+PARAMETERS = ["acc_thresh", "pdr_window_sec", "default_velocity", "df_convert_window"]
+DEFAULTS = (0.1, 1.0, 0.7, 20)
+
+# grid search values
+GRID = {
+    "acc_thresh": [0.03, 0.05, 0.075, 0.1, 0.15, 0.2],
+    "pdr_window_sec": [0.25, 0.5, 1.0, 1.5, 2.0],
+    "default_velocity": [0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2],
+    "df_convert_window": [5, 10, 20, 40, 80],
+}
+# random search ranges (df_convert_window is an integer, at least 2: the window excludes the newest sample)
+RANGES = {
+    "acc_thresh": (0.01, 0.4),
+    "pdr_window_sec": (0.1, 3.0),
+    "default_velocity": (0.3, 1.5),
+    "df_convert_window": (2, 120),
+}
+
+horizon = 0.5           # seconds of data per /nextdata, as in 06demo
+ahrs_tolerance = 0.02   # PDR/AHRS matching tolerance of predict_by_pdr
+chunk_size = 64         # configurations per task
+
+
+def wrap_angle_pi(angle):
+    """Wrap angles to (-π, π] (vectorized version of the 06demo function)"""
+    wrapped = np.mod(angle, 2 * np.pi)
+    return np.where(wrapped > np.pi, wrapped - 2 * np.pi, wrapped)
+
+
+def chunk_bounds(trial_filename):
+    """App timestamp bounds of the /nextdata chunks, accumulated as the server does"""
+    f = open_trial_file(trial_filename)
+    bounds = [f.first_ts - 1e-9 if len(f) else 0.0]
+    while bounds[-1] < f.last_ts:
+        bounds.append(bounds[-1] + horizon)
+    return np.array(bounds)
+
+
+def last_created(chunk, n_steps):
+    """For each step, index of the last sample received up to that step (-1 if none); chunk is sorted"""
+    return np.searchsorted(chunk, np.arange(n_steps), side="right") - 1
+
+
+def prepare_trial(trial_filename, gt_filename):
+    """
+    Parse a trial once into the parameter independent arrays of the 06demo default path.
+    Samples keep their file order; `chunk` is the index of the /nextdata reply they arrive in.
+    """
+    bounds = chunk_bounds(trial_filename)
+    n_steps = len(bounds) - 1
+    data = read_trial(trial_filename)
+    for sensor_type, df in data.items():
+        df = df[df["app_timestamp"].notna()]
+        df.insert(0, "chunk", np.searchsorted(bounds, df["app_timestamp"].to_numpy(), side="left") - 1)
+        data[sensor_type] = df
+    empty = pd.DataFrame({"chunk": np.empty(0, dtype=np.int64), "sensor_timestamp": np.empty(0)})
+
+    # newest sensor timestamp at the end of each step (last_estimate_ts of the next one)
+    newest = np.zeros(n_steps)
+    for df in data.values():
+        ts = df["sensor_timestamp"].to_numpy()
+        ok = ~np.isnan(ts)
+        np.maximum.at(newest, df["chunk"].to_numpy()[ok], ts[ok])
+    newest = np.maximum.accumulate(newest)
+
+    # initialisation on the first base_link GPOS
+    gpos = data.get("GPOS", empty.assign(object_id=[]))
+    base = gpos[gpos["object_id"] == "base_link"]
+    if len(base) == 0:
+        raise ValueError(f"{trial_filename}: no base_link GPOS to initialize from")
+    b = base.iloc[0]
+    init_yaw = np.arctan2(2.0 * (b.quat_w * b.quat_z + b.quat_x * b.quat_y), 1.0 - 2.0 * (b.quat_y ** 2 + b.quat_z ** 2))
+    init = np.array([b.chunk, b.location_x, b.location_y, init_yaw])
+    init_step = int(b.chunk)
+    steps = np.arange(n_steps)
+    since = np.where(steps > init_step, np.append(0.0, newest[:-1]), np.nan)
+    since[init_step] = b.sensor_timestamp
+
+    # VIO deltas between consecutive VISO samples
+    viso = data.get("VISO", empty)
+    vio_ts = viso["sensor_timestamp"].to_numpy()[1:]
+    vio_chunk = viso["chunk"].to_numpy()[1:]
+    if len(viso):
+        q = viso[["quat_x", "quat_y", "quat_z", "quat_w"]].to_numpy()
+        vio_yaw = np.arctan2(2.0 * (q[:, 3] * q[:, 2] + q[:, 0] * q[:, 1]), 1.0 - 2.0 * (q[:, 1] ** 2 + q[:, 2] ** 2))
+        vio_dx = np.diff(viso["location_x"].to_numpy())
+        vio_dy = np.diff(viso["location_y"].to_numpy())
+        vio_dyaw = wrap_angle_pi(np.diff(vio_yaw))
+    else:
+        vio_dx = vio_dy = vio_dyaw = np.empty(0)
+    last_vio = last_created(vio_chunk, n_steps)
+    vio_available = (steps >= init_step) & (last_vio >= 0) & (vio_ts[np.maximum(last_vio, 0)] > since) if len(vio_ts) else np.zeros(n_steps, dtype=bool)
+
+    # UWB fix from the latest UWBT and the latest pose of its tag
+    uwbt = data.get("UWBT", empty.assign(tag_id=[]))
+    last_uwbt = last_created(uwbt["chunk"].to_numpy(), n_steps)
+    uwbt_ts = uwbt["sensor_timestamp"].to_numpy()
+    fixed = (steps >= init_step) & (last_uwbt >= 0)
+    fixed[fixed] = uwbt_ts[last_uwbt[fixed]] > since[fixed]
+    tag_x = np.full(n_steps, np.nan)
+    tag_y = np.full(n_steps, np.nan)
+    rows = []
+    for k in np.flatnonzero(fixed):
+        u = uwbt.iloc[last_uwbt[k]]
+        poses = gpos[(gpos["object_id"] == u.tag_id) & (gpos["chunk"] <= k)]
+        if len(poses):
+            p = poses.iloc[-1]
+            rows.append((k, u.distance, u.aoa_azimuth, u.aoa_elevation, p.location_x, p.location_y, p.location_z,
+                         p.quat_x, p.quat_y, p.quat_z, p.quat_w))
+    if len(rows):
+        from scipy.spatial.transform import Rotation
+        r = np.array(rows)
+        az, el = np.radians(r[:, 2]), np.radians(r[:, 3])
+        local = np.column_stack((r[:, 1] * np.cos(el) * np.sin(az), r[:, 1] * np.cos(el) * np.cos(az), r[:, 1] * np.sin(el)))
+        point = Rotation.from_quat(r[:, 7:11]).apply(local) + r[:, 4:7]
+        k = r[:, 0].astype(int)
+        tag_x[k], tag_y[k] = point[:, 0], point[:, 1]
+
+    acce = data.get("ACCE", empty.assign(acc_x=[], acc_y=[], acc_z=[]))
+    total = np.sqrt(acce["acc_x"].to_numpy() ** 2 + acce["acc_y"].to_numpy() ** 2 + acce["acc_z"].to_numpy() ** 2) - 1.0
+    ahrs = data.get("AHRS", empty.assign(yaw_z=[]))
+    ahrs_yaw = ahrs["yaw_z"].to_numpy() / 180 * np.pi
+    ahrs_dyaw = np.append(0.0, wrap_angle_pi(np.diff(ahrs_yaw)))
+    ahrs_dyaw[:2] = 0.0 # 06demo starts differencing at the third sample
+
+    # estimates are posted with the next /nextdata, at the end of their chunk; the last one never is
+    pts = bounds[1:n_steps]
+    gt = pd.read_csv(gt_filename, header=0).astype(float)
+    scored = (pts >= gt["timestamp"].iloc[0]) & (pts <= gt["timestamp"].iloc[-1])
+
+    return {
+        "init": init, "since": since, "vio_available": vio_available, "tag_x": tag_x, "tag_y": tag_y,
+        "acce_ts": to_ns(acce["sensor_timestamp"].to_numpy()), "acce_chunk": acce["chunk"].to_numpy(), "acce_total2": total ** 2,
+        "ahrs_ts": to_ns(ahrs["sensor_timestamp"].to_numpy()), "ahrs_chunk": ahrs["chunk"].to_numpy(),
+        "ahrs_yaw": ahrs_yaw, "ahrs_dyaw": ahrs_dyaw,
+        "vio_ts": vio_ts, "vio_chunk": vio_chunk, "vio_dx": vio_dx, "vio_dy": vio_dy, "vio_dyaw": vio_dyaw,
+        "pts": pts, "scored": scored,
+        "gt_x": np.interp(pts, gt["timestamp"], gt["x"]), "gt_y": np.interp(pts, gt["timestamp"], gt["y"]),
+    }
+
+
+def save_trial(arrays, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, a in arrays.items():
+        np.save(os.path.join(directory, name + ".npy"), a)
+
+
+def load_trial(directory):
+    """The arrays of save_trial, memory-mapped read-only"""
+    return {name[:-4]: np.load(os.path.join(directory, name), mmap_mode='r')
+            for name in os.listdir(directory) if name.endswith(".npy")}
+
+
+def within_step_cumsum(step, values):
+    """Cumulative sum of values restarting at every step (step sorted)"""
+    c = np.cumsum(values)
+    start = np.flatnonzero(np.append(True, step[1:] != step[:-1]))
+    offset = np.repeat(c[start] - values[start], np.diff(np.append(start, len(step))))
+    return c - offset
+
+
+def prepare_window(t, W):
+    """
+    The parameter independent part of the PDR of df_convert_window W.
+
+    The n-th ACCE sample appends a PDR sample timestamped at the last sample of its window
+    acce[-W:-1] (all the samples while there are at most W); it is used by the first PDR step
+    whose last_estimate_ts is older, with the nearest AHRS sample received so far (20 ms).
+    Returns the window of each used PDR sample and its odometry direction per m/s, the yaw of
+    every step and the VIO displacement of every VIO step.
+    """
+    init_step = int(t["init"][0])
+    since = np.asarray(t["since"])
+    n_steps = len(since)
+    acce_ts = np.asarray(t["acce_ts"])
+    n = np.arange(1, len(acce_ts) + 1)
+    full = n > W
+    lo = np.where(full, n - W, 0)
+    hi = np.where(full, n - 2, n - 1)
+    ts = acce_ts[hi]
+    step = np.maximum(np.asarray(t["acce_chunk"]), init_step)
+    valid_step = step < n_steps
+    step = np.minimum(step, n_steps - 1)
+    used = valid_step & ~np.asarray(t["vio_available"])[step] & (ts > to_ns(np.nan_to_num(since[step], nan=np.inf)))
+    lo, hi, ts, step = lo[used], hi[used], ts[used], step[used]
+
+    # nearest AHRS sample among those received up to the step, ties to the earlier one
+    ahrs_ts = np.asarray(t["ahrs_ts"])
+    m = last_created(np.asarray(t["ahrs_chunk"]), n_steps)[step] + 1
+    back = np.minimum(np.searchsorted(ahrs_ts, ts, side="right") - 1, m - 1)
+    fwd = np.searchsorted(ahrs_ts, ts, side="left")
+    big = np.iinfo(np.int64).max
+    d_back = np.where(back >= 0, ts - ahrs_ts[np.maximum(back, 0)], big) if len(ahrs_ts) else np.full(len(ts), big)
+    d_fwd = np.where(fwd < m, ahrs_ts[np.minimum(fwd, len(ahrs_ts) - 1)] - ts, big) if len(ahrs_ts) else np.full(len(ts), big)
+    idx = np.where(d_back <= d_fwd, back, fwd)
+    matched = np.minimum(d_back, d_fwd) <= int(round(ahrs_tolerance * NS))
+    idx = np.where(matched, idx, 0)
+    valid = matched & ~np.isnan(np.asarray(t["ahrs_yaw"])[idx]) if len(ahrs_ts) else matched
+    dyaw = np.where(valid, np.asarray(t["ahrs_dyaw"])[idx] if len(ahrs_ts) else 0.0, 0.0)
+
+    # each PDR step lasts from the previous distinct timestamp, or from the last estimate
+    seconds = ts / NS
+    run = np.append(True, (step[1:] != step[:-1]) | (ts[1:] != ts[:-1]))
+    run_start = np.maximum.accumulate(np.where(run, np.arange(len(ts)), 0))
+    prev_in_step = (run_start > 0) & (step[np.maximum(run_start - 1, 0)] == step)
+    prev = np.where(prev_in_step, seconds[np.maximum(run_start - 1, 0)], since[step])
+    dt = seconds - prev
+
+    # VIO deltas newer than the last estimate, at VIO steps
+    vio_ts = np.asarray(t["vio_ts"])
+    vio_step = np.minimum(np.maximum(np.asarray(t["vio_chunk"]), init_step), n_steps - 1)
+    vio_used = (np.asarray(t["vio_chunk"]) < n_steps) & np.asarray(t["vio_available"])[vio_step] & (vio_ts > since[vio_step])
+    vio_step = vio_step[vio_used]
+    vio_dx, vio_dy, vio_dyaw = (np.asarray(t[c])[vio_used] for c in ("vio_dx", "vio_dy", "vio_dyaw"))
+
+    # yaw does not depend on the speed: accumulate it over the steps, then inside them
+    change = np.bincount(step, dyaw, minlength=n_steps) + np.bincount(vio_step, vio_dyaw, minlength=n_steps)
+    change[:init_step] = 0.0
+    yaw_start = t["init"][3] + np.cumsum(change) - change
+    yaw = np.where(np.arange(n_steps) >= init_step, wrap_angle_pi(yaw_start + change), 0.0)
+    yaw_before = yaw_start[step] + within_step_cumsum(step, dyaw) - dyaw if len(step) else np.empty(0)
+    ux = np.where(valid, dt * np.cos(yaw_before), 0.0)
+    uy = np.where(valid, dt * np.sin(yaw_before), 0.0)
+    vio_yaw = yaw_start[vio_step] + within_step_cumsum(vio_step, vio_dyaw) - vio_dyaw if len(vio_step) else np.empty(0)
+    vx = np.bincount(vio_step, np.cos(vio_yaw) * vio_dx - np.sin(vio_yaw) * vio_dy, minlength=n_steps)
+    vy = np.bincount(vio_step, np.sin(vio_yaw) * vio_dx + np.cos(vio_yaw) * vio_dy, minlength=n_steps)
+
+    # the position restarts from the initial pose and from every UWB fix
+    tag = ~np.isnan(np.asarray(t["tag_x"]))
+    anchor = tag | (np.arange(n_steps) == init_step)
+    last_anchor = np.maximum.accumulate(np.where(anchor, np.arange(n_steps), -1))
+    return SimpleNamespace(lo=lo, hi=hi, step=step, ux=ux, uy=uy, vx=vx, vy=vy, yaw=yaw,
+                           tag=tag, last_anchor=last_anchor, init_step=init_step, n_steps=n_steps)
+
+
+def walking(t, w, pdr_window_sec, acc_thresh):
+    """SimplePDR: RMS of |a| - 1 over the window, centered on its last sample, above the threshold"""
+    acce_ts = np.asarray(t["acce_ts"])
+    total2 = np.asarray(t["acce_total2"])
+    finite = ~np.isnan(total2)
+    s = np.append(0.0, np.cumsum(np.where(finite, total2, 0.0)))
+    c = np.append(0, np.cumsum(finite))
+    # pandas time windows centered on t are (t - w/2, t + w/2]
+    start = np.searchsorted(acce_ts, acce_ts[w.hi] - round(pdr_window_sec * NS) / 2, side="right")
+    lo = np.maximum(w.lo, start)
+    count = c[w.hi + 1] - c[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt((s[w.hi + 1] - s[lo]) / count) > acc_thresh
+
+
+def trajectory(t, w, walk, default_velocity):
+    """x, y of every step for one speed"""
+    xy = []
+    init_x, init_y = t["init"][1], t["init"][2]
+    for u, v, fix, start in ((w.ux, w.vx, t["tag_x"], init_x), (w.uy, w.vy, t["tag_y"], init_y)):
+        d = default_velocity * np.bincount(w.step, np.where(walk, u, 0.0), minlength=w.n_steps) + v
+        c = np.cumsum(d)
+        offset = np.where(w.tag, fix, start + d) - c
+        p = c + offset[np.maximum(w.last_anchor, 0)]
+        p[:w.init_step] = 0.0
+        xy.append(p)
+    return xy
+
+
+def errors(t, x, y):
+    """Horizontal error of the posted estimates against the ground truth"""
+    scored = np.asarray(t["scored"])
+    n = len(scored)
+    return np.hypot(x[:n] - t["gt_x"], y[:n] - t["gt_y"])[scored]
+
+
+################################################################
+# worker side: the trials are memory-mapped once per process
+
+trials = None
+windows = {}
+
+
+def load_trials(directories):
+    global trials
+    trials = [load_trial(d) for d in directories]
+
+
+def window(i, W):
+    if (i, W) not in windows:
+        if len(windows) >= 4 * len(trials):
+            windows.clear()
+        windows[(i, W)] = prepare_window(trials[i], W)
+    return windows[(i, W)]
+
+
+def evaluate(configs):
+    """Score of each configuration (all sharing df_convert_window) over all the trials"""
+    walks = {}
+    results = []
+    for acc_thresh, pdr_window_sec, default_velocity, W in configs:
+        err = []
+        for i, t in enumerate(trials):
+            w = window(i, W)
+            key = (i, pdr_window_sec, acc_thresh)
+            if key not in walks:
+                walks[key] = walking(t, w, pdr_window_sec, acc_thresh)
+            x, y = trajectory(t, w, walks[key], default_velocity)
+            err.append(errors(t, x, y))
+        err = np.concatenate(err)
+        results.append((acc_thresh, pdr_window_sec, default_velocity, W,
+                        err.mean(), np.percentile(err, 50), np.percentile(err, 90), err.max()))
+    return results
+
+################################################################
+
+
+def grid_configs():
+    values = [GRID[p] for p in PARAMETERS]
+    mesh = np.meshgrid(*values, indexing="ij")
+    return [(float(a), float(b), float(c), int(d)) for a, b, c, d in zip(*(m.ravel() for m in mesh))]
+
+
+def random_configs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = [rng.uniform(*RANGES[p], n) for p in PARAMETERS[:3]]
+    columns.append(rng.integers(RANGES["df_convert_window"][0], RANGES["df_convert_window"][1] + 1, n))
+    return [DEFAULTS] + [(float(a), float(b), float(c), int(d)) for a, b, c, d in zip(*columns)]
+
+
+def tasks(configs):
+    """Chunks of configurations sharing df_convert_window, so that workers reuse their windows"""
+    configs = sorted(configs, key=lambda c: (c[3], c[1], c[0]))
+    out = []
+    for W in sorted(set(c[3] for c in configs)):
+        group = [c for c in configs if c[3] == W]
+        out += [group[i:i + chunk_size] for i in range(0, len(group), chunk_size)]
+    return out
+
+
+def sweep(directories, configs, workers):
+    if workers == 0:
+        load_trials(directories)
+        return [r for task in tasks(configs) for r in evaluate(task)]
+    with ProcessPoolExecutor(workers, initializer=load_trials, initargs=(directories,)) as pool:
+        return [r for results in pool.map(evaluate, tasks(configs)) for r in results]
+
+
+def report(results, top=20):
+    df = pd.DataFrame(results, columns=PARAMETERS + ["mean", "p50", "p90", "max"])
+    df = df.sort_values(["mean", "p90"], ignore_index=True)
+    df.index += 1
+    print(df.head(top).to_string(float_format=lambda v: "%.3f" % v))
+    default = df[(df[PARAMETERS] == DEFAULTS).all(axis=1)]
+    if len(default):
+        print(f"\ndefaults {DEFAULTS}: rank {default.index[0]} of {len(df)}, mean error {default['mean'].iloc[0]:.3f} m")
+    return df
+
+
+def check(trial_filename, t, config=DEFAULTS):
+    """Replay the trial through DemoLocalizer in /nextdata chunks and compare with the vectorized estimates"""
+    acc_thresh, pdr_window_sec, default_velocity, W = config
+    w = prepare_window(t, W)
+    x, y = trajectory(t, w, walking(t, w, pdr_window_sec, acc_thresh), default_velocity)
+
+    demo = load_demo()
+    localizer = demo.DemoLocalizer(pdr_model=demo.SimplePDR(acc_thresh, pdr_window_sec, default_velocity), df_convert_window=W)
+    f = open_trial_file(trial_filename)
+    bounds = chunk_bounds(trial_filename)
+    worst = 0.0
+    for k in range(len(bounds) - 1):
+        text = bytes(f.slice(bounds[k], bounds[k + 1])).decode()
+        est = process_data(localizer, SimpleNamespace(text=text))
+        diff = max(abs(est[0] - x[k]), abs(est[1] - y[k]), abs(wrap_angle_pi(est[2] - w.yaw[k])))
+        worst = max(worst, diff)
+        if diff > 1e-6:
+            print(f"step {k}: DemoLocalizer {np.round(est, 6).tolist()} vs sweep {[round(x[k], 6), round(y[k], 6), round(float(w.yaw[k]), 6)]}")
+            return False
+    print(f"{len(bounds) - 1} steps of {trial_filename} match DemoLocalizer{config} (max difference {worst:.2e})")
+    return True
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4, 5, 6):
+        print("""Sweep the SimplePDR and DemoLocalizer parameters of 06demo against ground truth.  Usage is
+%s trial_files ground_truth_dir [configs] [workers] [output_csv]
+
+TRIAL_FILES is a comma separated list of trial files (.txt or .xdra); the ground truth of trials/1.txt is
+GROUND_TRUTH_DIR/1.csv.  CONFIGS is 'grid' (default, %d configurations), a number of random configurations,
+or 'check' to replay the first trial through DemoLocalizer with the default parameters and compare.
+WORKERS defaults to the number of CPUs (0: no worker processes).  The whole ranking is written to OUTPUT_CSV.""" %
+              (sys.argv[0], len(grid_configs())))
+        exit(1)
+
+    trial_filenames = sys.argv[1].split(",")
+    gt_dir = sys.argv[2]
+    mode = sys.argv[3] if len(sys.argv) > 3 else "grid"
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count()
+    output_csv = sys.argv[5] if len(sys.argv) > 5 else None
+
+    with tempfile.TemporaryDirectory() as cache:
+        t0 = time.perf_counter()
+        directories = []
+        for i, trial_filename in enumerate(trial_filenames):
+            name = os.path.splitext(os.path.basename(trial_filename))[0]
+            arrays = prepare_trial(trial_filename, os.path.join(gt_dir, name + ".csv"))
+            directories.append(os.path.join(cache, "%d_%s" % (i, name)))
+            save_trial(arrays, directories[-1])
+        print(f"{len(trial_filenames)} trials parsed in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+
+        if mode == "check":
+            exit(0 if check(trial_filenames[0], load_trial(directories[0])) else 2)
+
+        configs = grid_configs() if mode == "grid" else random_configs(int(mode))
+        t0 = time.perf_counter()
+        results = sweep(directories, configs, workers)
+        wall = time.perf_counter() - t0
+        print(f"{len(results)} configurations in {wall:.1f} s ({1000 * wall / len(results):.1f} ms each)\n", file=sys.stderr)
+
+    df = report(results)
+    if output_csv is not None:
+        df.to_csv(output_csv, index_label="rank")
+    exit(0)
@@ -0,0 +1,229 @@
+#! /usr/bin/env -S python3
+
+"""
+Config-driven offline runs of the estimators, with a content-addressed result cache.
+
+Every run of the config is three stages, each stored under a hash of everything it depends on:
+    parse     trial file contents + parser code                     -> parsed DataFrames (.pkl)
+    estimate  parse key + estimator name, parameters and code       -> estimates CSV
+              (pipeline_estimators.py and the modules it runs)
+    metrics   estimate key + ground truth contents + metrics code   -> metrics (.json)
+All the keys are computed from file hashes before anything runs, so a stage whose inputs are
+unchanged is skipped, as well as every stage before it. Trial files are hashed once per
+(size, mtime), the hashes are remembered in the cache directory.
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from trialfile import read_trial
+from pipeline_estimators import ESTIMATORS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaalapi_server"))
+from local_server import load_config
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# source files each stage depends on: changing one of them invalidates the stage
+PARSER_SOURCES = ["trialfile.py", "trialindex.py", "trialarchive.py", "xdrclient/sensors.py"]
+ESTIMATOR_SOURCES = {
+    "demo": ["pipeline_estimators.py", "xdrclient/demo.py", "06demo_location_estimate_pdr.py", "sensor_aligner.py",
+             "xdrclient/sensors.py", "ekf_fusion.py", "fixed_lag_smoother.py", "map_matching.py", "tag_map.py"],
+    "rts": ["pipeline_estimators.py", "xdrclient/demo.py", "rts_smoother.py", "ekf_fusion.py"],
+}
+METRICS_SOURCES = ["pipeline.py"]
+
+# run settings that are not estimator parameters
+RUN_KEYS = ["trial", "ground_truth", "estimator", "output"]
+# estimator parameters naming a file: its contents are part of the estimate key
+FILE_PARAMS = ["map_bitmap", "tag_map"]
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class Cache:
+    """Content-addressed store: objects/<key[:2]>/<key><ext>, and a stat cache of file hashes"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hashes_filename = os.path.join(directory, "hashes.json")
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        try:
+            with open(self.hashes_filename, 'r') as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError):
+            self.hashes = {}
+        self.hashes_changed = False
+
+    def file_hash(self, filename):
+        """sha256 of the file contents, recomputed only when its size or mtime changes"""
+        st = os.stat(filename)
+        path = os.path.abspath(filename)
+        known = self.hashes.get(path)
+        if known is not None and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.hashes[path] = (st.st_size, st.st_mtime_ns, h.hexdigest())
+        self.hashes_changed = True
+        return h.hexdigest()
+
+    def sources_hash(self, sources):
+        return digest(*(self.file_hash(os.path.join(here, s)) for s in sources if os.path.exists(os.path.join(here, s))))
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, "objects", key[:2], key + ext)
+
+    def has(self, key, ext):
+        return os.path.exists(self.path(key, ext))
+
+    def write(self, key, ext, data):
+        """Store bytes atomically (a half-written object is never seen as cached)"""
+        filename = self.path(key, ext)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp = filename + ".%d.tmp" % os.getpid()
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+
+    def read(self, key, ext):
+        with open(self.path(key, ext), 'rb') as f:
+            return f.read()
+
+    def save(self):
+        if self.hashes_changed:
+            tmp = self.hashes_filename + ".%d.tmp" % os.getpid()
+            with open(tmp, 'w') as f:
+                json.dump(self.hashes, f)
+            os.replace(tmp, self.hashes_filename)
+            self.hashes_changed = False
+
+
+def metrics(df_est, df_gt):
+    """Horizontal error of the estimates against the ground truth interpolated at their timestamps"""
+    ts = df_est["timestamp"].to_numpy()
+    inside = (ts >= df_gt["timestamp"].iloc[0]) & (ts <= df_gt["timestamp"].iloc[-1])
+    gx = np.interp(ts[inside], df_gt["timestamp"], df_gt["x"])
+    gy = np.interp(ts[inside], df_gt["timestamp"], df_gt["y"])
+    err = np.hypot(df_est["x"].to_numpy()[inside] - gx, df_est["y"].to_numpy()[inside] - gy)
+    if len(err) == 0:
+        return {"n": 0}
+    return {"n": int(len(err)), "mean": float(err.mean()), "p50": float(np.percentile(err, 50)),
+            "p90": float(np.percentile(err, 90)), "max": float(err.max())}
+
+
+################################################################
+
+def run(name, settings, cache, base_dir):
+    """Run the stages of one config entry that are not cached; returns (status of each stage, metrics)"""
+    path = lambda f: f if os.path.isabs(f) else os.path.join(base_dir, f)
+    trial = path(settings["trial"])
+    estimator = settings.get("estimator", "demo")
+    params = {k: v for k, v in settings.items() if k not in RUN_KEYS}
+    for k in FILE_PARAMS:
+        if params.get(k):
+            params[k] = path(params[k])
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"{name}: unknown estimator '{estimator}' (one of {', '.join(ESTIMATORS)})")
+
+    parse_key = digest("parse", cache.file_hash(trial), cache.sources_hash(PARSER_SOURCES))
+    inputs = [cache.file_hash(params[k]) for k in FILE_PARAMS if params.get(k)]
+    estimate_key = digest("estimate", parse_key, estimator, sorted(params.items()), *inputs,
+                          cache.sources_hash(ESTIMATOR_SOURCES[estimator]))
+    metrics_key = None
+    if settings.get("ground_truth"):
+        metrics_key = digest("metrics", estimate_key, cache.file_hash(path(settings["ground_truth"])), cache.sources_hash(METRICS_SOURCES))
+
+    status = {"parse": "-", "estimate": "-", "metrics": "-"}
+    result = None
+    if metrics_key is not None and cache.has(metrics_key, ".json"):
+        status["metrics"] = "cached"
+        result = json.loads(cache.read(metrics_key, ".json"))
+
+    df_est = None
+    need_estimates = result is None or settings.get("output")
+    if need_estimates and cache.has(estimate_key, ".csv"):
+        status["estimate"] = "cached"
+        df_est = pd.read_csv(cache.path(estimate_key, ".csv"))
+    elif need_estimates:
+        if cache.has(parse_key, ".pkl"):
+            status["parse"] = "cached"
+            data = pickle.loads(cache.read(parse_key, ".pkl"))
+        else:
+            t = time.perf_counter()
+            data = read_trial(trial, line_numbers=True)
+            cache.write(parse_key, ".pkl", pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+            status["parse"] = "%.1f s" % (time.perf_counter() - t)
+        t = time.perf_counter()
+        df_est = ESTIMATORS[estimator](data, params)
+        cache.write(estimate_key, ".csv", df_est.to_csv(index=False).encode())
+        status["estimate"] = "%.1f s" % (time.perf_counter() - t)
+
+    if result is None and metrics_key is not None:
+        t = time.perf_counter()
+        df_gt = pd.read_csv(path(settings["ground_truth"]), header=0).astype(float)
+        result = metrics(df_est, df_gt)
+        cache.write(metrics_key, ".json", json.dumps(result).encode())
+        status["metrics"] = "%.1f s" % (time.perf_counter() - t)
+
+    if settings.get("output"):
+        output = path(settings["output"])
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, 'wb') as f:
+            f.write(cache.read(estimate_key, ".csv"))
+    return status, result
+
+
+def report(rows):
+    print(f"{'run':<20} {'parse':>8} {'estimate':>9} {'metrics':>8} {'n':>6} {'mean':>7} {'p50':>7} {'p90':>7} {'max':>7}")
+    for name, status, result in rows:
+        line = f"{name:<20} {status['parse']:>8} {status['estimate']:>9} {status['metrics']:>8}"
+        if result and result.get("n"):
+            line += f" {result['n']:6d} {result['mean']:7.3f} {result['p50']:7.3f} {result['p90']:7.3f} {result['max']:7.3f}"
+        print(line)
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3, 4):
+        print("""Offline runs of the estimators described in a config file, with cached stages.  Usage is
+%s config [cache_dir] [runs]
+
+CONFIG is a YAML file in the layout of evaalapi.yaml, one entry per run (see pipeline.yaml).
+CACHE_DIR defaults to .pipeline_cache next to the config; RUNS is a comma separated subset of its entries.""" % sys.argv[0])
+        exit(1)
+
+    config_filename = sys.argv[1]
+    base_dir = os.path.dirname(os.path.abspath(config_filename))
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, ".pipeline_cache")
+    config = load_config(config_filename)
+    names = sys.argv[3].split(",") if len(sys.argv) > 3 else list(config)
+
+    cache = Cache(cache_dir)
+    rows = []
+    t = time.perf_counter()
+    try:
+        for name in names:
+            status, result = run(name, config[name], cache, base_dir)
+            rows.append((name, status, result))
+    finally:
+        cache.save()
+    report(rows)
+    print(f"\n{len(rows)} runs in {time.perf_counter() - t:.1f} s (cache: {cache_dir})")
+    exit(0)
@@ -0,0 +1,78 @@
+"""
+Estimators of pipeline.py: parsed trial (read_trial DataFrames) and parameters -> timestamp,x,y,yaw DataFrame.
+
+They are kept apart from the runner so that this file is one of the estimator sources hashed into
+the estimate key: changing the replay (chunking, parameters of the models) reruns the estimates.
+"""
+
+import numpy as np
+import pandas as pd
+
+from xdrclient import COLUMNS
+from xdrclient.demo import load_demo
+
+horizon = 0.5 # seconds of data per /nextdata, as in 06demo
+
+
+def samples_in_file_order(data):
+    """(line, sensor_type, row dict as parse_data makes it) of every sample, in the order of the file"""
+    samples = []
+    for sensor_type, df in data.items():
+        columns = COLUMNS[sensor_type]
+        values = [df[c].tolist() for c in columns]
+        samples += [(line, sensor_type, dict(zip(columns, row))) for line, row in zip(df["line"].tolist(), zip(*values))]
+    samples.sort(key=lambda s: s[0])
+    return samples
+
+
+def estimate_demo(data, params):
+    """
+    06demo DemoLocalizer fed with the /nextdata chunks of the trial (0.5 s of app timestamps),
+    as the local server would serve them; each estimate is timestamped when it would be posted,
+    at the end of its chunk (the estimate of the last chunk is never posted)
+    """
+    demo = load_demo()
+    pdr_model = demo.SimplePDR(float(params.get("acc_thresh", 0.1)), float(params.get("pdr_window_sec", 1.0)),
+                               float(params.get("default_velocity", 0.7)))
+    map_matcher = fusion = smoother = None
+    if params.get("map_bitmap"):
+        from map_matching import CorridorGraph
+        map_matcher = CorridorGraph.load_or_build(params["map_bitmap"])
+    if params.get("ekf", "False").lower() == "true":
+        from ekf_fusion import FusionEKF
+        fusion = FusionEKF()
+    if params.get("fixed_lag", "False").lower() == "true":
+        from fixed_lag_smoother import FixedLagSmoother
+        smoother = FixedLagSmoother(window_sec=5.0, max_poses=20, max_iterations=3)
+    tag_map = None
+    if params.get("tag_map"):
+        from tag_map import load_tag_map
+        tag_map = load_tag_map(params["tag_map"])
+    localizer = demo.DemoLocalizer(pdr_model=pdr_model, df_convert_window=int(params.get("df_convert_window", 20)),
+                                   map_matcher=map_matcher, fusion=fusion, smoother=smoother, tag_map=tag_map)
+
+    samples = samples_in_file_order(data)
+    app_ts = np.array([s[2]["app_timestamp"] for s in samples], dtype=float)
+    bounds = [app_ts.min() - 1e-9]
+    while bounds[-1] < app_ts.max():
+        bounds.append(bounds[-1] + horizon)
+    ends = np.searchsorted(app_ts, bounds[1:], side="right")
+
+    rows = []
+    start = 0
+    for end, pts in zip(ends[:-1], bounds[1:-1]):
+        for _, sensor_type, row in samples[start:end]:
+            localizer.callback(sensor_type, row)
+        start = end
+        est = localizer.estimate_location()
+        rows.append((pts, float(est[0]), float(est[1]), float(est[2])))
+    return pd.DataFrame(rows, columns=["timestamp", "x", "y", "yaw"])
+
+
+def estimate_rts(data, params):
+    """Forward EKF + RTS smoother over the whole trial (rts_smoother.py)"""
+    from rts_smoother import smooth_trial
+    return smooth_trial(None, float(params.get("dt", 0.1)), data=data)
+
+
+ESTIMATORS = {"demo": estimate_demo, "rts": estimate_rts}
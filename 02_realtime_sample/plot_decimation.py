@@ -0,0 +1,131 @@
+"""
+Decimation of long sensor series for plotting: a few samples per pixel column of the axes.
+
+minmax keeps, in every pixel column, the first, lowest and highest samples, so that peaks and
+outliers stay visible exactly as with every sample drawn; lttb (largest triangle three buckets)
+keeps the one sample per column that best preserves the shape of the curve. Both are a few
+NumPy passes over the series. Decimated series are cached per key (sensor, column), digest of
+the samples and x range, so drawing the same series again or going back to a zoom level already
+seen costs nothing; zooming an interactive figure decimates the visible range again at full
+resolution.
+
+    from plot_decimation import plot_decimated
+    plot_decimated(ax, df.index, df['acc_x'], 'o', key='ACCE', markersize=1.0)
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+def prepare(x, y):
+    """Float arrays sorted by x, without NaN"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    ok = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[ok], y[ok]
+    if np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+    return x, y
+
+
+def digest(x, y):
+    """Identity of a prepared series for the cache: two series of the same length differ in it"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(x.data)
+    h.update(y.data)
+    return h.hexdigest()
+
+
+def pixel_columns(x, columns, lo, hi):
+    """Start and length of the runs of samples (x sorted) in each of `columns` columns between lo and hi"""
+    col = np.clip(((x - lo) * (columns / (hi - lo))).astype(np.int64), 0, columns - 1)
+    starts = np.flatnonzero(np.r_[True, col[1:] != col[:-1]])
+    return starts, np.diff(np.r_[starts, len(x)])
+
+
+def minmax(x, y, columns, lo, hi):
+    if len(x) <= 3 * columns or hi <= lo:
+        return x, y
+    starts, counts = pixel_columns(x, columns, lo, hi)
+    group = np.repeat(np.arange(len(starts)), counts)
+    keep = [starts, [len(x) - 1]]
+    for reduce in (np.minimum, np.maximum):
+        hit = np.flatnonzero(y == np.repeat(reduce.reduceat(y, starts), counts))
+        _, first = np.unique(group[hit], return_index=True)
+        keep.append(hit[first])
+    keep = np.unique(np.concatenate(keep))
+    return x[keep], y[keep]
+
+
+def lttb(x, y, columns, lo, hi):
+    if len(x) <= columns or hi <= lo:
+        return x, y
+    starts, counts = pixel_columns(x, columns, lo, hi)
+    mean_x = np.add.reduceat(x, starts) / counts
+    mean_y = np.add.reduceat(y, starts) / counts
+    keep = np.empty(len(starts), dtype=np.int64)
+    a = 0 # the sample kept in the previous column
+    for b, (s, n) in enumerate(zip(starts, counts)):
+        cx, cy = (mean_x[b + 1], mean_y[b + 1]) if b + 1 < len(starts) else (x[-1], y[-1])
+        area = np.abs((x[a] - cx) * (y[s:s + n] - y[a]) - (x[a] - x[s:s + n]) * (cy - y[a]))
+        a = s + int(np.argmax(area))
+        keep[b] = a
+    keep = np.unique(np.r_[0, keep, len(x) - 1])
+    return x[keep], y[keep]
+
+
+METHODS = {"minmax": minmax, "lttb": lttb}
+
+
+class Decimator:
+    """Decimated series, cached per (data key, x range, columns); the least recently used are dropped"""
+
+    def __init__(self, method="minmax", max_entries=256):
+        self.method = method
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+
+    def decimate(self, x, y, columns, lo=None, hi=None, key=None):
+        """
+        Samples of the prepared series (see prepare) to draw between lo and hi, in `columns` pixels.
+        The result is cached if key is given: it must identify the data (plot() includes its digest).
+        """
+        if len(x) == 0:
+            return x, y
+        lo = x[0] if lo is None else max(lo, x[0])
+        hi = x[-1] if hi is None else min(hi, x[-1])
+        cache_key = (key, lo, hi, columns, self.method)
+        if key is not None and cache_key in self.cache:
+            self.cache.move_to_end(cache_key)
+            return self.cache[cache_key]
+        # one sample beyond each side, so that lines continue out of the view
+        i = max(np.searchsorted(x, lo, "left") - 1, 0)
+        j = min(np.searchsorted(x, hi, "right") + 1, len(x))
+        result = METHODS[self.method](x[i:j], y[i:j], columns, lo, hi)
+        if key is not None:
+            self.cache[cache_key] = result
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return result
+
+    def plot(self, ax, x, y, *args, key=None, **kwargs):
+        """ax.plot of the decimated series, decimated again when the x range of ax changes"""
+        name = getattr(y, "name", None)
+        x, y = prepare(x, y)
+        if key is not None:
+            key = (key, name, digest(x, y))
+        columns = max(int(ax.bbox.width), 100)
+        line, = ax.plot(*self.decimate(x, y, columns, key=key), *args, **kwargs)
+
+        def on_xlim_changed(ax):
+            lo, hi = ax.get_xlim()
+            line.set_data(*self.decimate(x, y, columns, lo, hi, key))
+        ax.callbacks.connect("xlim_changed", on_xlim_changed)
+        return line
+
+
+default = Decimator()
+plot_decimated = default.plot
@@ -0,0 +1,105 @@
+#! /usr/bin/env -S python3
+
+import sys
+import time
+import cProfile
+import pstats
+from collections import Counter
+
+import numpy as np
+
+from xdrclient import process_data
+from xdrclient.cassette import read_cassette
+from xdrclient.demo import load_demo
+
+
+def sent_position(req):
+    """(x, y, z) and rounding tolerance of the position of a /nextdata request, or None"""
+    if "position=" not in req:
+        return None
+    text = req.split("position=", 1)[1].split("&")[0].split(",")
+    decimals = max(len(v.partition(".")[2]) for v in text)
+    return np.array([float(v) for v in text]), 0.5 * 10 ** -decimals + 1e-9
+
+
+def summary(records):
+    statuses = Counter((r.req.split("?")[0], r.status_code) for r in records)
+    print(f"{len(records)} requests recorded over {records[-1].start + records[-1].duration:.1f} s")
+    for (req, status), n in sorted(statuses.items()):
+        print(f"    {req:<12} {status}: {n}")
+    durations = np.array([r.duration for r in records if r.req.startswith("/nextdata")])
+    if len(durations):
+        print(f"/nextdata round trip: p50 {1000 * np.percentile(durations, 50):.1f} ms, "
+              f"p95 {1000 * np.percentile(durations, 95):.1f} ms, max {1000 * durations.max():.1f} ms")
+
+
+def replay(records, localizer):
+    """
+    Feed the recorded /nextdata replies to the localizer at full speed, as 06demo does (423 replies skipped),
+    and compare each estimate with the position the recorded run sent next.
+    """
+    nextdata = [r for r in records if r.req.startswith("/nextdata")]
+    step_times = []
+    diverged = None
+    max_diff = 0.0
+    for i, record in enumerate(nextdata):
+        if record.status_code == 423:
+            continue
+        t = time.perf_counter()
+        est = process_data(localizer, record.response())
+        step_times.append(time.perf_counter() - t)
+
+        sent = next((sent_position(r.req) for r in nextdata[i + 1:i + 2]), None)
+        if sent is None:
+            continue
+        diff = np.abs(np.asarray(est, dtype=float)[:3] - sent[0]).max()
+        max_diff = max(max_diff, diff)
+        if diff > sent[1] and diverged is None:
+            diverged = (i, record.req, tuple(est), tuple(sent[0]))
+    return np.array(step_times), diverged, max_diff
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3):
+        print("""Replay a recorded EvAAL API session through the 06demo localizer, without network or waiting.  Usage is
+%s [cassette] [profile]
+
+Record the cassette by running any demo with XDR_RECORD=cassette set in the environment
+(XDR_REPLAY=cassette replays it through the demo itself instead).
+With PROFILE set to 1 the replay runs under cProfile and the 20 most expensive functions are printed.""" % sys.argv[0])
+        exit(1)
+
+    cassette = sys.argv[1]
+    profile = len(sys.argv) > 2 and sys.argv[2] == "1"
+
+    records = list(read_cassette(cassette))
+    if len(records) == 0:
+        print(f"{cassette}: empty cassette")
+        exit(1)
+    summary(records)
+
+    demo = load_demo()
+    localizer = demo.DemoLocalizer(pdr_model=demo.SimplePDR())
+    profiler = cProfile.Profile() if profile else None
+    t = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    step_times, diverged, max_diff = replay(records, localizer)
+    if profiler is not None:
+        profiler.disable()
+    wall = time.perf_counter() - t
+
+    print(f"\nreplayed {len(step_times)} steps in {wall:.2f} s "
+          f"(step p50 {1000 * np.percentile(step_times, 50):.2f} ms, p95 {1000 * np.percentile(step_times, 95):.2f} ms)")
+    if diverged is None:
+        print(f"estimates match the recorded positions (max difference {max_diff:.4f} m)")
+    else:
+        i, req, est, sent = diverged
+        print(f"estimates diverge from the recording at /nextdata #{i} ({req}):\n"
+              f"    replay {np.round(est, 3).tolist()} vs recorded {list(sent)}")
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    exit(0 if diverged is None else 2)
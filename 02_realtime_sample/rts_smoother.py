@@ -0,0 +1,200 @@
+#! /usr/bin/env -S python3
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.transform import Rotation
+
+from trialfile import read_trial
+from ekf_fusion import FusionEKF, IYAW
+
+
+def spherical_to_cartesian(distance, azimuth_deg, elevation_deg):
+    azimuth_rad = np.radians(azimuth_deg)
+    elevation_rad = np.radians(elevation_deg)
+
+    x = distance * np.cos(elevation_rad) * np.sin(azimuth_rad)
+    y = distance * np.cos(elevation_rad) * np.cos(azimuth_rad)
+    z = distance * np.sin(elevation_rad)
+
+    return x, y, z
+
+
+def get_yaw_from_quat(quat_xyzw):
+    x, y, z, w = quat_xyzw
+    yaw = np.arctan2(2.0 * (w*z + x*y), 1.0 - 2.0 * (y*y + z*z))
+    return yaw
+
+
+def step_means(ts, values, grid):
+    """Mean of values falling in each grid step (grid[k-1], grid[k]]; NaN for empty steps"""
+    idx = np.searchsorted(grid, ts, side="left")
+    ok = (idx > 0) & (idx < len(grid)) & np.isfinite(values)
+    sums = np.bincount(idx[ok], weights=values[ok], minlength=len(grid))
+    counts = np.bincount(idx[ok], minlength=len(grid))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def pdr_speed(df_acc, acc_thresh=0.1, pdr_window_sec=1.0, default_velocity=0.7):
+    """SimplePDR over the whole trial at once: walking speed per ACCE sample"""
+    ts = df_acc["sensor_timestamp"].values
+    total = np.sqrt(df_acc["acc_x"]**2 + df_acc["acc_y"]**2 + df_acc["acc_z"]**2).values - 1.0
+    s = pd.Series(total**2, index=pd.to_datetime(ts, unit="s"))
+    a_rms = np.sqrt(s.rolling(window=f"{pdr_window_sec}s", min_periods=1, center=True).mean().values)
+    return ts, np.where(a_rms > acc_thresh, default_velocity, 0.0)
+
+
+def uwb_fixes(df_uwbt, df_gpos):
+    """Convert every UWBT measurement to a global (x, y) with the latest pose of its tag"""
+    df_uwbt = df_uwbt.dropna(subset=["distance", "aoa_azimuth", "aoa_elevation"]).sort_values("sensor_timestamp")
+    df_gpos = df_gpos.dropna(subset=["location_x", "quat_w"]).sort_values("sensor_timestamp")
+    df = pd.merge_asof(df_uwbt, df_gpos.rename(columns={"object_id": "tag_id"}),
+                       on="sensor_timestamp", by="tag_id", direction="backward", suffixes=("", "_tag"))
+    df = df.dropna(subset=["location_x"])
+
+    local = np.column_stack(spherical_to_cartesian(df["distance"].values, df["aoa_azimuth"].values, df["aoa_elevation"].values))
+    R = Rotation.from_quat(df[["quat_x", "quat_y", "quat_z", "quat_w"]].values)
+    glob = R.apply(local) + df[["location_x", "location_y", "location_z"]].values
+    return df["sensor_timestamp"].values, glob[:, 0], glob[:, 1], df["distance"].values
+
+
+def vio_steps(df_viso, grid, max_gap=0.5):
+    """VIO displacement norm and yaw change per grid step, NaN where VIO is missing"""
+    ts = df_viso["sensor_timestamp"].values
+    yaw = np.unwrap(get_yaw_from_quat(df_viso[["quat_x", "quat_y", "quat_z", "quat_w"]].values.T))
+
+    # Interpolate the VIO pose on the grid, invalidating steps that span a VIO gap
+    x = np.interp(grid, ts, df_viso["location_x"].values)
+    y = np.interp(grid, ts, df_viso["location_y"].values)
+    yaw = np.interp(grid, ts, yaw)
+    i = np.clip(np.searchsorted(ts, grid), 1, len(ts) - 1)
+    valid = (grid >= ts[0]) & (grid <= ts[-1]) & (ts[i] - ts[i - 1] <= max_gap)
+
+    dist = np.full(len(grid), np.nan)
+    dyaw = np.full(len(grid), np.nan)
+    ok = valid[1:] & valid[:-1]
+    dist[1:][ok] = np.hypot(np.diff(x), np.diff(y))[ok]
+    dyaw[1:][ok] = np.diff(yaw)[ok]
+    return dist, dyaw
+
+
+def forward_filter(fusion, grid, dyaw_in, speed_pdr, vio_dist, vio_dyaw, fixes, init):
+    """Run the EKF over the grid, storing predicted/filtered moments and transition Jacobians"""
+    n = len(grid)
+    xs_p = np.empty((n, 5))
+    Ps_p = np.empty((n, 5, 5))
+    xs_f = np.empty((n, 5))
+    Ps_f = np.empty((n, 5, 5))
+    Fs = np.empty((n, 5, 5))
+
+    fusion.initialize(grid[0], *init)
+    fix_ts, fix_x, fix_y, fix_d = fixes
+    fix_step = np.searchsorted(grid, fix_ts, side="left")
+    fix_order = np.argsort(fix_step, kind="stable")
+    fix_bounds = np.searchsorted(fix_step[fix_order], np.arange(n + 1))
+    dt = grid[1] - grid[0] if n > 1 else 0.0
+
+    for k in range(n):
+        # VIO heading changes are per step, so only this step's heading input is compared to them
+        fusion.dyaw_since_vio = 0.0
+        fusion.dt_since_vio = 0.0
+        if k > 0:
+            fusion.predict(grid[k], dyaw_in[k])
+        xs_p[k] = fusion.s
+        Ps_p[k] = fusion.P
+        Fs[k] = fusion.F
+
+        if np.isfinite(vio_dist[k]):
+            fusion.update_vio(grid[k], vio_dist[k], 0.0, vio_dyaw[k], dt)
+        elif np.isfinite(speed_pdr[k]):
+            fusion.update_speed(grid[k], speed_pdr[k])
+        for j in fix_order[fix_bounds[k]:fix_bounds[k + 1]]:
+            fusion.update_position(grid[k], fix_x[j], fix_y[j], fix_d[j])
+
+        xs_f[k] = fusion.s
+        Ps_f[k] = fusion.P
+    return xs_p, Ps_p, xs_f, Ps_f, Fs
+
+
+def rts_smooth(xs_p, Ps_p, xs_f, Ps_f, Fs):
+    """Rauch-Tung-Striebel backward pass; the smoother gains are solved for all steps in one batch"""
+    # G_k = P_f[k] F_{k+1}^T P_p[k+1]^-1, i.e. G_k^T = solve(P_p[k+1], F_{k+1} P_f[k])
+    Gt = np.linalg.solve(Ps_p[1:], Fs[1:] @ Ps_f[:-1])
+    G = np.transpose(Gt, (0, 2, 1))
+
+    xs_s = xs_f.copy()
+    for k in range(len(xs_f) - 2, -1, -1):
+        d = xs_s[k + 1] - xs_p[k + 1]
+        d[IYAW] = (d[IYAW] + np.pi) % (2 * np.pi) - np.pi
+        xs_s[k] += G[k] @ d
+    xs_s[:, IYAW] = (xs_s[:, IYAW] + np.pi) % (2 * np.pi) - np.pi
+    return xs_s
+
+
+def smooth_trial(trial_filename, dt=0.1, fusion=None, data=None):
+    """
+    Forward EKF + RTS backward pass over a whole trial file (or its already parsed read_trial
+    DataFrames); returns a timestamp,x,y,yaw DataFrame
+    """
+    data = read_trial(trial_filename) if data is None else data
+    fusion = fusion if fusion is not None else FusionEKF()
+
+    df_gpos = data["GPOS"]
+    base = df_gpos[df_gpos["object_id"] == "base_link"]
+    t_end = max(df["sensor_timestamp"].max() for df in data.values())
+    if len(base) > 0:
+        b = base.iloc[0]
+        t0 = b["sensor_timestamp"]
+        init = (b["location_x"], b["location_y"], get_yaw_from_quat(b[["quat_x", "quat_y", "quat_z", "quat_w"]].values))
+    else:
+        t0 = min(df["sensor_timestamp"].min() for df in data.values())
+        init = (0.0, 0.0, 0.0)  # inipos
+    grid = np.arange(t0, t_end + dt, dt)
+
+    # Heading input: AHRS yaw increments per step
+    df_ahrs = data["AHRS"].sort_values("sensor_timestamp")
+    yaw = np.unwrap(np.radians(df_ahrs["yaw_z"].values))
+    dyaw_in = np.zeros(len(grid))
+    dyaw_in[1:] = np.diff(np.interp(grid, df_ahrs["sensor_timestamp"].values, yaw))
+
+    acc_ts, acc_speed = pdr_speed(data["ACCE"].sort_values("sensor_timestamp"))
+    speed_pdr = step_means(acc_ts, acc_speed, grid)
+
+    if "VISO" in data:
+        vio_dist, vio_dyaw = vio_steps(data["VISO"].sort_values("sensor_timestamp"), grid)
+    else:
+        vio_dist = vio_dyaw = np.full(len(grid), np.nan)
+
+    if "UWBT" in data:
+        fixes = uwb_fixes(data["UWBT"], df_gpos)
+    else:
+        fixes = (np.array([]),) * 4
+
+    moments = forward_filter(fusion, grid, dyaw_in, speed_pdr, vio_dist, vio_dyaw, fixes, init)
+    xs_s = rts_smooth(*moments)
+    return pd.DataFrame({"timestamp": grid, "x": xs_s[:, 0], "y": xs_s[:, 1], "yaw": xs_s[:, IYAW]})
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4):
+        print("""Offline forward EKF + RTS smoother over a whole trial file.  Usage is
+%s [trial_file] [output_csv] [dt]
+
+DT is the output/filter step in seconds (default 0.1)""" % sys.argv[0])
+        exit(1)
+
+    trial_filename = sys.argv[1]
+    output_csv = sys.argv[2]
+    dt = float(sys.argv[3]) if len(sys.argv) == 4 else 0.1
+
+    t = time.time()
+    df = smooth_trial(trial_filename, dt)
+    df.to_csv(output_csv, index=False)
+    print(f"{len(df)} poses ({df.timestamp.iloc[-1] - df.timestamp.iloc[0]:.1f} s of data) smoothed in {time.time() - t:.2f} s -> {output_csv}")
+    exit(0)
@@ -0,0 +1,190 @@
+import numpy as np
+
+
+NS = 1_000_000_000
+
+
+def to_ns(ts):
+    """Seconds to integer nanoseconds, rounded the same way as pd.to_datetime(unit='s')"""
+    return np.round(np.asarray(ts, dtype=float) * NS).astype(np.int64)
+
+
+class SensorTimeline:
+    """
+    Sorted, growable timeline of one sensor: int64 nanosecond timestamps and float columns.
+    Appends are amortized O(1); a late (out-of-order) sample is inserted at its sorted place.
+    """
+
+    def __init__(self, columns, capacity=1024):
+        self.columns = list(columns)
+        self._ts = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty((capacity, len(self.columns)))
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def ts(self):
+        return self._ts[:self.n]
+
+    @property
+    def values(self):
+        return self._values[:self.n]
+
+    def _reserve(self, extra):
+        if self.n + extra <= len(self._ts):
+            return
+        capacity = max(2 * len(self._ts), self.n + extra)
+        ts = np.empty(capacity, dtype=np.int64)
+        values = np.empty((capacity, len(self.columns)))
+        ts[:self.n] = self._ts[:self.n]
+        values[:self.n] = self._values[:self.n]
+        self._ts = ts
+        self._values = values
+
+    def append(self, ts, values):
+        self._reserve(1)
+        t = int(round(ts * NS))
+        n = self.n
+        if n == 0 or t >= self._ts[n - 1]:
+            i = n
+        else:
+            i = int(np.searchsorted(self._ts[:n], t, side="right"))
+            self._ts[i + 1:n + 1] = self._ts[i:n]
+            self._values[i + 1:n + 1] = self._values[i:n]
+        self._ts[i] = t
+        self._values[i] = values
+        self.n += 1
+
+    def extend(self, ts, values):
+        """Append a block of samples (sorted or not)"""
+        ts = to_ns(ts)
+        values = np.asarray(values, dtype=float).reshape(len(ts), len(self.columns))
+        self._reserve(len(ts))
+        n = self.n
+        self._ts[n:n + len(ts)] = ts
+        self._values[n:n + len(ts)] = values
+        self.n += len(ts)
+        if len(ts) and (np.any(np.diff(ts) < 0) or (n > 0 and ts[0] < self._ts[n - 1])):
+            order = np.argsort(self._ts[:self.n], kind="stable")
+            self._ts[:self.n] = self._ts[:self.n][order]
+            self._values[:self.n] = self._values[:self.n][order]
+
+    def discard_before(self, t_ns):
+        """Drop the samples before t_ns (int64 ns), except the last one, still needed to interpolate at t_ns"""
+        i = int(np.searchsorted(self.ts, t_ns, side="right")) - 1
+        if i > 0:
+            self._ts[:self.n - i] = self._ts[i:self.n]
+            self._values[:self.n - i] = self._values[i:self.n]
+            self.n -= i
+
+    def since(self, ts):
+        """Index of the first sample strictly after ts (seconds)"""
+        return int(np.searchsorted(self.ts, int(round(ts * NS)), side="right"))
+
+    def nearest(self, query_ns, tolerance_ns):
+        """
+        Values of the nearest sample for each query (int64 ns), NaN if none within tolerance.
+        Ties prefer the earlier sample, as pd.merge_asof(direction='nearest') does.
+        """
+        out = np.full((len(query_ns), len(self.columns)), np.nan)
+        if self.n == 0 or len(query_ns) == 0:
+            return out
+        ts = self.ts
+        right = np.searchsorted(ts, query_ns, side="left")
+        # backward candidate: last sample <= query
+        back = np.searchsorted(ts, query_ns, side="right") - 1
+        fwd = np.minimum(right, self.n - 1)
+        d_back = np.where(back >= 0, query_ns - ts[np.maximum(back, 0)], np.iinfo(np.int64).max)
+        d_fwd = np.where(right < self.n, ts[fwd] - query_ns, np.iinfo(np.int64).max)
+        use_back = d_back <= d_fwd
+        idx = np.where(use_back, back, fwd)
+        dist = np.where(use_back, d_back, d_fwd)
+        ok = dist <= tolerance_ns
+        out[ok] = self.values[idx[ok]]
+        return out
+
+    def interpolate(self, query_ns):
+        """Linear interpolation of every column at the queries, NaN outside the timeline"""
+        out = np.full((len(query_ns), len(self.columns)), np.nan)
+        if self.n < 2 or len(query_ns) == 0:
+            return out
+        ts = self.ts
+        i = np.clip(np.searchsorted(ts, query_ns, side="right"), 1, self.n - 1)
+        t0 = ts[i - 1]
+        span = (ts[i] - t0).astype(float)
+        w = np.divide((query_ns - t0).astype(float), span, out=np.zeros(len(i)), where=span > 0)
+        v0 = self.values[i - 1]
+        v1 = self.values[i]
+        inside = (query_ns >= ts[0]) & (query_ns <= ts[-1])
+        out[inside] = (v0 + w[:, np.newaxis] * (v1 - v0))[inside]
+        return out
+
+
+class SensorAligner:
+    """
+    Keeps one sorted timeline per sensor and aligns them incrementally with NumPy.
+
+    - match(): for the samples of a reference sensor after a given time, the nearest sample of
+      another sensor within a tolerance (the incremental equivalent of pd.merge_asof).
+    - grid_block(): the next block of a common time grid, with every sensor interpolated or
+      nearest-matched on it. Only grid points covered by all sensors are emitted, and each call
+      continues where the previous one stopped, so only new samples are processed.
+    - discard_before(): drops the samples a consumer of grid blocks no longer needs, so that
+      the timelines of a long trial stay bounded.
+    """
+
+    def __init__(self):
+        self.timelines = {}
+        self.grid_next = {}
+
+    def add_sensor(self, name, columns, capacity=1024):
+        self.timelines[name] = SensorTimeline(columns, capacity)
+
+    def __getitem__(self, name):
+        return self.timelines[name]
+
+    def append(self, name, ts, values):
+        self.timelines[name].append(ts, values)
+
+    def match(self, ref, other, since=None, tolerance=0.02):
+        """Reference samples after `since` (seconds) with the nearest `other` sample within tolerance"""
+        ref_tl = self.timelines[ref]
+        start = 0 if since is None else ref_tl.since(since)
+        query = ref_tl.ts[start:]
+        matched = self.timelines[other].nearest(query, int(round(tolerance * NS)))
+        return query / NS, ref_tl.values[start:], matched
+
+    def discard_before(self, ts, sensors=None):
+        """Drop the samples before ts (seconds) of the given sensors (default all), keeping the last one"""
+        t_ns = int(round(ts * NS))
+        for name in (sensors if sensors is not None else self.timelines):
+            self.timelines[name].discard_before(t_ns)
+
+    def grid_block(self, sensors, step, method="interp", tolerance=None, key=None):
+        """
+        Next block of the common grid (multiples of `step` seconds) covered by all `sensors`.
+        Returns grid timestamps (seconds) and a dict of (n, columns) arrays per sensor.
+        """
+        key = key if key is not None else (tuple(sensors), step, method)
+        step_ns = int(round(step * NS))
+        tls = [self.timelines[s] for s in sensors]
+        if any(len(tl) == 0 for tl in tls):
+            return np.empty(0), {s: np.empty((0, len(tl.columns))) for s, tl in zip(sensors, tls)}
+
+        first = max(tl.ts[0] for tl in tls)
+        last = min(tl.ts[-1] for tl in tls)
+        start = self.grid_next.get(key, -(-first // step_ns) * step_ns)
+        grid = np.arange(start, last + 1, step_ns, dtype=np.int64)
+        if len(grid):
+            self.grid_next[key] = grid[-1] + step_ns
+
+        tol_ns = int(round((tolerance if tolerance is not None else step / 2) * NS))
+        block = {}
+        for s, tl in zip(sensors, tls):
+            if method == "interp":
+                block[s] = tl.interpolate(grid)
+            else:
+                block[s] = tl.nearest(grid, tol_ns)
+        return grid / NS, block
@@ -0,0 +1,81 @@
+#! /usr/bin/env -S python3
+
+"""
+Static UWB tag map: the poses of the objects that never move in the GPOS rows of the trials.
+
+The tool keeps every object_id whose GPOS poses agree within a tolerance in all the trial files
+where it appears, and saves its location, quaternion and rotation matrix (.npz). DemoLocalizer
+loads the map at startup (see tag_map_file in 06demo_location_estimate_pdr.py), so that the
+first UWBT sample of a tag gives a fix, before its GPOS row arrives.
+"""
+
+import sys
+
+import numpy as np
+
+# poses of a fixed object agree within these (m, and |dot| of the unit quaternions)
+LOCATION_TOLERANCE = 0.01
+QUATERNION_TOLERANCE = 1e-6
+
+POSE_COLUMNS = ["location_x", "location_y", "location_z", "quat_x", "quat_y", "quat_z", "quat_w"]
+
+
+def quat_to_matrix(q):
+    """Rotation matrix of a quaternion (x, y, z, w), normalized first as scipy does"""
+    x, y, z, w = np.asarray(q, dtype=float) / np.linalg.norm(q)
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+def fixed_poses(trial_filenames):
+    """{object_id: pose (location xyz, quaternion xyzw)} of the objects with a single pose in all the trials"""
+    from trialfile import read_trial
+    poses = {}
+    moving = set()
+    for filename in trial_filenames:
+        df = read_trial(filename, sensors=["GPOS"]).get("GPOS")
+        if df is None:
+            continue
+        for object_id, group in df.groupby("object_id", sort=False):
+            values = group[POSE_COLUMNS].to_numpy()
+            first = poses.get(object_id, values[0])
+            q = values[:, 3:] / np.linalg.norm(values[:, 3:], axis=1, keepdims=True)
+            dot = np.abs(q @ (first[3:] / np.linalg.norm(first[3:])))
+            if (np.abs(values[:, :3] - first[:3]).max() > LOCATION_TOLERANCE) or (dot.min() < 1 - QUATERNION_TOLERANCE):
+                moving.add(object_id)
+            poses.setdefault(object_id, first)
+    return {k: v for k, v in poses.items() if k not in moving}
+
+
+def save_tag_map(filename, poses):
+    ids = sorted(poses)
+    pose = np.array([poses[k] for k in ids]).reshape(-1, 7)
+    np.savez_compressed(filename, tag_id=np.array(ids, dtype=str), location=pose[:, :3], quat=pose[:, 3:],
+                        rotation=np.array([quat_to_matrix(q) for q in pose[:, 3:]]).reshape(-1, 3, 3))
+
+
+def load_tag_map(filename):
+    """{tag_id: (location, rotation matrix)}, as DemoLocalizer(tag_map=...) expects"""
+    with np.load(filename) as f:
+        return {str(k): (loc, R) for k, loc, R in zip(f["tag_id"], f["location"], f["rotation"])}
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 3:
+        print("""Extract the poses of the fixed UWB tags from the GPOS rows of trial files.  Usage is
+%s output_npz trial_file...""" % sys.argv[0])
+        exit(1)
+
+    output = sys.argv[1]
+    poses = fixed_poses(sys.argv[2:])
+    save_tag_map(output, poses)
+    for tag_id, pose in sorted(poses.items()):
+        print("%-12s location %8.3f %8.3f %8.3f  quat %8.5f %8.5f %8.5f %8.5f" % (tag_id, *pose))
+    print(f"{len(poses)} fixed tags saved to {output}")
+    exit(0)
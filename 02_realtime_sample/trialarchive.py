@@ -0,0 +1,314 @@
+#! /usr/bin/env -S python3
+
+import os
+import sys
+import json
+import lzma
+import time
+import bisect
+import struct
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Archive layout:
+#   MAGIC, then compressed frames, then the JSON index, then FOOTER (index offset, index length, FOOTER_MAGIC).
+# Every time bucket holds one frame per sensor (its lines in file order) and a "_seq" frame with the
+# sensor number of each line, so any sensor subset is decompressed alone and the original line
+# order can still be restored exactly. The lines before the first data line (header comments) are
+# kept in the index, as is whether the file ends with a newline, so that the file is restored
+# byte for byte (see verify).
+MAGIC = b"XDRA\x01\n"
+FOOTER = struct.Struct("<QQ8s")
+FOOTER_MAGIC = b"XDRAIDX1"
+ARCHIVE_VERSION = 1
+
+SENSORS = ['ACCE', 'GYRO', 'MAGN', 'AHRS', 'UWBP', 'UWBT', 'GPOS', 'VISO']
+OTHER = len(SENSORS)  # comments and unknown lines
+
+
+def compress(data, codec, level=None):
+    if codec == "xz":
+        return lzma.compress(data, preset=6 if level is None else level)
+    if codec == "zstd":
+        import zstandard # optional, pip install zstandard
+        return zstandard.ZstdCompressor(level=10 if level is None else level).compress(data)
+    raise ValueError(f"unknown codec {codec}")
+
+
+def decompress(data, codec):
+    # both decompressors release the GIL, so frames are decompressed in parallel by threads
+    if codec == "xz":
+        return lzma.decompress(data)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown codec {codec}")
+
+
+def line_info(line, sepch=b';'):
+    """Sensor number and app timestamp (None if missing) of one raw line"""
+    fields = line.split(sepch, 2)
+    try:
+        sensor = SENSORS.index(fields[0].decode('ascii'))
+    except (ValueError, UnicodeDecodeError):
+        sensor = OTHER
+    if sensor == OTHER or len(fields) < 3:
+        return OTHER, None
+    try:
+        return sensor, float(fields[1])
+    except ValueError:
+        return OTHER, None
+
+
+def convert(trial_filename, archive_filename, bucket=10.0, codec="xz", level=None, workers=None):
+    """
+    Convert a trial text file to a block-compressed archive, in one pass.
+    Lines are grouped in buckets of `bucket` seconds of app timestamp (comments and
+    late lines stay with the bucket being written). Returns the index.
+    """
+    index = {"version": ARCHIVE_VERSION, "codec": codec, "bucket": bucket, "sensors": SENSORS + ["other"],
+             "source": os.path.basename(trial_filename), "buckets": [], "header": "", "final_newline": True}
+    header = []
+
+    with open(trial_filename, 'rb') as src, open(archive_filename, 'wb') as dst, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        dst.write(MAGIC)
+        names_index = {s: i for i, s in enumerate(SENSORS + ["other"])}
+
+        def flush(k, lines, seq, t_first, t_last):
+            names = [s for s in SENSORS + ["other"] if len(lines[names_index[s]]) > 0]
+            payloads = [b"".join(lines[names_index[s]]) for s in names] + [bytes(seq)]
+            frames = {}
+            for name, data, n in zip(names + ["_seq"], pool.map(lambda d: compress(d, codec, level), payloads),
+                                     [len(lines[names_index[s]]) for s in names] + [len(seq)]):
+                frames[name] = [dst.tell(), len(data), n]
+                dst.write(data)
+            index["buckets"].append({"k": k, "t_first": t_first, "t_last": t_last, "frames": frames})
+
+        current = None
+        lines = [[] for _ in names_index]
+        seq = bytearray()
+        t_first = t_last = None
+        t0 = None
+        for line in src:
+            sensor, ts = line_info(line)
+            if ts is None and t0 is None:
+                header.append(line) # served with the first data line, as by the local server
+                continue
+            if not line.endswith(b"\n"):
+                index["final_newline"] = False
+                line += b"\n"
+            if ts is not None:
+                if t0 is None:
+                    t0 = (ts // bucket) * bucket
+                    index["t0"] = t0
+                k = int((ts - t0) // bucket)
+                if current is None:
+                    current = k
+                if k > current:
+                    flush(current, lines, seq, t_first, t_last)
+                    lines = [[] for _ in names_index]
+                    seq = bytearray()
+                    t_first = None
+                    current = k
+                t_first = ts if t_first is None else min(t_first, ts)
+                t_last = ts if t_last is None else max(t_last, ts)
+            lines[sensor].append(line)
+            seq.append(sensor)
+        if len(seq) > 0:
+            flush(current if current is not None else 0, lines, seq, t_first, t_last)
+        index.setdefault("t0", 0.0)
+        index["header"] = b"".join(header).decode('utf-8', errors='surrogateescape')
+
+        index_data = json.dumps(index).encode()
+        offset = dst.tell()
+        dst.write(index_data)
+        dst.write(FOOTER.pack(offset, len(index_data), FOOTER_MAGIC))
+    return index
+
+
+class TrialArchive:
+    """Reader of a block-compressed trial archive; only the frames of the requested buckets and sensors are read"""
+
+    def __init__(self, filename, workers=None, cache_size=4):
+        self.filename = filename
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache = {}  # bucket number -> (data, ts, offsets) of the whole bucket in file order
+
+        self.mtime = os.path.getmtime(filename)
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename}: not a trial archive")
+            f.seek(-FOOTER.size, os.SEEK_END)
+            offset, length, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != FOOTER_MAGIC:
+                raise ValueError(f"{filename}: truncated archive")
+            f.seek(offset)
+            self.index = json.loads(f.read(length))
+        if self.index["version"] != ARCHIVE_VERSION:
+            raise ValueError(f"{filename}: unsupported archive version")
+
+        self.codec = self.index["codec"]
+        self.bucket = self.index["bucket"]
+        self.t0 = self.index["t0"]
+        self.buckets = self.index["buckets"]
+        self.header = self.index.get("header", "").encode('utf-8', errors='surrogateescape')
+        self.final_newline = self.index.get("final_newline", True)
+        self._starts = [self.t0 + b["k"] * self.bucket for b in self.buckets]
+
+    def __len__(self):
+        return len(self.header.splitlines()) + sum(b["frames"]["_seq"][2] for b in self.buckets)
+
+    @property
+    def first_ts(self):
+        return next((b["t_first"] for b in self.buckets if b["t_first"] is not None), 0.0)
+
+    @property
+    def last_ts(self):
+        return next((b["t_last"] for b in reversed(self.buckets) if b["t_last"] is not None), 0.0)
+
+    def changed(self):
+        return os.path.getmtime(self.filename) != self.mtime
+
+    def bucket_range(self, ts_start=None, ts_end=None):
+        """Positions (in self.buckets) of the buckets that may hold lines in [ts_start, ts_end]"""
+        i0 = 0 if ts_start is None else max(bisect.bisect_right(self._starts, ts_start) - 1, 0)
+        i1 = len(self.buckets) if ts_end is None else bisect.bisect_right(self._starts, ts_end)
+        return i0, max(i0, i1)
+
+    def read_frames(self, wanted):
+        """Decompress a list of (bucket position, frame name) in parallel; returns {(pos, name): bytes}"""
+        with open(self.filename, 'rb') as f:
+            raw = []
+            for i, name in wanted:
+                offset, length, _ = self.buckets[i]["frames"][name]
+                f.seek(offset)
+                raw.append(f.read(length))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            data = list(pool.map(lambda d: decompress(d, self.codec), raw))
+        return dict(zip(wanted, data))
+
+    def read_lines(self, ts_start=None, ts_end=None, sensors=None):
+        """Lines (str) with ts_start <= app timestamp <= ts_end of the given sensors, in file order"""
+        names = SENSORS + ["other"] if sensors is None else [s for s in sensors if s in SENSORS]
+        wanted_ids = set(SENSORS.index(s) if s in SENSORS else OTHER for s in names)
+        i0, i1 = self.bucket_range(ts_start, ts_end)
+
+        wanted = []
+        for i in range(i0, i1):
+            frames = self.buckets[i]["frames"]
+            present = [s for s in names if s in frames]
+            if len(present) > 0:
+                wanted += [(i, "_seq")] + [(i, s) for s in present]
+        data = self.read_frames(wanted)
+
+        out = []
+        for i in range(i0, i1):
+            if (i, "_seq") not in data:
+                continue
+            sensor_lines = {}
+            for s in names:
+                if (i, s) in data:
+                    sensor_lines[SENSORS.index(s) if s in SENSORS else OTHER] = iter(data[(i, s)].decode('utf-8', errors='replace').splitlines())
+            for sensor in data[(i, "_seq")]:
+                if sensor in wanted_ids:
+                    out.append(next(sensor_lines[sensor]))
+
+        if ts_start is None and ts_end is None:
+            if "other" in names:
+                out = self.header.decode('utf-8', errors='replace').splitlines() + out
+            return out
+        selected = []
+        for line in out:
+            fields = line.split(';', 2)
+            try:
+                ts = float(fields[1])
+            except (IndexError, ValueError):
+                continue
+            if (ts_start is None or ts >= ts_start) and (ts_end is None or ts <= ts_end):
+                selected.append(line)
+        return selected
+
+    def block(self, i):
+        """Bucket i in file order as (bytes, app timestamps, line offsets), with a small LRU cache"""
+        if i in self._cache:
+            block = self._cache.pop(i)
+            self._cache[i] = block
+            return block
+
+        frames = self.buckets[i]["frames"]
+        data = self.read_frames([(i, name) for name in frames])
+        sensor_lines = {}
+        for name in frames:
+            if name != "_seq":
+                sensor_lines[SENSORS.index(name) if name in SENSORS else OTHER] = iter(data[(i, name)].splitlines(keepends=True))
+        lines = [next(sensor_lines[sensor]) for sensor in data[(i, "_seq")]]
+
+        ts = array('d')
+        offsets = array('q', [0])
+        last = float('-inf')
+        for line in lines:
+            sensor, t = line_info(line)
+            if t is not None:
+                last = max(last, t)
+            ts.append(last)
+            offsets.append(offsets[-1] + len(line))
+        block = (b"".join(lines), ts, offsets)
+
+        self._cache[i] = block
+        if len(self._cache) > self.cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        return block
+
+    def slice(self, t0, t1):
+        """Bytes of the lines with t0 < app timestamp <= t1, in file order (as TrialFile.slice of the local server)"""
+        i0, i1 = self.bucket_range(t0, t1)
+        parts = [self.header] if t0 < self.first_ts <= t1 else []
+        for i in range(i0, i1):
+            data, ts, offsets = self.block(i)
+            a = bisect.bisect_right(ts, t0)
+            b = bisect.bisect_right(ts, t1)
+            part = data[offsets[a]:offsets[b]]
+            if not self.final_newline and i == len(self.buckets) - 1 and b == len(ts) and part:
+                part = part[:-1] # the newline added to the last line by convert
+            parts.append(part)
+        return b"".join(parts)
+
+
+def verify(trial_filename, archive_filename):
+    """Whether the archive restores the trial file byte for byte"""
+    with open(trial_filename, 'rb') as f:
+        original = f.read()
+    archive = TrialArchive(archive_filename)
+    return archive.slice(float('-inf'), float('inf')) == original
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4, 5):
+        print("""Convert a trial file to a seekable block-compressed archive.  Usage is
+%s [trial_file] [archive_file] [bucket] [codec]
+
+BUCKET is the time span of a compressed block in seconds (default 10.0),
+CODEC is xz (default) or zstd (needs the zstandard package)""" % sys.argv[0])
+        exit(1)
+
+    trial_filename = sys.argv[1]
+    archive_filename = sys.argv[2]
+    bucket = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    codec = sys.argv[4] if len(sys.argv) > 4 else "xz"
+
+    t = time.time()
+    index = convert(trial_filename, archive_filename, bucket, codec)
+    size = os.path.getsize(trial_filename)
+    archived = os.path.getsize(archive_filename)
+    print(f"{trial_filename}: {size / 1e6:.1f} MB -> {archive_filename}: {archived / 1e6:.1f} MB "
+          f"({100 * archived / size:.1f} %), {len(index['buckets'])} blocks of {bucket} s, {time.time() - t:.1f} s")
+    if not verify(trial_filename, archive_filename):
+        print(f"{archive_filename} does not restore {trial_filename} exactly")
+        exit(1)
+    exit(0)
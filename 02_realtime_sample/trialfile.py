@@ -0,0 +1,65 @@
+import io
+
+import pandas as pd
+
+from xdrclient.sensors import COLUMNS, ID_COLUMNS
+
+
+def group_lines(lines, sensors=None, numbers=None):
+    """
+    Group raw 'SENSOR;...' lines by sensor type, dropping the sensor prefix.
+    If numbers is a dict, the index of every kept line is collected in it, per sensor type.
+    """
+    grouped = {}
+    for i, line in enumerate(lines):
+        sensor_type, sep, rest = line.partition(';')
+        if not sep or not rest or sensor_type not in COLUMNS:
+            continue  # comments, blank lines, empty samples and unknown sensors
+        if sensors is not None and sensor_type not in sensors:
+            continue
+        grouped.setdefault(sensor_type, []).append(rest)
+        if numbers is not None:
+            numbers.setdefault(sensor_type, []).append(i)
+    return grouped
+
+
+def lines_to_dataframe(sensor_type, rows):
+    """Parse the lines of one sensor with the C CSV parser into a typed DataFrame"""
+    columns = COLUMNS[sensor_type]
+    dtype = {i: str for i, c in enumerate(columns) if c in ID_COLUMNS}
+    df = pd.read_csv(io.StringIO("\n".join(rows)), sep=';', header=None,
+                     names=range(len(columns)), usecols=range(len(columns)), dtype=dtype)
+    df.columns = columns
+    for col in columns:
+        if col not in ID_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def read_trial(filename, sensors=None, ts_start=None, ts_end=None, line_numbers=False):
+    """
+    Read a whole trial file into one DataFrame per sensor type.
+    Columns are named as in parse_data; numeric columns are float.
+    With ts_start/ts_end (app timestamp), only the bytes of that time range are read
+    through the timestamp index sidecar (built on first use, see trialindex.py).
+    A .xdra archive (see trialarchive.py) is read block by block, only for the requested
+    time range and sensors.
+    With line_numbers, every DataFrame starts with a 'line' column: the index of the sample
+    among the lines read, so that the order of the file can be restored across sensors.
+    """
+    if filename.endswith(".xdra"):
+        from trialarchive import TrialArchive
+        lines = TrialArchive(filename).read_lines(ts_start, ts_end, sensors)
+    elif ts_start is None and ts_end is None:
+        with open(filename, 'r') as f:
+            lines = f.read().splitlines()
+    else:
+        from trialindex import read_lines
+        lines = read_lines(filename, ts_start, ts_end, sensors)
+    numbers = {} if line_numbers else None
+    grouped = group_lines(lines, sensors, numbers)
+    data = {sensor_type: lines_to_dataframe(sensor_type, rows) for sensor_type, rows in grouped.items()}
+    if line_numbers:
+        for sensor_type, df in data.items():
+            df.insert(0, "line", numbers[sensor_type])
+    return data
@@ -0,0 +1,232 @@
+#! /usr/bin/env -S python3
+
+import os
+import sys
+import mmap
+import time
+
+import numpy as np
+
+from xdrclient.sensors import COLUMNS
+
+
+INDEX_VERSION = 1
+SENSORS = list(COLUMNS)  # counts of other lines (comments, unknown sensors) go to an extra last column
+
+
+def index_filename(trial_filename):
+    """Sidecar next to the trial file: 1.txt -> 1.idx.npz"""
+    return os.path.splitext(trial_filename)[0] + ".idx.npz"
+
+
+def parse_timestamps(field):
+    """Floats from a (n, width) uint8 matrix of NUL-padded ASCII fields; NaN where not a number"""
+    as_bytes = np.ascontiguousarray(field).view(f"S{field.shape[1]}")[:, 0]
+    try:
+        return as_bytes.astype(float)
+    except ValueError:
+        out = np.full(len(as_bytes), np.nan)
+        for i, b in enumerate(as_bytes):
+            try:
+                out[i] = float(b)
+            except ValueError:
+                pass
+        return out
+
+
+def scan_lines(buf, base=0, sepch=b';'):
+    """Start offset, app timestamp and sensor number of every line of a bytes-like block"""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord('\n'))
+    starts = np.concatenate(([0], ends + 1))
+    if len(starts) and starts[-1] >= len(data):
+        starts = starts[:-1]
+    line_ends = np.append(ends, len(data))[:len(starts)]
+
+    # second field (app timestamp) lies between the first and second separators of the line
+    seps = np.append(np.flatnonzero(data == ord(sepch)), [len(data), len(data)])
+    k = np.searchsorted(seps, starts)
+    first = np.minimum(seps[k], line_ends)
+    second = np.minimum(seps[np.minimum(k + 1, len(seps) - 1)], line_ends)
+    valid = (second < line_ends) & (data[np.minimum(starts, len(data) - 1)] != ord('%'))
+
+    width = 24
+    cols = first[:, np.newaxis] + 1 + np.arange(width)
+    field = data[np.minimum(cols, len(data) - 1)].copy()
+    field[(cols >= second[:, np.newaxis]) | ~valid[:, np.newaxis]] = 0
+    ts = parse_timestamps(field)
+    ts[~valid] = np.nan
+
+    # sensor type: the 4 characters before the first separator
+    name = np.zeros((len(starts), 4), dtype=np.uint8)
+    for i in range(4):
+        name[:, i] = np.where(starts + i < first, data[np.minimum(starts + i, len(data) - 1)], 0)
+    names = name.view("S4")[:, 0]
+    sensor = np.full(len(starts), len(SENSORS))
+    for s, sensor_name in enumerate(SENSORS):
+        sensor[names == sensor_name.encode()] = s
+
+    return starts + base, ts, sensor
+
+
+class TrialIndex:
+    """
+    Sidecar index of a trial file: for every time bucket of `bucket` seconds (app timestamp),
+    the byte offset of its first line and the number of lines of each sensor.
+    Lines are assumed in (nearly) increasing app timestamp order, as in the dataset;
+    a late line is counted in the bucket reached by the running maximum.
+    """
+
+    def __init__(self, t0, bucket, offsets, counts, size, mtime):
+        self.t0 = t0
+        self.bucket = bucket
+        self.offsets = offsets  # (n_buckets + 1,) int64, offsets[-1] is the file size
+        self.counts = counts    # (n_buckets, len(SENSORS) + 1) int32
+        self.size = size
+        self.mtime = mtime
+
+    @property
+    def n_buckets(self):
+        return len(self.counts)
+
+    @property
+    def t_end(self):
+        return self.t0 + self.n_buckets * self.bucket
+
+    @classmethod
+    def build(cls, trial_filename, bucket=1.0, chunk_size=1 << 26):
+        """One pass over the file, in chunks of about chunk_size bytes cut at line ends"""
+        size = os.path.getsize(trial_filename)
+        mtime = os.path.getmtime(trial_filename)
+        if size == 0:
+            return cls(0.0, bucket, np.zeros(1, dtype=np.int64), np.zeros((0, len(SENSORS) + 1), dtype=np.int32), 0, mtime)
+
+        starts, stamps, sensors = [], [], []
+        with open(trial_filename, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            pos = 0
+            while pos < size:
+                end = mm.find(b'\n', min(pos + chunk_size, size) - 1)
+                end = size if end < 0 else end + 1
+                s, t, n = scan_lines(mm[pos:end], pos)
+                starts.append(s)
+                stamps.append(t)
+                sensors.append(n)
+                pos = end
+            mm.close()
+        starts = np.concatenate(starts)
+        ts = np.concatenate(stamps)
+        sensor = np.concatenate(sensors)
+
+        # comment lines take the timestamp of the previous line; the index is kept non-decreasing
+        ts = np.fmax.accumulate(ts)
+        first_valid = np.flatnonzero(~np.isnan(ts))
+        t0 = ts[first_valid[0]] if len(first_valid) else 0.0
+        ts[np.isnan(ts)] = t0
+        t0 = np.floor(t0 / bucket) * bucket
+
+        line_bucket = np.floor((ts - t0) / bucket).astype(np.int64)
+        n_buckets = int(line_bucket[-1]) + 1
+        offsets = np.empty(n_buckets + 1, dtype=np.int64)
+        offsets[:-1] = starts[np.searchsorted(line_bucket, np.arange(n_buckets), side="left")]
+        offsets[-1] = size
+        counts = np.bincount(line_bucket * (len(SENSORS) + 1) + sensor,
+                             minlength=n_buckets * (len(SENSORS) + 1)).reshape(n_buckets, -1).astype(np.int32)
+        return cls(float(t0), bucket, offsets, counts, size, mtime)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            np.savez(f, version=INDEX_VERSION, sensors=np.array(SENSORS), t0=self.t0, bucket=self.bucket,
+                     offsets=self.offsets, counts=self.counts, size=self.size, mtime=self.mtime)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as z:
+            if int(z["version"]) != INDEX_VERSION or list(z["sensors"]) != SENSORS:
+                raise ValueError(f"{filename}: incompatible index")
+            return cls(float(z["t0"]), float(z["bucket"]), z["offsets"], z["counts"], int(z["size"]), float(z["mtime"]))
+
+    @classmethod
+    def load_or_build(cls, trial_filename, bucket=1.0):
+        """Load the sidecar if it is up to date with the trial file, otherwise (re)build and save it"""
+        filename = index_filename(trial_filename)
+        if os.path.exists(filename):
+            try:
+                index = cls.load(filename)
+                if (index.size == os.path.getsize(trial_filename) and index.mtime == os.path.getmtime(trial_filename)
+                        and index.bucket == bucket):
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass
+        index = cls.build(trial_filename, bucket)
+        try:
+            index.save(filename)
+        except OSError:
+            pass  # read-only dataset directory: use the index without caching it
+        return index
+
+    def buckets(self, ts_start=None, ts_end=None):
+        """Range of buckets covering [ts_start, ts_end]"""
+        k0 = 0 if ts_start is None else int(np.clip(np.floor((ts_start - self.t0) / self.bucket), 0, self.n_buckets))
+        k1 = self.n_buckets if ts_end is None else int(np.clip(np.floor((ts_end - self.t0) / self.bucket) + 1, 0, self.n_buckets))
+        return k0, max(k0, k1)
+
+    def byte_range(self, ts_start=None, ts_end=None):
+        """Byte offsets (begin, end) of the lines that may fall in [ts_start, ts_end]"""
+        k0, k1 = self.buckets(ts_start, ts_end)
+        return int(self.offsets[k0]), int(self.offsets[k1])
+
+    def count(self, ts_start=None, ts_end=None):
+        """Number of lines per sensor in the buckets covering [ts_start, ts_end]"""
+        k0, k1 = self.buckets(ts_start, ts_end)
+        total = self.counts[k0:k1].sum(axis=0)
+        return dict(zip(SENSORS + ["other"], total.tolist()))
+
+
+def read_lines(trial_filename, ts_start=None, ts_end=None, sensors=None, index=None):
+    """Lines of the trial file with ts_start <= app timestamp <= ts_end, reading only the bytes of their buckets"""
+    index = index if index is not None else TrialIndex.load_or_build(trial_filename)
+    begin, end = index.byte_range(ts_start, ts_end)
+    with open(trial_filename, 'rb') as f:
+        f.seek(begin)
+        lines = f.read(end - begin).decode('utf-8', errors='replace').splitlines()
+
+    selected = []
+    for line in lines:
+        fields = line.split(';', 2)
+        if len(fields) < 3 or (sensors is not None and fields[0] not in sensors):
+            continue
+        try:
+            ts = float(fields[1])
+        except ValueError:
+            continue
+        if (ts_start is None or ts >= ts_start) and (ts_end is None or ts <= ts_end):
+            selected.append(line)
+    return selected
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3):
+        print("""Build the timestamp index sidecar of a trial file.  Usage is
+%s [trial_file] [bucket]
+
+BUCKET is the time resolution of the index in seconds (default 1.0).
+The index is written next to the trial file (e.g. trials/1.txt -> trials/1.idx.npz).""" % sys.argv[0])
+        exit(1)
+
+    trial_filename = sys.argv[1]
+    bucket = float(sys.argv[2]) if len(sys.argv) == 3 else 1.0
+
+    t = time.time()
+    index = TrialIndex.build(trial_filename, bucket)
+    index.save(index_filename(trial_filename))
+    print(f"{trial_filename}: {index.size / 1e6:.1f} MB, {index.t0:.1f} - {index.t_end:.1f} s, "
+          f"{index.n_buckets} buckets of {bucket} s, indexed in {time.time() - t:.2f} s "
+          f"-> {index_filename(trial_filename)} ({os.path.getsize(index_filename(trial_filename)) / 1e3:.0f} kB)")
+    for sensor, n in index.count().items():
+        if n > 0:
+            print(f"    {sensor}: {n}")
+    exit(0)
@@ -0,0 +1,10 @@
+"""
+Client-side helpers shared by the EvAAL API demos in 02_realtime_sample.
+
+Only the standard library and requests are imported here; numpy, pandas, scipy and
+matplotlib are imported by the estimators and dashboards that need them.
+"""
+
+from . import log, memwatch
+from .api import set_trial, set_transport, split_lines, do_req, parse_state, parse_estimate
+from .sensors import COLUMNS, ID_COLUMNS, parse_data, process_data
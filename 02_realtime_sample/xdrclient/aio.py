@@ -0,0 +1,102 @@
+import asyncio
+from urllib.parse import urlsplit
+
+
+class Response:
+    """The parts of requests.Response used by the demos"""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+
+class AsyncClient:
+    """
+    Minimal non-blocking HTTP/1.1 GET client on asyncio streams, one kept-alive connection per client.
+    Handles Content-Length, chunked and close-delimited bodies, and reconnects when the server
+    closes the connection (e.g. the Flask development server). A request is sent again only if
+    the kept-alive connection it was sent on turns out closed before any byte of the reply: once
+    the server has answered, it has handled the request (a /nextdata with a position would be
+    posted twice and the trial advanced by one more chunk).
+    """
+
+    def __init__(self, server, timeout=30.0):
+        url = urlsplit(server)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.base = url.path
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.replied = False # whether any byte of the current reply was read
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                await self.connect()
+            self.replied = False
+            try:
+                return await asyncio.wait_for(self._get(path), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                await self.close()
+                partial = isinstance(e, asyncio.IncompleteReadError) and len(e.partial) > 0
+                # stale kept-alive connection: retry once on a new one
+                if attempt == 1 or not reused or self.replied or partial:
+                    raise
+            except Exception:
+                await self.close() # e.g. a timeout in the middle of the reply
+                raise
+
+    async def _get(self, path):
+        self.writer.write(("GET %s%s HTTP/1.1\r\nHost: %s:%d\r\nConnection: keep-alive\r\n\r\n"
+                           % (self.base, path, self.host, self.port)).encode('ascii'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        self.replied = True
+        status_code = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            content = await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            content = b"".join(chunks)
+        else:
+            content = await self.reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close" or status_line.startswith(b"HTTP/1.0"):
+            await self.close()
+        return Response(status_code, headers, content)
@@ -0,0 +1,79 @@
+import os
+import time
+
+import requests
+
+from . import log
+
+server = "http://127.0.0.1:5000/evaalapi/"
+trialname = "onlinedemo"
+transport = requests.get
+
+
+def set_trial(trial, url):
+    """
+    Select the trial and the EvAAL API server used by do_req.
+    With XDR_RECORD=file set in the environment, the traffic is recorded in that cassette;
+    with XDR_REPLAY=file, it is answered from that cassette instead of the server (see cassette.py).
+    """
+    global trialname, server
+    trialname = trial
+    server = url
+    if os.environ.get("XDR_REPLAY"):
+        from .cassette import Replayer
+        set_transport(Replayer(os.environ["XDR_REPLAY"], server + trialname))
+    elif os.environ.get("XDR_RECORD"):
+        from .cassette import Recorder
+        set_transport(Recorder(os.environ["XDR_RECORD"], server + trialname))
+
+
+def set_transport(t):
+    """Send the requests of do_req through t(url) instead of requests.get"""
+    global transport
+    transport = t
+
+
+def split_lines(r):
+    if False and r.headers['content-type'].startswith("application/x-xz"):
+        import lzma
+        l = lzma.decompress(r.content).decode('ascii').splitlines()
+    else:
+        l = r.text.splitlines()
+    return l
+
+
+def excerpt(l, n=2):
+    """First and last n of the lines l"""
+    if len(l) <= 2*n+1:
+        return '\n'.join(l)
+    return '\n'.join(l[:n]
+                     + ["   ... ___%d lines omitted___ ...   " % len(l)]
+                     + l[-n:])
+
+
+def do_req (req, n=2):
+    t = time.perf_counter()
+    r = transport(server+trialname+req)
+    if log.enabled(log.INFO):
+        ms = "%.1f" % (1000 * (time.perf_counter() - t))
+        if log.enabled(log.DEBUG) or not req.startswith("/nextdata"): # /nextdata bodies only in debug
+            l = split_lines(r)
+            log.info("GET", req=req, status=r.status_code, ms=ms, lines=len(l), body=excerpt(l, n))
+        else:
+            log.info("GET", req=req, status=r.status_code, ms=ms, bytes=len(r.content))
+    return r
+
+
+# evaalapi.py is the server script (it imports Flask), so the formats are only loaded when parsing
+def parse_state(text):
+    """Parse a /state reply with evaalapi.statefmt"""
+    from parse import parse
+    from evaalapi import statefmt
+    return parse(statefmt, text)
+
+
+def parse_estimate(line):
+    """Parse one line of an /estimates reply with evaalapi.estfmt"""
+    from parse import parse
+    from evaalapi import estfmt
+    return parse(estfmt, line)
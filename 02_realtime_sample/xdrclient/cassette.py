@@ -0,0 +1,110 @@
+"""
+Record and replay the traffic of do_req.
+
+A cassette is an append-only binary log: MAGIC, then one record per request,
+    RECORD header (start time relative to the first request, duration, status code,
+                   lengths of the request, content type and body)
+    request path (e.g. /nextdata?position=1.000,2.000,0.000), content type, body
+Every record is flushed when written, so a crashed run keeps everything up to its last request.
+"""
+
+import time
+import struct
+
+from .aio import Response
+
+MAGIC = b"XDRC\x01\n"
+RECORD = struct.Struct("<ddHHHI")
+
+
+class Record:
+    __slots__ = ("start", "duration", "status_code", "req", "content_type", "content")
+
+    def __init__(self, start, duration, status_code, req, content_type, content):
+        self.start = start
+        self.duration = duration
+        self.status_code = status_code
+        self.req = req
+        self.content_type = content_type
+        self.content = content
+
+    def response(self):
+        return Response(self.status_code, {"content-type": self.content_type}, self.content)
+
+
+def read_cassette(filename):
+    """Records of a cassette, in request order; a record cut short by a crash is ignored"""
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename}: not a cassette")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            start, duration, status_code, n_req, n_type, n_content = RECORD.unpack(header)
+            data = f.read(n_req + n_type + n_content)
+            if len(data) < n_req + n_type + n_content:
+                return
+            yield Record(start, duration, status_code, data[:n_req].decode('utf-8'),
+                         data[n_req:n_req + n_type].decode('latin-1'), data[n_req + n_type:])
+
+
+class Recorder:
+    """
+    Transport for do_req: sends the request with `transport` and appends it to the cassette.
+    A cassette holds one session, as the Replayer answers it from its first record: an existing
+    file is overwritten.
+    """
+
+    def __init__(self, filename, prefix, transport=None):
+        if transport is None:
+            import requests
+            transport = requests.get
+        self.prefix = prefix  # server + trialname, not stored
+        self.transport = transport
+        self.f = open(filename, 'wb')
+        self.f.write(MAGIC)
+        self.f.flush()
+        self.t0 = None
+
+    def __call__(self, url):
+        t = time.time()
+        if self.t0 is None:
+            self.t0 = t
+        r = self.transport(url)
+        duration = time.time() - t
+
+        req = (url[len(self.prefix):] if url.startswith(self.prefix) else url).encode('utf-8')
+        content_type = r.headers.get('content-type', '').encode('latin-1')
+        self.f.write(RECORD.pack(t - self.t0, duration, r.status_code, len(req), len(content_type), len(r.content)))
+        self.f.write(req)
+        self.f.write(content_type)
+        self.f.write(r.content)
+        self.f.flush()
+        return r
+
+    def close(self):
+        self.f.close()
+
+
+class Replayer:
+    """
+    Transport for do_req answering from a cassette, in order and without waiting.
+    Requests are expected to follow the recorded ones; the position sent with /nextdata
+    may differ (it is what a regression run checks), any other difference raises ValueError.
+    """
+
+    def __init__(self, filename, prefix):
+        self.prefix = prefix
+        self.records = list(read_cassette(filename))
+        self.pos = 0
+
+    def __call__(self, url):
+        if self.pos >= len(self.records):
+            raise ValueError("replay went past the end of the cassette")
+        record = self.records[self.pos]
+        req = url[len(self.prefix):] if url.startswith(self.prefix) else url
+        if req.split('?')[0] != record.req.split('?')[0]:
+            raise ValueError(f"request {self.pos}: {req} does not follow the recording ({record.req})")
+        self.pos += 1
+        return record.response()
@@ -0,0 +1,26 @@
+"""
+The demo localizer as a module, for the tools that replay trials through it.
+
+The 06demo script is loaded from its file next to this package, whatever the working directory,
+once per process. Unless XDR_LOG says otherwise, logging is then set to warnings only: the
+localizer and do_req log at every step, while warnings (e.g. memwatch growth) are still shown.
+"""
+
+import os
+import importlib.util
+
+from . import log
+
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_modules = {}
+
+
+def load_demo(filename="06demo_location_estimate_pdr.py"):
+    """The module of a demo script of 02_realtime_sample (DemoLocalizer, SimplePDR, ...)"""
+    if filename not in _modules:
+        log.configure(os.environ.get("XDR_LOG", "warning"))
+        spec = importlib.util.spec_from_file_location("demo_pdr", os.path.join(here, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[filename] = module
+    return _modules[filename]
@@ -0,0 +1,103 @@
+"""
+Download and export of /estimates and /log.
+
+Replies are streamed to disk as received, then the estimates are parsed in one pass by the
+C CSV parser into float columns; the CSV export is cut from the received bytes with numpy
+instead of reformatting every number.
+"""
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import requests
+
+from . import api, log
+from .api import excerpt
+
+# one /estimates line is estfmt "{pts},{c},{h},{s},{pos}", with pos = x,y,yaw for the demos
+ESTIMATE_COLUMNS = ["pts", "c", "h", "s", "x", "y", "yaw"]
+
+
+def download(req, filename, chunk_size=1 << 16):
+    """Write the reply of req to filename as it arrives; returns the status code"""
+    url = api.server + api.trialname + req
+    with open(filename, 'wb') as f:
+        if api.transport is not requests.get:
+            # recorded or replayed session (see cassette.py): the transport holds the whole reply
+            r = api.transport(url)
+            f.write(r.content)
+        else:
+            with requests.get(url, stream=True) as r:
+                for chunk in r.iter_content(chunk_size):
+                    f.write(chunk)
+    log.info("GET", req=req, status=r.status_code, bytes=os.path.getsize(filename), file=filename)
+    return r.status_code
+
+
+def estimate_lines(raw, skip=2):
+    """Bytes of the estimate lines, without the header and the given origin, ending with a newline"""
+    start = 0
+    for _ in range(skip):
+        start = raw.find(b'\n', start) + 1
+        if start == 0:
+            return b""
+    body = raw[start:]
+    return body if body.endswith(b'\n') or len(body) == 0 else body + b'\n'
+
+
+def parse_estimates(body):
+    """Float columns (ESTIMATE_COLUMNS) of the estimate lines"""
+    if len(body.strip()) == 0:
+        return pd.DataFrame({c: np.empty(0) for c in ESTIMATE_COLUMNS})
+    return pd.read_csv(io.BytesIO(body), header=None, names=ESTIMATE_COLUMNS, dtype=float, engine='c')
+
+
+def estimates_csv(body):
+    """
+    timestamp,x,y,yaw CSV of the estimate lines, keeping the numbers as the server wrote them:
+    the bytes from the first to the fourth comma (c, h, s) of every line are dropped in one pass.
+    None if a line does not have the expected 6 commas.
+    """
+    data = np.frombuffer(body, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord('\n'))
+    commas = np.flatnonzero(data == ord(','))
+    if len(commas) != 6 * len(newlines) or np.any(np.searchsorted(newlines, commas) != np.repeat(np.arange(len(newlines)), 6)):
+        return None
+    commas = commas.reshape(-1, 6)
+    delta = np.zeros(len(data), dtype=np.int8)
+    delta[commas[:, 0]] = 1
+    delta[commas[:, 3]] = -1
+    keep = np.cumsum(delta, dtype=np.int8) == 0
+    return b"timestamp,x,y,yaw\n" + data[keep].tobytes()
+
+
+def export_estimates(output_csv, req="/estimates"):
+    """
+    Download the estimates next to output_csv (.estimates.txt), write the timestamp,x,y,yaw CSV
+    and a binary columnar copy of all the columns (.npz); returns the float DataFrame
+    """
+    base = os.path.splitext(output_csv)[0]
+    raw_filename = base + ".estimates.txt"
+    download(req, raw_filename)
+    with open(raw_filename, 'rb') as f:
+        body = estimate_lines(f.read())
+
+    df = parse_estimates(body)
+    csv = estimates_csv(body)
+    if csv is not None:
+        with open(output_csv, 'wb') as f:
+            f.write(csv)
+    else:
+        df.rename(columns={"pts": "timestamp"})[["timestamp", "x", "y", "yaw"]].to_csv(output_csv, index=False)
+    np.savez(base + ".npz", **{c: df[c].to_numpy() for c in ESTIMATE_COLUMNS})
+    return df
+
+
+def save_log(filename, n=12):
+    """Download /log to filename and log its first and last n lines"""
+    download("/log", filename)
+    with open(filename, 'r', errors='replace') as f:
+        lines = f.read().splitlines()
+    log.info("log", lines=len(lines), text=excerpt(lines, n))
@@ -0,0 +1,164 @@
+"""
+Leveled, structured logging for the demos, written by a background thread.
+
+    log.info("request", req="/state", status=200)
+    -> 12:30:01.250 INFO request req=/state status=200
+
+A call only checks the level and the sampling counter and puts a tuple on a queue;
+formatting and writing happen in the writer thread, which writes in batches.
+The level, format and sampling come from the environment unless configure() is called:
+    XDR_LOG=debug|info|warning|quiet     (default info; quiet writes nothing)
+    XDR_LOG_FORMAT=text|json             (json: one object per line)
+    XDR_LOG_SAMPLE=step=10,tag=100       (keep one message in N of these events)
+Build expensive fields only when they will be written: `if log.enabled(log.DEBUG): ...`.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+
+DEBUG, INFO, WARNING, ERROR, QUIET = 10, 20, 30, 40, 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "quiet": QUIET}
+NAMES = {v: k.upper() for k, v in LEVELS.items()}
+
+_level = INFO
+_sample = {}   # event -> keep one in N
+_counts = {}   # event -> messages seen
+_writer = None
+
+
+class Writer(threading.Thread):
+    """Formats queued messages and writes them to the stream in batches"""
+
+    def __init__(self, stream, fmt):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.fmt = fmt
+        self.queue = queue.SimpleQueue()
+
+    def format(self, t, level, event, fields):
+        if self.fmt == "json":
+            return json.dumps({"t": round(t, 3), "level": NAMES[level], "event": event, **fields}, default=str) + "\n"
+        head = time.strftime("%H:%M:%S", time.localtime(t)) + ".%03d %s %s" % (int(t * 1000) % 1000, NAMES[level], event)
+        inline, blocks = [], []
+        for k, v in fields.items():
+            if isinstance(v, (tuple, list)):
+                v = ",".join("%.6g" % x if isinstance(x, float) else str(x) for x in v)
+            v = str(v).rstrip("\n")
+            if "\n" in v:
+                blocks.append("    " + v.replace("\n", "\n    "))  # multi-line values go below
+            else:
+                inline.append(f"{k}={v}")
+        return " ".join([head] + inline) + "\n" + "".join(b + "\n" for b in blocks)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.stream.write("".join(self.format(*m) for m in batch if not isinstance(m, threading.Event)))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # closed output (e.g. piped to head): keep serving flush()
+            for m in batch:
+                if isinstance(m, threading.Event):
+                    m.set()  # flush() is waiting for the messages queued before it
+
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+
+def sampling_from_env():
+    sample = {}
+    for item in os.environ.get("XDR_LOG_SAMPLE", "").split(","):
+        if "=" in item:
+            event, n = item.split("=")
+            sample[event.strip()] = int(n)
+    return sample
+
+
+def level_from_name(name):
+    """Level of a name of LEVELS, INFO if the name is unknown"""
+    return LEVELS.get(name.lower(), INFO)
+
+
+def configure(level=None, stream=None, fmt=None, sample=None):
+    """Set the level (name or number), the output stream, the format and the sampling {event: N}"""
+    global _level, _sample
+    if level is None:
+        level = os.environ.get("XDR_LOG", "info")
+    _level = level_from_name(level) if isinstance(level, str) else level
+    _sample = sampling_from_env() if sample is None else sample
+    _counts.clear()
+    start_writer(stream, fmt)
+
+
+def start_writer(stream=None, fmt=None):
+    """Start the writer thread, or change the stream and format of the running one"""
+    global _writer
+    stream = stream if stream is not None else sys.stdout
+    fmt = fmt or os.environ.get("XDR_LOG_FORMAT", "text")
+    if _writer is None:
+        _writer = Writer(stream, fmt)
+        _writer.start()
+    else:
+        _writer.flush()  # earlier messages keep their destination
+        _writer.stream, _writer.fmt = stream, fmt
+
+
+def enabled(level):
+    return level >= _level
+
+
+def log(level, event, **fields):
+    if level < _level:
+        return
+    if event in _sample:
+        n = _counts.get(event, 0)
+        _counts[event] = n + 1
+        if n % _sample[event]:
+            return
+    if _writer is None:
+        start_writer()
+    _writer.queue.put((time.time(), level, event, fields))
+
+
+def debug(event, **fields):
+    if DEBUG >= _level:
+        log(DEBUG, event, **fields)
+
+
+def info(event, **fields):
+    if INFO >= _level:
+        log(INFO, event, **fields)
+
+
+def warning(event, **fields):
+    if WARNING >= _level:
+        log(WARNING, event, **fields)
+
+
+def error(event, **fields):
+    if ERROR >= _level:
+        log(ERROR, event, **fields)
+
+
+def flush():
+    """Wait until every queued message is written (also done at exit)"""
+    if _writer is not None:
+        _writer.flush()
+
+
+_level = level_from_name(os.environ.get("XDR_LOG", "info"))
+_sample = sampling_from_env()
+atexit.register(flush)
@@ -0,0 +1,196 @@
+"""
+Opt-in memory growth instrumentation of the demo loop, based on tracemalloc.
+
+    XDR_MEMWATCH=20 python 06demo_location_estimate_pdr.py ...
+    XDR_MEMWATCH=20 XDR_MEMWATCH_REPORT=memory.txt python 04demo_data_realtime_plot.py ...
+
+Every step (process_data call), the memory traced during the sensor callbacks and during the
+estimation is added to its stage (net: allocated minus freed), and the memory traced between
+steps (requests, replies, the demo loop) to the 'other' stage. Every N steps a sample is
+taken: the traced total, the stage totals and the deep size of every attribute of the localizer
+(lists of samples, position_history, dashboard buffers, timelines...). At exit, a report lists
+each series with its growth per 1000 steps and flags the ones that grow steadily (least squares
+fit), with the source lines whose memory grew the most between the first and last samples.
+tracemalloc slows down allocations: the instrumentation is off unless XDR_MEMWATCH is set.
+"""
+
+import os
+import sys
+import atexit
+import tracemalloc
+import statistics
+from collections import deque
+
+from . import log
+
+# a series grows if its fit explains most of its variation and it gained this much
+MIN_R2 = 0.8
+MIN_GROWTH = 64 * 1024
+STEPS_PER_HOUR = 7200 # 0.5 s per /nextdata
+
+current = None # the MemoryWatch of this process, if enabled
+
+
+def deep_size(obj, seen, depth=0, max_depth=8, sample=64):
+    """
+    Approximate bytes held by obj and what it references (each object counted once in `seen`).
+    Containers longer than `sample` are extrapolated from `sample` evenly spaced elements;
+    numpy arrays and pandas objects report their buffers.
+    """
+    if id(obj) in seen or depth > max_depth:
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, "memory_usage") and hasattr(obj, "index"): # pandas
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if hasattr(obj, "nbytes") and hasattr(obj, "dtype"): # numpy, views do not own their buffer
+        return sys.getsizeof(obj) + (obj.nbytes if getattr(obj, "base", None) is None else 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        parts = [k for kv in items[::max(len(items) // sample, 1)] for k in kv]
+        n = len(items) * 2
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        parts = obj if isinstance(obj, (list, tuple)) else list(obj)
+        n = len(parts)
+        parts = [parts[i] for i in range(0, n, max(n // sample, 1))]
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return size + deep_size(vars(obj), seen, depth + 1, max_depth, sample)
+    else:
+        return size
+    if n == 0:
+        return size
+    sizes = [deep_size(p, seen, depth + 1, max_depth, sample) for p in parts]
+    return size + int(sum(sizes) * n / len(sizes))
+
+
+def trend(steps, values):
+    """(slope in bytes per step, r²) of the least squares fit, None with fewer than 4 samples"""
+    if len(values) < 4:
+        return None
+    try:
+        slope, _ = statistics.linear_regression(steps, values)
+        r = statistics.correlation(steps, values)
+    except statistics.StatisticsError:
+        return 0.0, 0.0 # constant series
+    return slope, r * r
+
+
+def growing(steps, values):
+    fit = trend(steps, values)
+    return fit is not None and fit[0] > 0 and fit[1] >= MIN_R2 and values[-1] - values[0] >= MIN_GROWTH
+
+
+class MemoryWatch:
+    """tracemalloc samples of the demo loop, per stage and per attribute of the watched objects"""
+
+    def __init__(self, every=20, report_filename=None, frames=1, top=10):
+        self.every = max(int(every), 1)
+        self.report_filename = report_filename
+        self.top = top
+        self.objects = {}
+        self.stages = {}
+        self.steps = 0
+        self.samples = [] # (step, traced bytes, {series: bytes})
+        self.warned = set()
+        self.first_snapshot = None
+        self.last_end = None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def watch(self, name, obj):
+        """Measure the attributes of obj at every sample, as name.attribute"""
+        self.objects[name] = obj
+
+    def begin(self):
+        now = tracemalloc.get_traced_memory()[0]
+        if self.last_end is not None:
+            self.stages["other"] = self.stages.get("other", 0) + now - self.last_end
+        return now
+
+    def end(self, stage, start):
+        """Add the memory traced since begin() to the stage; returns the start of the next stage"""
+        now = tracemalloc.get_traced_memory()[0]
+        self.stages[stage] = self.stages.get(stage, 0) + now - start
+        self.last_end = now
+        return now
+
+    def step(self, localizer=None):
+        if localizer is not None and "localizer" not in self.objects:
+            self.watch("localizer", localizer)
+        self.steps += 1
+        if self.steps == 1 or self.steps % self.every == 0:
+            self.sample()
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def sample(self):
+        traced = tracemalloc.get_traced_memory()[0]
+        series = {"stage." + stage: size for stage, size in self.stages.items()}
+        seen = set()
+        for name, obj in self.objects.items():
+            for attr, value in vars(obj).items():
+                series[f"{name}.{attr}"] = deep_size(value, seen)
+        self.samples.append((self.steps, traced, series))
+        if self.first_snapshot is None:
+            self.first_snapshot = self.snapshot() # kept snapshots are traced too: only the first one
+        self.last_end = tracemalloc.get_traced_memory()[0] # the samples are not part of any stage
+
+        largest = max(series.items(), key=lambda kv: kv[1], default=("-", 0))
+        log.info("memory", step=self.steps, traced_kb=traced // 1024, largest=largest[0], largest_kb=largest[1] // 1024)
+        for name, steps, values in self.series():
+            if name not in self.warned and len(values) >= 8 and growing(steps, values):
+                self.warned.add(name)
+                log.warning("memory growth", series=name, kb_per_1000_steps=round(1000 * trend(steps, values)[0] / 1024, 1))
+
+    def series(self):
+        """(name, steps, bytes) of the traced total and every stage and attribute"""
+        steps = [s[0] for s in self.samples]
+        yield "traced", steps, [s[1] for s in self.samples]
+        for name in sorted(set(k for s in self.samples for k in s[2])):
+            points = [(s[0], s[2][name]) for s in self.samples if name in s[2]]
+            yield name, [p[0] for p in points], [p[1] for p in points]
+
+    def report(self):
+        lines = [f"memory report: {self.steps} steps, {len(self.samples)} samples (every {self.every} steps)", "",
+                 f"{'series':<32} {'first KB':>10} {'last KB':>10} {'KB/1000 steps':>14} {'r2':>5} {'1 h KB':>10}  trend"]
+        for name, steps, values in self.series():
+            fit = trend(steps, values)
+            if fit is None:
+                lines.append(f"{name:<32} {values[0] / 1024:10.1f} {values[-1] / 1024:10.1f}")
+                continue
+            slope, r2 = fit
+            hour = values[-1] + slope * (STEPS_PER_HOUR - steps[-1])
+            verdict = "GROWS" if growing(steps, values) else "bounded"
+            lines.append(f"{name:<32} {values[0] / 1024:10.1f} {values[-1] / 1024:10.1f} {1000 * slope / 1024:14.1f} {r2:5.2f} {hour / 1024:10.0f}  {verdict}")
+        lines.append(f"\n(1 h: extrapolated to {STEPS_PER_HOUR} steps of 0.5 s; stages are net bytes allocated and kept)")
+        if self.first_snapshot is not None and len(self.samples) > 1:
+            diff = [d for d in self.snapshot().compare_to(self.first_snapshot, "lineno") if d.size_diff > 0]
+            lines.append(f"\nsource lines with the largest growth between steps {self.samples[0][0]} and {self.steps}:")
+            for d in diff[:self.top]:
+                frame = d.traceback[0]
+                lines.append(f"{d.size_diff / 1024:10.1f} KB {d.count_diff:+8d} blocks  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
+
+    def finish(self):
+        """Take a last sample and write the report (to the report file, or stderr)"""
+        if self.steps == 0:
+            return
+        if self.samples[-1][0] != self.steps:
+            self.sample()
+        text = self.report()
+        if self.report_filename:
+            with open(self.report_filename, 'w') as f:
+                f.write(text)
+            log.info("memory report", file=self.report_filename)
+        else:
+            sys.stderr.write(text)
+
+
+if os.environ.get("XDR_MEMWATCH"):
+    current = MemoryWatch(int(os.environ["XDR_MEMWATCH"]), os.environ.get("XDR_MEMWATCH_REPORT"))
+    atexit.register(current.finish)
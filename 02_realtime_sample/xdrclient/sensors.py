@@ -0,0 +1,67 @@
+from . import memwatch
+from .api import split_lines
+
+
+# Column names for each sensor type
+COLUMNS = {
+    'ACCE': ['app_timestamp', 'sensor_timestamp', 'acc_x', 'acc_y', 'acc_z', 'accuracy'],
+    'GYRO': ['app_timestamp', 'sensor_timestamp', 'gyr_x', 'gyr_y', 'gyr_z', 'accuracy'],
+    'MAGN': ['app_timestamp', 'sensor_timestamp', 'mag_x', 'mag_y', 'mag_z', 'accuracy'],
+    'AHRS': ['app_timestamp', 'sensor_timestamp', 'pitch_x', 'roll_y', 'yaw_z', 'quat_2', 'quat_3', 'quat_4', 'quat_w', 'accuracy'],
+    'UWBP': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'direction_vec_x', 'direction_vec_y', 'direction_vec_z'],
+    'UWBT': ['app_timestamp', 'sensor_timestamp', 'tag_id', 'distance', 'aoa_azimuth', 'aoa_elevation', 'nlos'],
+    'GPOS': ['app_timestamp', 'sensor_timestamp', 'object_id', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w'],
+    'VISO': ['app_timestamp', 'sensor_timestamp', 'location_x', 'location_y', 'location_z', 'quat_x', 'quat_y', 'quat_z', 'quat_w']
+}
+
+ID_COLUMNS = ['tag_id', 'object_id']
+
+
+def parse_data(sensor_type, data_row):
+    if sensor_type not in COLUMNS: 
+        return None
+    
+    row_dict = {}
+    for i, col_name in enumerate(COLUMNS[sensor_type]):
+        if i < len(data_row):  # Ensure we don't go out of bounds
+            # Convert numeric values to float, except for specific ID fields
+            if col_name not in ID_COLUMNS:
+                try:
+                    row_dict[col_name] = float(data_row[i])
+                except (ValueError, TypeError):
+                    row_dict[col_name] = data_row[i]
+            else:
+                row_dict[col_name] = data_row[i]
+    return row_dict
+
+
+def process_data(localizer, recv_data):
+    watch = memwatch.current # memory instrumentation, see memwatch.py
+    m = watch.begin() if watch is not None else 0
+    recv_sensor_lines = split_lines(recv_data)
+
+    for line in recv_sensor_lines:
+        # Skip empty lines
+        if not line.strip():
+            continue
+        
+        # Split the line by semicolon
+        parts = line.strip().split(';')
+        
+        # Get sensor type (first part of the line)
+        sensor_type = parts[0]
+        data_row = parts[1:]
+    
+        row_dict = parse_data(sensor_type, data_row)
+        if row_dict is not None:
+            localizer.callback(sensor_type, row_dict)
+    
+    if watch is not None:
+        del recv_sensor_lines # so that the stage only keeps what the callbacks stored
+        m = watch.end("callbacks", m)
+    est = localizer.estimate_location()
+    if watch is not None:
+        watch.end("estimate", m)
+        watch.step(localizer)
+    
+    return est 
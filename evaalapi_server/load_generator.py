@@ -0,0 +1,160 @@
+#! /usr/bin/env -S python3
+
+"""
+Load generator for an EvAAL API server (evaalapi.py or local_server.py), standard library only.
+
+Every simulated competitor runs in its own thread with its own kept-alive connection and
+goes through trials as the demos do: /reload, /state, then /nextdata with a position until
+405, waiting a random think time (its estimation) after each reply and 0.05 s after a 423,
+then /estimates, and starts again until the end of the run.
+Each competitor needs its own trial, as on the real server (e.g. trial001 to trial050 in
+evaalapi.yaml, all with the same datafile); competitors sharing a trial disturb each other.
+"""
+
+import sys
+import time
+import random
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+
+class Stats:
+    """Latencies and status codes per request type, shared by all competitors"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}   # request type -> [seconds]
+        self.status = {}    # (request type, status code) -> count
+        self.errors = 0
+        self.nbytes = 0
+        self.trials = 0
+
+    def add(self, cmd, status, latency, nbytes):
+        with self.lock:
+            self.latency.setdefault(cmd, []).append(latency)
+            self.status[(cmd, status)] = self.status.get((cmd, status), 0) + 1
+            self.nbytes += nbytes
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)] if values else float('nan')
+
+
+class Competitor(threading.Thread):
+
+    def __init__(self, server, trialname, stats, deadline, think, seed):
+        super().__init__(daemon=True)
+        url = urlsplit(server)
+        self.host, self.port, self.base = url.hostname, url.port or 80, url.path.rstrip('/') + '/' + trialname
+        self.stats = stats
+        self.deadline = deadline
+        self.think = think
+        self.rng = random.Random(seed)
+        self.conn = None
+
+    def get(self, req):
+        cmd = req.split('?')[0].strip('/')
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            t = time.perf_counter()
+            try:
+                self.conn.request("GET", self.base + req)
+                r = self.conn.getresponse()
+                body = r.read()
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None  # stale kept-alive connection: retry once
+                if attempt == 1:
+                    with self.stats.lock:
+                        self.stats.errors += 1
+                    return None, b""
+                continue
+            self.stats.add(cmd, r.status, time.perf_counter() - t, len(body))
+            if r.getheader("connection", "").lower() == "close":
+                self.conn.close()
+                self.conn = None
+            return r.status, body
+
+    def wait(self):
+        # estimation time of one step: lognormal with mean `think` seconds (exp(-0.5**2 / 2) = 0.88)
+        if self.think > 0:
+            time.sleep(min(self.rng.lognormvariate(0, 0.5) * self.think * 0.88, 10 * self.think))
+
+    def run(self):
+        time.sleep(self.rng.uniform(0, 1))  # competitors do not all start at once
+        while time.time() < self.deadline:
+            self.get("/reload")
+            self.get("/state")
+            req = "/nextdata?horizon=0.5"
+            while time.time() < self.deadline:
+                status, body = self.get(req)
+                if status == 423:
+                    time.sleep(0.05)
+                    continue
+                if status != 200:
+                    break
+                self.wait()
+                req = "/nextdata?position=%.3f,%.3f,%.3f" % (self.rng.uniform(0, 40), self.rng.uniform(0, 20), 0.0)
+            else:
+                break
+            self.get("/estimates")
+            with self.stats.lock:
+                self.stats.trials += 1
+        if self.conn is not None:
+            self.conn.close()
+
+
+def report(stats, n_clients, wall):
+    total = sum(len(v) for v in stats.latency.values())
+    print(f"\n{n_clients} competitors, {wall:.1f} s, {total} requests ({total / wall:.1f} req/s, "
+          f"{stats.nbytes / wall / 1e6:.2f} MB/s), {stats.trials} trials completed, {stats.errors} connection errors")
+    print("request      count   p50 ms   p90 ms   p99 ms   max ms  status codes")
+    for cmd in sorted(stats.latency):
+        v = stats.latency[cmd]
+        codes = ", ".join(f"{code}: {n}" for (c, code), n in sorted(stats.status.items()) if c == cmd)
+        print(f"{cmd:<10} {len(v):7d} {1000 * percentile(v, 50):8.1f} {1000 * percentile(v, 90):8.1f} "
+              f"{1000 * percentile(v, 99):8.1f} {1000 * max(v):8.1f}  {codes}")
+    nextdata = sum(n for (c, _), n in stats.status.items() if c == "nextdata")
+    if nextdata:
+        print(f"423 rate: {100 * stats.status.get(('nextdata', 423), 0) / nextdata:.1f} % of /nextdata")
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4, 5, 6):
+        print("""Simulate many competitors using an EvAAL API server.  Usage is
+%s [server] [trials] [clients] [duration] [think]
+
+TRIALS is a comma separated list of trial names, given to the CLIENTS competitors in turn
+(default: one competitor per trial). DURATION is the length of the run in seconds (default 60),
+THINK the mean estimation time of a competitor after each /nextdata in seconds (default 0.1)""" % sys.argv[0])
+        exit(1)
+
+    server = sys.argv[1]
+    trials = sys.argv[2].split(",")
+    n_clients = int(sys.argv[3]) if len(sys.argv) > 3 else len(trials)
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 60.0
+    think = float(sys.argv[5]) if len(sys.argv) > 5 else 0.1
+    if n_clients > len(trials):
+        print(f"warning: {n_clients} competitors share {len(trials)} trials", file=sys.stderr)
+
+    stats = Stats()
+    t = time.time()
+    competitors = [Competitor(server, trials[i % len(trials)], stats, t + duration, think, i) for i in range(n_clients)]
+    for c in competitors:
+        c.start()
+    shown = t
+    while any(c.is_alive() for c in competitors):
+        time.sleep(0.5)
+        if time.time() - shown >= 10:
+            shown = time.time()
+            with stats.lock:
+                n = sum(len(v) for v in stats.latency.values())
+            print(f"{shown - t:6.0f} s: {n} requests", file=sys.stderr)
+    report(stats, n_clients, time.time() - t)
+    exit(0)
@@ -0,0 +1,296 @@
+#! /usr/bin/env -S python3
+
+"""
+Lightweight local stand-in for the EvAAL API server (standard library only).
+
+Every trial file is memory-mapped and indexed once (app timestamp -> byte offset of its line),
+so /nextdata answers with a slice of the mapped file found by two binary searches, without
+copying or re-parsing the data. Trials are read from evaalapi.yaml like the real server;
+a datafile ending in .xdra is read from a block-compressed archive instead.
+
+Supported requests, under /evaalapi/<trial>/:
+    /reload                 restart the trial (and re-index the file if it changed)
+    /state                  trialts,rem,V,S,p,h,pts,pos
+    /nextdata?horizon=h&position=x,y,z
+                            store the estimate, return the next h seconds (default 0.5) of data;
+                            405 after the end of the data, 423 if ahead of the trial clock
+    /estimates              pts,c,h,s,pos lines (first one is the initial position)
+    /log                    one line per request
+
+With SPEED > 0 the trial clock runs at SPEED x real time from the first /nextdata, and
+requests ahead of it are answered with 423 as in an online trial. The default 0 serves as
+fast as the client asks, so load tests measure the client rather than the server.
+"""
+
+import os
+import sys
+import mmap
+import time
+import bisect
+import threading
+from array import array
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+statefmt = "{trialts:.3f},{rem:.3f},{V:.3f},{S:.3f},{p:.3f},{h:.3f},{pts:.3f},{pos}"
+estfmt = "{pts:.3f},{c:.3f},{h:.3f},{s:.3f},{pos}"
+
+# trialarchive.py, for .xdra datafiles
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_realtime_sample"))
+
+
+def load_config(filename):
+    """Read the two-level `trial:\\n    key: value` layout of evaalapi.yaml without PyYAML"""
+    config = {}
+    trial = None
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].rstrip()
+            if not line.strip():
+                continue
+            key, _, value = line.strip().partition(':')
+            value = value.strip().strip("'\"")
+            if not line[0].isspace():
+                trial = key
+                config[trial] = {}
+            elif trial is not None:
+                config[trial][key] = value
+    return config
+
+
+class TrialFile:
+    """A memory-mapped trial file with a sorted app timestamp -> line offset index"""
+
+    def __init__(self, filename, sepch=';', commsep='%'):
+        self.filename = filename
+        self.sepch = sepch.encode()
+        self.commsep = commsep.encode()
+        self.mtime = os.path.getmtime(filename)
+
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(filename) > 0 else b""
+        self.data = memoryview(self.mm)
+
+        # ts[i] is the timestamp of the line starting at offsets[i]; offsets has one extra entry (end of file).
+        # Comment and unparsable lines take the timestamp of the previous line, and the index is
+        # made non-decreasing so that every request is a single contiguous slice.
+        self.ts = array('d')
+        self.offsets = array('q')
+        last = float('-inf')
+        pos = 0
+        size = len(self.mm)
+        while pos < size:
+            end = self.mm.find(b'\n', pos)
+            end = size if end < 0 else end + 1
+            line = self.mm[pos:end]
+            if not line.startswith(self.commsep):
+                fields = line.split(self.sepch, 2)
+                try:
+                    last = max(last, float(fields[1]))
+                except (IndexError, ValueError):
+                    pass
+            self.ts.append(last)
+            self.offsets.append(pos)
+            pos = end
+        self.offsets.append(size)
+        # leading comment lines go with the first data line
+        first = next((t for t in self.ts if t != float('-inf')), 0.0)
+        for i in range(len(self.ts)):
+            if self.ts[i] != float('-inf'):
+                break
+            self.ts[i] = first
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def first_ts(self):
+        return self.ts[0] if len(self.ts) else 0.0
+
+    @property
+    def last_ts(self):
+        return self.ts[-1] if len(self.ts) else 0.0
+
+    def changed(self):
+        return os.path.getmtime(self.filename) != self.mtime
+
+    def slice(self, t0, t1):
+        """Lines with t0 < timestamp <= t1, as a view on the mapped file"""
+        i = bisect.bisect_right(self.ts, t0)
+        j = bisect.bisect_right(self.ts, t1)
+        return self.data[self.offsets[i]:self.offsets[j]]
+
+
+def open_trial_file(filename, sepch=';', commsep='%'):
+    """Trial text file, or block-compressed archive (.xdra, see 02_realtime_sample/trialarchive.py)"""
+    if filename.endswith(".xdra"):
+        if (sepch, commsep) != (';', '%'):
+            raise ValueError(f"{filename}: archives are only written with sepch ';' and commsep '%'")
+        # only the blocks of the requested time range are decompressed, a few are kept in memory
+        from trialarchive import TrialArchive
+        return TrialArchive(filename)
+    return TrialFile(filename, sepch, commsep)
+
+
+class Trial:
+    """State of one trial, as kept by the EvAAL API server"""
+
+    def __init__(self, name, params, trials_dir, speed=0.0):
+        self.name = name
+        self.params = params
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.file = open_trial_file(os.path.join(trials_dir, params['datafile']),
+                                    params.get('sepch', ';'), params.get('commsep', '%'))
+        self.V = float(params.get('V', 3))
+        self.S = float(params.get('S', 15))
+        self.inipos = params.get('inipos', '0,0,0')
+        self.reloadable = str(params.get('reloadable', 'True')).lower() == 'true'
+        self.reset()
+
+    def reset(self):
+        self.trialts = None        # trial time reached by the last /nextdata
+        self.started = None        # wall clock of the first /nextdata
+        self.p = 0.0               # wall clock of the last request
+        self.h = 0.0               # horizon of the last /nextdata
+        self.pts = 0.0             # trial time of the last estimate
+        self.pos = self.inipos
+        self.estimates = [(0.0, time.time(), 0.0, 0.0, self.inipos)]
+        self.log = []
+
+    def reload(self):
+        if not self.reloadable:
+            return 405, "trial is not reloadable\n"
+        if self.file.changed():
+            self.file = open_trial_file(self.file.filename, self.params.get('sepch', ';'), self.params.get('commsep', '%'))
+        self.reset()
+        return 200, self.state()
+
+    def state(self):
+        if self.trialts is None:
+            trialts, rem = 0.0, -1.0
+        else:
+            trialts, rem = self.trialts, max(self.file.last_ts - self.trialts, 0.0)
+        return statefmt.format(trialts=trialts, rem=rem, V=self.V, S=self.S, p=self.p, h=self.h,
+                               pts=self.pts, pos=self.pos.replace(',', ';')) + "\n"
+
+    def nextdata(self, horizon, position):
+        now = time.time()
+        if self.trialts is None:
+            self.trialts = self.file.first_ts - 1e-9 if len(self.file) else 0.0
+            self.started = now
+        elif self.trialts >= self.file.last_ts:
+            return 405, "trial finished\n"
+
+        if self.speed > 0 and self.trialts > self.file.first_ts + (now - self.started) * self.speed:
+            return 423, "ahead of the trial clock\n"
+
+        if position is not None:
+            self.pts = max(self.trialts, 0.0)
+            self.pos = position
+            self.estimates.append((self.pts, now, self.h, now - self.started, position))
+
+        t0 = self.trialts
+        self.trialts = t0 + horizon
+        self.h = horizon
+        return 200, self.file.slice(t0, self.trialts)
+
+    def estimates_text(self):
+        lines = ["pts,c,h,s,pos"]
+        lines += [estfmt.format(pts=pts, c=c, h=h, s=s, pos=pos) for pts, c, h, s, pos in self.estimates]
+        return "\n".join(lines) + "\n"
+
+    def handle(self, cmd, query):
+        with self.lock:
+            now = time.time()
+            if cmd == "reload":
+                code, body = self.reload()
+            elif cmd == "state":
+                code, body = 200, self.state()
+            elif cmd == "nextdata":
+                horizon = float(query.get('horizon', ['0.5'])[0])
+                position = query.get('position', [None])[0]
+                code, body = self.nextdata(horizon, position)
+            elif cmd == "estimates":
+                code, body = 200, self.estimates_text()
+            elif cmd == "log":
+                code, body = 200, "\n".join(self.log) + "\n"
+            else:
+                code, body = 404, "unknown request\n"
+            self.log.append("%.3f %s %s %d" % (now, "%.3f" % self.trialts if self.trialts is not None else "-", cmd, code))
+            if cmd != "log":
+                self.p = now
+        return code, body
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+    trials = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != "evaalapi" or parts[1] not in self.trials:
+            code, body = 404, "unknown trial\n"
+        else:
+            code, body = self.trials[parts[1]].handle(parts[2], parse_qs(url.query))
+
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def load_trials(config_filename, trials_dir, speed=0.0):
+    """Index every trial of the config whose data file exists"""
+    trials = {}
+    for name, params in load_config(config_filename).items():
+        if os.path.exists(os.path.join(trials_dir, params.get('datafile', ''))):
+            trials[name] = Trial(name, params, trials_dir, speed)
+    return trials
+
+
+def serve(trials, host="127.0.0.1", port=5000):
+    Handler.trials = trials
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 4:
+        print("""A fast local stand-in for the EvAAL API server.  Usage is
+%s [config] [port] [speed]
+
+if omitted, CONFIG defaults to evaalapi.yaml (data files in trials/ next to it), PORT to 5000
+and SPEED to 0 (no real-time pacing)""" % sys.argv[0])
+        exit(1)
+
+    config = sys.argv[1] if len(sys.argv) > 1 else "evaalapi.yaml"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    trials_dir = os.path.join(os.path.dirname(os.path.abspath(config)), "trials")
+
+    t = time.time()
+    trials = load_trials(config, trials_dir, speed)
+    for name, trial in trials.items():
+        print(f"{name}: {trial.file.filename}, {len(trial.file)} lines, {trial.file.last_ts - trial.file.first_ts:.1f} s")
+    print(f"indexed {len(trials)} trials in {time.time() - t:.2f} s")
+
+    httpd = serve(trials, port=port)
+    print(f" * Running on http://127.0.0.1:{port}/evaalapi/")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    exit(0)
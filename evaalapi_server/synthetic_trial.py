@@ -0,0 +1,89 @@
+#! /usr/bin/env -S python3
+
+"""
+Synthetic trial files in the dataset format, for benchmarks and load tests without the dataset.
+
+A walker follows a slowly turning path (walking 15 s, standing 5 s) with 100 Hz ACCE/GYRO/AHRS,
+50 Hz MAGN, 20 Hz VISO, 1 Hz UWBT from two fixed tags and 1 Hz GPOS of base_link.
+The numbers are plausible, not realistic: they exercise the parsers and estimators at the
+dataset's data rates.
+"""
+
+import sys
+
+import numpy as np
+
+TAGS = {"3583WAA": ((5.0, 3.0, 1.0), np.radians(30)), "3637RLJ": ((20.0, 10.0, 1.0), np.radians(-60))}
+
+
+def yaw_quat(yaw):
+    """(qx, qy, qz, qw) of rotations about z"""
+    return np.zeros_like(yaw), np.zeros_like(yaw), np.sin(yaw / 2), np.cos(yaw / 2)
+
+
+def make_trial(filename, duration=60.0, seed=0):
+    """Write a trial of `duration` seconds; returns the ground truth (t, x, y, yaw) at 100 Hz"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(0.0, duration, 0.01)
+    n = len(t)
+    yaw = 0.3 + 0.02 * t + 0.5 * np.sin(t / 10)
+    speed = np.where((t % 20) < 15, 0.8, 0.0)
+    x = np.cumsum(speed * np.cos(yaw) * 0.01)
+    y = np.cumsum(speed * np.sin(yaw) * 0.01)
+
+    rows = []  # (app timestamps, lines) per sensor
+
+    def add(ts, fmt, *cols):
+        rows.append((ts, [fmt % v for v in zip(ts, ts, *cols)]))
+
+    acc_z = -1.0 + np.where(speed > 0, 0.3 * np.sin(2 * np.pi * 2 * t), 0.0) + rng.normal(0, 0.01, n)
+    add(t, "ACCE;%.3f;%.3f;%.5f;%.5f;%.5f;0", rng.normal(0, 0.02, n), rng.normal(0, 0.02, n), acc_z)
+    gyr_z = np.append(0.0, np.diff(yaw) / 0.01)
+    add(t + 0.002, "GYRO;%.3f;%.3f;%.5f;%.5f;%.5f;0", rng.normal(0, 0.01, n), rng.normal(0, 0.01, n), gyr_z)
+    m = slice(None, None, 2)
+    add(t[m] + 0.004, "MAGN;%.3f;%.3f;%.5f;%.5f;%.5f;0", 15 + np.sin(x[m]), -27 + np.cos(y[m]), np.full(len(t[m]), -116.0))
+    heading = yaw + 1.0
+    add(t + 0.006, "AHRS;%.3f;%.3f;%.1f;%.1f;%.3f;%.5f;%.5f;%.5f;%.5f;0", np.ones(n), np.full(n, 2.0),
+        np.degrees(heading + np.pi) % 360 - 180, *yaw_quat(heading))
+
+    # VIO frame rotated by 0.7 rad from the map frame
+    v = slice(None, None, 5)
+    c, s = np.cos(0.7), np.sin(0.7)
+    add(t[v] + 0.008, "VISO;%.3f;%.3f;%.4f;%.4f;%.4f;%.5f;%.5f;%.5f;%.5f",
+        c * x[v] - s * y[v], s * x[v] + c * y[v], np.zeros(len(t[v])), *yaw_quat(yaw[v] + 0.7))
+
+    g = slice(None, None, 100)
+    for name, (p, rot) in TAGS.items():
+        dx, dy, dz = x[50::100] - p[0], y[50::100] - p[1], -p[2]
+        lx, ly = np.cos(rot) * dx + np.sin(rot) * dy, -np.sin(rot) * dx + np.cos(rot) * dy
+        d = np.sqrt(lx ** 2 + ly ** 2 + dz ** 2)
+        near = d <= 15
+        ts = t[50::100][near] + 0.009
+        rows.append((ts, ["UWBT;%.3f;%.3f;%s;%.3f;%.2f;%.2f;0" % (a, a, name, dd, az, el) for a, dd, az, el in
+                          zip(ts, d[near] + rng.normal(0, 0.1, near.sum()),
+                              np.degrees(np.arctan2(lx, ly))[near] + rng.normal(0, 2, near.sum()),
+                              np.degrees(np.arcsin(dz / d))[near])]))
+        rows.append((np.zeros(1), ["GPOS;0.000;0.000;%s;%.3f;%.3f;%.3f;%.5f;%.5f;%.5f;%.5f" % ((name,) + p + tuple(q[0] for q in yaw_quat(np.array([rot]))))]))
+    rows.append((t[g] + 0.005, ["GPOS;%.3f;%.3f;base_link;%.3f;%.3f;0.000;%.5f;%.5f;%.5f;%.5f" % v
+                                for v in zip(t[g] + 0.005, t[g] + 0.005, x[g], y[g], *yaw_quat(yaw[g]))]))
+
+    ts = np.concatenate([r[0] for r in rows])
+    lines = [line for r in rows for line in r[1]]
+    with open(filename, 'w') as f:
+        f.write("\n".join(lines[i] for i in np.argsort(ts, kind="stable")) + "\n")
+    return t, x, y, yaw
+
+
+################################################################
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4):
+        print("""Write a synthetic trial file.  Usage is
+%s [trial_file] [duration] [seed]
+
+DURATION is in seconds, SEED (default 0) selects the sensor noise""" % sys.argv[0])
+        exit(1)
+
+    make_trial(sys.argv[1], float(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    exit(0)